@@ -4,13 +4,15 @@ API路由
 
 from fastapi import APIRouter
 
-from . import messages, customers, health, webhooks, whatsapp
+from . import customer_bulk, health, whatsapp, archive, events, admin, analytics
 
 api_router = APIRouter()
 
 # 注册路由
 api_router.include_router(health.router, tags=["健康检查"])
-api_router.include_router(messages.router, prefix="/messages", tags=["消息管理"])
-api_router.include_router(customers.router, prefix="/customers", tags=["客户管理"])
-api_router.include_router(webhooks.router, prefix="/webhooks", tags=["Webhook接收"])
-api_router.include_router(whatsapp.router, prefix="/whatsapp", tags=["WhatsApp集成"])
\ No newline at end of file
+api_router.include_router(customer_bulk.router, prefix="/customers", tags=["客户管理"])
+api_router.include_router(whatsapp.router, prefix="/whatsapp", tags=["WhatsApp集成"])
+api_router.include_router(archive.router, prefix="/archive", tags=["消息归档"])
+api_router.include_router(events.router, prefix="/events", tags=["实时推送"])
+api_router.include_router(admin.router, prefix="/admin", tags=["管理"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["统计分析"])
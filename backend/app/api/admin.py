@@ -0,0 +1,81 @@
+"""
+管理 API 路由（性能剖析）
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import asyncio
+import secrets
+
+from ..core import profiling
+from ..core.config import settings
+
+# 同时只允许一个进程级采样
+_sampling_lock = asyncio.Lock()
+
+
+def check_admin_token(token: Optional[str]):
+    """校验管理令牌（未配置 ADMIN_TOKEN 时管理接口不可用）"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    # 按字节比较：请求头按 latin-1 解码，非ASCII的 str 不能直接传给 compare_digest
+    if not token or not secrets.compare_digest(token.encode(), settings.ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")):
+    """管理接口依赖：校验 X-Admin-Token 请求头"""
+    check_admin_token(x_admin_token)
+
+
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiling/spans")
+async def span_stats(reset: bool = False):
+    """
+    获取热点路径分段耗时统计（当前worker）
+    
+    Args:
+        reset: 读取后清零
+    """
+    stats = profiling.get_span_stats()
+    if reset:
+        profiling.reset_span_stats()
+    return {"enabled": profiling.is_enabled(), "spans": stats}
+
+
+@router.get("/profiling/requests")
+async def list_request_profiles():
+    """最近的请求剖析记录（当前worker）"""
+    return {"profiles": profiling.list_request_profiles()}
+
+
+@router.get("/profiling/requests/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: int):
+    """获取单个请求的剖析结果"""
+    profile = profiling.get_request_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile["output"]
+
+
+@router.get("/profiling/flamegraph", response_class=PlainTextResponse)
+async def flamegraph(
+    seconds: float = Query(10.0, gt=0, le=60),
+    interval: float = Query(0.005, ge=0.001, le=1.0)
+):
+    """
+    对当前worker进程做定时栈采样
+    
+    返回折叠栈格式，可用 flamegraph.pl 或 speedscope 生成火焰图。
+    
+    Args:
+        seconds: 采样时长（秒）
+        interval: 采样间隔（秒）
+    """
+    if _sampling_lock.locked():
+        raise HTTPException(status_code=409, detail="Sampling already in progress")
+    async with _sampling_lock:
+        return await asyncio.to_thread(profiling.sample_process, seconds, interval)
@@ -0,0 +1,82 @@
+"""
+统计分析 API 路由
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime, timedelta
+
+from ..core.database import get_db
+from ..services.rollup_service import rollup_service
+from .admin import require_admin
+
+router = APIRouter()
+
+
+@router.get("/messages")
+def message_stats(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    group_by: Optional[str] = None,
+    granularity: str = Query("hour", pattern="^(hour|day)$"),
+    channel: Optional[str] = None,
+    intent: Optional[str] = None,
+    priority: Optional[str] = None,
+    status: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    消息量和首次回复耗时（读取小时汇总）
+
+    Args:
+        start: 开始时间（UTC，默认24小时前）
+        end: 结束时间（UTC，不含，默认当前）
+        group_by: 分组维度（逗号分隔：channel,intent,priority,status）
+        granularity: hour 或 day
+        channel/intent/priority/status: 维度过滤（枚举值，如 whatsapp、urgent、replied）
+    """
+    end = end or datetime.utcnow()
+    start = start or end - timedelta(hours=24)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be earlier than end")
+
+    dimensions = [name.strip() for name in (group_by or "").split(",") if name.strip()]
+    filters = {
+        name: value for name, value in (
+            ("channel", channel), ("intent", intent), ("priority", priority), ("status", status)
+        ) if value is not None
+    }
+    try:
+        points = rollup_service.query(db, start, end, dimensions, filters, granularity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "granularity": granularity,
+        "group_by": dimensions,
+        "points": points
+    }
+
+
+@router.post("/rebuild", dependencies=[Depends(require_admin)])
+def rebuild_rollups(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    从原始消息表重建汇总（回填数据后执行）
+
+    Args:
+        start: 开始时间（按小时取整，默认不限）
+        end: 结束时间（不含，默认不限）
+    """
+    try:
+        result = rollup_service.rebuild(db, start, end)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Rollup rebuild failed: {str(e)}")
+
+    return {"success": True, **result}
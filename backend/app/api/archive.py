@@ -0,0 +1,132 @@
+"""
+消息归档 API 路由
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from typing import Optional
+from datetime import datetime
+
+from ..core.database import SessionLocal, get_db
+from ..core.responses import conditional_json, make_etag
+from ..services.archive_service import archive_service
+from .admin import require_admin
+
+router = APIRouter()
+
+MONTH_PATTERN = r"^\d{4}(0[1-9]|1[0-2])$"
+
+
+@router.post("/run", dependencies=[Depends(require_admin)])
+def run_archive(
+    max_batches: Optional[int] = Query(None, ge=1),
+    db: Session = Depends(get_db)
+):
+    """
+    执行消息归档
+    
+    Args:
+        max_batches: 最多处理的批次数（默认处理全部可归档消息）
+    """
+    try:
+        result = archive_service.run(db, max_batches)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Archive failed: {str(e)}")
+    
+    return {"success": True, **result}
+
+
+@router.get("/stats")
+def archive_stats(db: Session = Depends(get_db)):
+    """热表和归档表的消息数"""
+    return archive_service.get_stats(db)
+
+
+@router.get("/months", dependencies=[Depends(require_admin)])
+def archive_months(db: Session = Depends(get_db)):
+    """各归档月份（分区）的消息数"""
+    return {"months": archive_service.list_months(db)}
+
+
+@router.get("/months/{month}/export", dependencies=[Depends(require_admin)])
+def export_archive_month(month: str = Path(..., pattern=MONTH_PATTERN)):
+    """
+    导出某月的归档消息（NDJSON，删除分区前备份用）
+    
+    Args:
+        month: 归档月份（YYYYMM）
+    """
+    def rows():
+        db = SessionLocal()
+        try:
+            yield from archive_service.export_month(db, month)
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        rows(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="messages-archive-{month}.ndjson"'}
+    )
+
+
+@router.delete("/months/{month}", dependencies=[Depends(require_admin)])
+def drop_archive_month(
+    month: str = Path(..., pattern=MONTH_PATTERN),
+    db: Session = Depends(get_db)
+):
+    """
+    删除某月的全部归档消息（Postgres 上直接删除分区表）
+    
+    Args:
+        month: 归档月份（YYYYMM）
+    """
+    try:
+        result = archive_service.drop_month(db, month)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Drop archive month failed: {str(e)}")
+    
+    return {"success": True, **result}
+
+
+@router.get("/customers/{customer_id}/history")
+def customer_history(
+    request: Request,
+    customer_id: int,
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[datetime] = None,
+    before_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    获取客户消息历史（包含已归档消息）
+    
+    支持 If-None-Match 条件请求，历史未变化时返回304。
+    不返回 Last-Modified：归档和删除归档月份不会改变最后更新时间，只能通过ETag判断。
+    
+    Args:
+        customer_id: 客户ID
+        limit: 返回条数
+        before: 翻页游标（上一页返回的 next_before）
+        before_id: 翻页游标（上一页返回的 next_before_id）
+    """
+    hot_count, archived_count, last_modified = archive_service.get_history_version(
+        db, customer_id, before, before_id
+    )
+    etag = make_etag("history", customer_id, limit, before, before_id, hot_count,
+                     archived_count, last_modified)
+
+    def build():
+        messages = archive_service.get_customer_history(db, customer_id, limit, before, before_id)
+        has_more = len(messages) == limit
+        return {
+            "customer_id": customer_id,
+            "count": len(messages),
+            "messages": messages,
+            "next_before": messages[-1]["created_at"] if has_more else None,
+            "next_before_id": messages[-1]["id"] if has_more else None
+        }
+
+    return conditional_json(request, etag, None, build)
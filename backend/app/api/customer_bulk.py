@@ -0,0 +1,77 @@
+"""
+客户批量导入导出 API 路由
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from datetime import datetime
+
+from ..services.customer_bulk_service import CustomerImportError, customer_bulk_service
+from .admin import require_admin
+
+# 导入导出涉及全部客户的联系方式，仅限管理员
+router = APIRouter(dependencies=[Depends(require_admin)])
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _detect_format(request: Request, fmt: Optional[str]) -> str:
+    if fmt:
+        return fmt
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return "csv"
+
+
+@router.post("/import")
+async def import_customers(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    job_id: Optional[str] = Query(None, max_length=64)
+):
+    """
+    流式导入客户（请求体为 CSV 或 NDJSON 原始内容）
+
+    按 phone / email / instagram_handle 去重，已存在的客户合并更新。
+    导入过程中可通过 GET /customers/import/{job_id} 查询进度。
+
+    Args:
+        format: csv 或 ndjson（默认按 Content-Type 判断）
+        job_id: 任务ID（客户端指定后可在导入过程中查询进度）
+    """
+    fmt = _detect_format(request, format)
+    try:
+        result = await customer_bulk_service.import_stream(request.stream(), fmt, job_id)
+    except CustomerImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Customer import failed: {str(e)}")
+
+    return {"success": True, **result}
+
+
+@router.get("/import/{job_id}")
+async def import_progress(job_id: str):
+    """查询导入进度"""
+    progress = await customer_bulk_service.get_progress(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return progress
+
+
+@router.get("/export")
+async def export_customers(format: str = Query("csv", pattern="^(csv|ndjson)$")):
+    """
+    流式导出全部客户
+
+    Args:
+        format: csv 或 ndjson
+    """
+    filename = f"customers-{datetime.utcnow():%Y%m%d%H%M%S}.{format}"
+    return StreamingResponse(
+        customer_bulk_service.export_stream(format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,132 @@
+"""
+实时推送 API 路由
+"""
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import asyncio
+import json
+
+from ..services.event_hub import event_hub
+from .admin import check_admin_token
+
+router = APIRouter()
+
+# SSE心跳间隔（秒），防止代理断开空闲连接
+HEARTBEAT_INTERVAL = 15.0
+
+
+def _split(value: Optional[str]) -> Optional[List[str]]:
+    """解析逗号分隔的过滤参数"""
+    if not value:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def require_event_token(
+    x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token"),
+    token: Optional[str] = None
+):
+    """
+    校验推送订阅令牌
+
+    浏览器的 EventSource / WebSocket 不能设置请求头，也接受 token 查询参数。
+    """
+    check_admin_token(x_admin_token or token)
+
+
+def _dropped_event(count: int) -> str:
+    """缓冲区溢出通知，客户端收到后应重新拉取消息列表"""
+    return json.dumps({"type": "events.dropped", "count": count})
+
+
+@router.websocket("/ws")
+async def events_websocket(
+    websocket: WebSocket,
+    channel: Optional[str] = None,
+    priority: Optional[str] = None,
+    token: Optional[str] = None
+):
+    """
+    WebSocket推送新消息事件
+
+    Args:
+        channel: 渠道过滤（逗号分隔，如 whatsapp,instagram）
+        priority: 优先级过滤（逗号分隔，如 urgent,critical）
+        token: 订阅令牌（也可用 X-Admin-Token 请求头）
+    """
+    try:
+        require_event_token(websocket.headers.get("x-admin-token"), token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    subscription = event_hub.subscribe(_split(channel), _split(priority))
+
+    async def drain_client():
+        # 读取客户端消息以便及时发现断开
+        while True:
+            await websocket.receive_text()
+
+    reader = asyncio.create_task(drain_client())
+    try:
+        while True:
+            getter = asyncio.create_task(subscription.get())
+            done, _ = await asyncio.wait({getter, reader}, return_when=asyncio.FIRST_COMPLETED)
+            if reader in done:
+                getter.cancel()
+                break
+            dropped = subscription.take_dropped()
+            if dropped:
+                await websocket.send_text(_dropped_event(dropped))
+            await websocket.send_text(getter.result())
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        event_hub.unsubscribe(subscription)
+
+
+@router.get("/stream", dependencies=[Depends(require_event_token)])
+async def events_stream(
+    request: Request,
+    channel: Optional[str] = None,
+    priority: Optional[str] = None
+):
+    """
+    SSE推送新消息事件（需要订阅令牌：X-Admin-Token 请求头或 token 查询参数）
+
+    Args:
+        channel: 渠道过滤（逗号分隔）
+        priority: 优先级过滤（逗号分隔）
+    """
+    async def stream():
+        # 在生成器内订阅：客户端在响应开始前断开时生成器不会运行，也就不会遗留订阅
+        subscription = event_hub.subscribe(_split(channel), _split(priority))
+        try:
+            while not await request.is_disconnected():
+                try:
+                    data = await asyncio.wait_for(subscription.get(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                dropped = subscription.take_dropped()
+                if dropped:
+                    yield f"data: {_dropped_event(dropped)}\n\n"
+                yield f"data: {data}\n\n"
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stats")
+async def events_stats():
+    """当前worker的订阅数"""
+    return {"subscribers": event_hub.subscriber_count}
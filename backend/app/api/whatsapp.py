@@ -3,10 +3,22 @@ WhatsApp API 路由
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Header, Request
-from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+from datetime import datetime
 import json
 
+from ..core.cache import rate_limiter
+from ..core.config import settings
+from ..core.database import get_db
+from ..models.message import ChannelType
+from ..models.outbox import OutboxMessage
+from ..services.event_hub import event_hub, message_event, message_text
+from ..services.intent_classifier import intent_classifier
+from ..services.outbox_service import outbox_service
 from ..services.whatsapp_service import whatsapp_service
+from .admin import check_admin_token
 
 router = APIRouter()
 
@@ -33,6 +45,16 @@ async def receive_webhook(
         # 处理Webhook
         result = await whatsapp_service.receive_webhook(webhook_data)
         
+        # 推送新消息事件给在线坐席，投诉等消息按紧急优先级推送
+        messages = result.get("messages", [])
+        if messages:
+            intents = await run_in_threadpool(
+                intent_classifier.classify_batch, [message_text(m) for m in messages]
+            )
+            for message, intent in zip(messages, intents):
+                priority = intent_classifier.get_message_priority(intent["intent"])
+                await event_hub.publish(message_event("whatsapp", message, priority.value))
+        
         # 如果是验证请求，返回挑战值
         if "hub.challenge" in webhook_data:
             return int(webhook_data["hub.challenge"])
@@ -47,38 +69,89 @@ async def receive_webhook(
         raise HTTPException(status_code=500, detail=f"Webhook processing failed: {str(e)}")
 
 
+def _enqueue_reply(db: Session, to: str, content: str, message_type: str,
+                   payload: Dict, reply_to: Optional[int]) -> Dict:
+    """在同一事务中写入回复消息和发件箱记录"""
+    try:
+        outbox = outbox_service.enqueue_reply(
+            db,
+            channel=ChannelType.WHATSAPP,
+            recipient=to,
+            content=content,
+            message_type=message_type,
+            payload=payload,
+            reply_to=reply_to,
+            sender=settings.WHATSAPP_PHONE_NUMBER_ID
+        )
+        queued = {"outbox_id": outbox.id, "created_at": outbox.created_at}
+        db.commit()
+        return queued
+    except Exception:
+        db.rollback()
+        raise
+
+
 @router.post("/send")
 async def send_message(
     to: str,
     message: str,
-    message_type: str = "text"
+    message_type: str = "text",
+    reply_to: Optional[int] = None,
+    db: Session = Depends(get_db)
 ):
     """
     发送WhatsApp消息
     
+    消息写入发件箱后立即返回，由后台分发器异步投递。
+    
     Args:
         to: 接收者电话号码
         message: 消息内容
         message_type: 消息类型
+        reply_to: 被回复的消息ID（同时标记为已回复）
     """
+    if not await rate_limiter.hit(f"whatsapp_send:{to}", settings.SEND_RATE_LIMIT_PER_MINUTE):
+        raise HTTPException(status_code=429, detail="Send rate limit exceeded")
+    
     try:
-        result = await whatsapp_service.send_message(to, message, message_type)
-        
-        if not result.get("success"):
-            raise HTTPException(status_code=400, detail=result.get("error", "Send failed"))
+        queued = await run_in_threadpool(
+            _enqueue_reply, db, to, message, message_type, {"message": message}, reply_to
+        )
         
         return {
             "success": True,
-            "message_id": result.get("message_id"),
-            "status": result.get("status"),
+            "outbox_id": queued["outbox_id"],
+            "status": "queued",
             "recipient": to,
-            "timestamp": result.get("timestamp")
+            "timestamp": queued["created_at"].isoformat()
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Message send failed: {str(e)}")
 
 
+@router.get("/outbox/{outbox_id}")
+def get_outbox_status(outbox_id: int, db: Session = Depends(get_db)):
+    """
+    获取发件箱投递状态
+    
+    Args:
+        outbox_id: 发件箱记录ID
+    """
+    outbox = db.get(OutboxMessage, outbox_id)
+    if outbox is None:
+        raise HTTPException(status_code=404, detail="Outbox message not found")
+    
+    return {
+        "outbox_id": outbox.id,
+        "status": outbox.status.value,
+        "message_id": outbox.external_id,
+        "attempts": outbox.attempts,
+        "last_error": outbox.last_error,
+        "sent_at": outbox.sent_at.isoformat() if outbox.sent_at else None
+    }
+
+
 @router.get("/status/{message_id}")
 async def get_message_status(message_id: str):
     """
@@ -107,7 +180,8 @@ async def get_message_status(message_id: str):
 async def send_template_message(
     to: str,
     template_name: str,
-    language_code: str = "zh_CN"
+    language_code: str = "zh_CN",
+    db: Session = Depends(get_db)
 ):
     """
     发送模板消息
@@ -117,18 +191,21 @@ async def send_template_message(
         template_name: 模板名称
         language_code: 语言代码
     """
+    if not await rate_limiter.hit(f"whatsapp_send:{to}", settings.SEND_RATE_LIMIT_PER_MINUTE):
+        raise HTTPException(status_code=429, detail="Send rate limit exceeded")
+    
     try:
-        result = await whatsapp_service.send_template_message(to, template_name, language_code)
-        
-        if not result.get("success"):
-            raise HTTPException(status_code=400, detail="Template send failed")
+        payload = {"template": template_name, "language_code": language_code}
+        queued = await run_in_threadpool(
+            _enqueue_reply, db, to, template_name, "template", payload, None
+        )
         
         return {
             "success": True,
-            "message_id": result.get("message_id"),
+            "outbox_id": queued["outbox_id"],
             "template": template_name,
             "recipient": to,
-            "status": result.get("status")
+            "status": "queued"
         }
         
     except Exception as e:
@@ -136,17 +213,33 @@ async def send_template_message(
 
 
 @router.get("/health")
-async def health_check():
-    """WhatsApp服务健康检查"""
+async def health_check(
+    probe: bool = False,
+    x_admin_token: Optional[str] = Header(None, alias="X-Admin-Token")
+):
+    """
+    WhatsApp服务健康检查
+    
+    熔断器打开时 status 为 degraded，details.circuit_breakers 列出各端点的
+    熔断状态、近期失败率和延迟。
+    
+    Args:
+        probe: 是否主动请求上游（读取号码状态，需要管理令牌）
+    """
+    if probe:
+        # 主动探测会消耗上游配额并返回号码信息
+        check_admin_token(x_admin_token)
     try:
         status = whatsapp_service.get_health_status()
-        
-        return {
+        result = {
             "service": "whatsapp",
-            "status": "healthy",
+            "status": "degraded" if status["status"] == "degraded" else "healthy",
             "details": status,
             "timestamp": status.get("timestamp")
         }
+        if probe:
+            result["probe"] = await whatsapp_service.get_phone_number_status()
+        return result
         
     except Exception as e:
         return {
@@ -160,8 +253,6 @@ async def health_check():
 @router.get("/config")
 async def get_config():
     """获取WhatsApp配置信息（仅开发环境）"""
-    from ..core.config import settings
-    
     config = {
         "simulation_mode": whatsapp_service.simulation_mode,
         "base_url": whatsapp_service.base_url if not whatsapp_service.simulation_mode else None,
@@ -0,0 +1,151 @@
+"""
+缓存和限流后端
+
+配置了 REDIS_URL 时使用Redis，多个worker进程共享同一份缓存和限流计数；
+否则使用进程内内存实现（仅适用于单进程开发环境）。
+"""
+
+import json
+import os
+import time
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCacheBackend:
+    """进程内内存缓存"""
+
+    shared = False
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+
+    def _expired(self, key: str) -> bool:
+        item = self._data.get(key)
+        if item is None:
+            return True
+        expires_at = item[0]
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return True
+        return False
+
+    async def get(self, key: str) -> Optional[Any]:
+        if self._expired(key):
+            return None
+        return self._data[key][1]
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+
+    async def delete(self, key: str):
+        self._data.pop(key, None)
+
+    async def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        if self._expired(key):
+            await self.set(key, 0, ttl)
+        expires_at, value = self._data[key]
+        value += 1
+        self._data[key] = (expires_at, value)
+        return value
+
+    def reset_after_fork(self):
+        """fork后丢弃从父进程继承的数据"""
+        self._data = {}
+
+    async def close(self):
+        self._data = {}
+
+
+class RedisCacheBackend:
+    """Redis缓存（多进程共享）"""
+
+    shared = True
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client = None
+        self._pid: Optional[int] = None
+
+    def _get_client(self):
+        # 连接在当前进程内首次使用时才创建，保证不会跨fork共享socket
+        if self._client is None or self._pid != os.getpid():
+            import redis.asyncio as redis
+
+            self._client = redis.from_url(self.url)
+            self._pid = os.getpid()
+        return self._client
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self._get_client().get(key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        await self._get_client().set(key, json.dumps(value, ensure_ascii=False), ex=ttl)
+
+    async def delete(self, key: str):
+        await self._get_client().delete(key)
+
+    async def incr(self, key: str, ttl: Optional[int] = None) -> int:
+        pipe = self._get_client().pipeline()
+        pipe.incr(key)
+        if ttl:
+            pipe.expire(key, ttl, nx=True)
+        result = await pipe.execute()
+        return int(result[0])
+
+    def reset_after_fork(self):
+        """fork后丢弃父进程的连接（不关闭，socket仍属于父进程）"""
+        self._client = None
+        self._pid = None
+
+    async def close(self):
+        if self._client is not None and self._pid == os.getpid():
+            await self._client.close()
+        self._client = None
+
+
+class RateLimiter:
+    """固定窗口限流器"""
+
+    def __init__(self, backend, prefix: str = "ratelimit"):
+        self.backend = backend
+        self.prefix = prefix
+
+    async def hit(self, key: str, limit: int, window_seconds: int = 60) -> bool:
+        """
+        记录一次访问
+
+        Args:
+            key: 限流维度（如接收者号码）
+            limit: 窗口内允许的最大次数，<=0表示不限流
+            window_seconds: 窗口长度（秒）
+
+        Returns:
+            是否允许本次访问
+        """
+        if limit <= 0:
+            return True
+        window = int(time.time() // window_seconds)
+        count = await self.backend.incr(f"{self.prefix}:{key}:{window}", ttl=window_seconds)
+        return count <= limit
+
+
+def create_cache_backend(redis_url: Optional[str] = None):
+    """根据配置创建缓存后端"""
+    if redis_url:
+        logger.info("缓存和限流使用Redis共享后端")
+        return RedisCacheBackend(redis_url)
+    return MemoryCacheBackend()
+
+
+# 创建全局实例
+cache = create_cache_backend(settings.REDIS_URL)
+rate_limiter = RateLimiter(cache)
@@ -0,0 +1,134 @@
+"""
+响应压缩中间件
+
+根据 Accept-Encoding 选择 brotli（已安装 brotli 包时）或 gzip，只压缩超过阈值的
+一次性响应体；流式响应（如SSE）和已编码的响应原样透传。
+"""
+
+import gzip
+from typing import List, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli为可选依赖
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+
+def _accepted_encodings(headers: List[Tuple[bytes, bytes]]) -> set:
+    for name, value in headers:
+        if name == b"accept-encoding":
+            encodings = set()
+            for item in value.decode("latin-1").split(","):
+                token, _, params = item.strip().partition(";")
+                if params.replace(" ", "") in ("q=0", "q=0.0"):
+                    continue
+                encodings.add(token.strip().lower())
+            return encodings
+    return set()
+
+
+def _vary_with_encoding(headers: List[Tuple[bytes, bytes]]) -> bytes:
+    """在已有的 Vary 值后追加 Accept-Encoding（保留 Origin 等其他字段）"""
+    fields = []
+    for name, value in headers:
+        if name.lower() == b"vary":
+            fields += [field.strip() for field in value.decode("latin-1").split(",") if field.strip()]
+    lowered = {field.lower() for field in fields}
+    if "*" not in lowered and "accept-encoding" not in lowered:
+        fields.append("Accept-Encoding")
+    return ", ".join(fields).encode("latin-1")
+
+
+class CompressionMiddleware:
+    """gzip/brotli 响应压缩（ASGI）"""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose_encoding(self, scope) -> Optional[str]:
+        accepted = _accepted_encodings(scope.get("headers") or [])
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, passthrough
+
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = list(start_message.get("headers", []))
+            header_names = {name.lower() for name, _ in headers}
+            content_type = next(
+                (value.decode("latin-1") for name, value in headers if name.lower() == b"content-type"),
+                ""
+            )
+
+            if (
+                message.get("more_body", False)
+                or len(body) < self.minimum_size
+                or b"content-encoding" in header_names
+                or not content_type.startswith(COMPRESSIBLE_TYPES)
+            ):
+                # 流式、过小或不可压缩的响应原样透传
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            compressed = self._compress(body, encoding)
+            vary = _vary_with_encoding(headers)
+            headers = [
+                (name, value) for name, value in headers
+                if name.lower() not in (b"content-length", b"vary")
+            ]
+            headers += [
+                (b"content-encoding", encoding.encode()),
+                (b"content-length", str(len(compressed)).encode()),
+                (b"vary", vary),
+            ]
+            await send({**start_message, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
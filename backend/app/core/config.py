@@ -34,6 +34,62 @@ class Settings(BaseSettings):
     # 消息队列配置
     REDIS_URL: Optional[str] = None
     
+    # 生产服务配置
+    WEB_CONCURRENCY: int = 0  # worker进程数，0表示按CPU核数自动计算
+    BIND: str = "0.0.0.0:8000"
+    
+    # 意图模型配置（未配置目录时仅使用关键词规则）
+    INTENT_MODEL_DIR: Optional[str] = None
+    INTENT_MODEL_MIN_CONFIDENCE: float = 0.6
+    INTENT_MODEL_RELOAD_INTERVAL: float = 30.0
+    
+    # 消息归档配置
+    MESSAGE_RETENTION_DAYS: int = 90
+    ARCHIVE_BATCH_SIZE: int = 1000
+    
+    # 客户批量导入配置
+    CUSTOMER_IMPORT_CHUNK_SIZE: int = 5000  # 每个事务写入的行数
+    
+    # 统计汇总配置
+    ROLLUPS_ENABLED: bool = True
+    ROLLUP_FLUSH_INTERVAL: float = 10.0  # 内存增量写入汇总表的间隔（秒）
+    
+    # 发件箱配置
+    OUTBOX_DISPATCHER_ENABLED: bool = True
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_CONCURRENCY: int = 20
+    OUTBOX_POLL_INTERVAL: float = 0.5
+    OUTBOX_LEASE_SECONDS: int = 60
+    OUTBOX_MAX_ATTEMPTS: int = 5
+    
+    # 外部API调用容错配置（按端点统计）
+    OUTBOUND_TIMEOUT_MIN: float = 1.0  # 自适应超时下限（秒）
+    OUTBOUND_TIMEOUT_MAX: float = 10.0  # 自适应超时上限，延迟样本不足时使用
+    OUTBOUND_TIMEOUT_MULTIPLIER: float = 3.0  # 单次超时 = 近期p99延迟 × 系数
+    OUTBOUND_DEADLINE: float = 15.0  # 单次调用（含重试）的总期限
+    OUTBOUND_MAX_ATTEMPTS: int = 3
+    OUTBOUND_BACKOFF_BASE: float = 0.2  # 重试退避基数（秒），按次数翻倍并加抖动
+    OUTBOUND_BREAKER_FAILURES: int = 5  # 连续失败多少次后熔断
+    OUTBOUND_BREAKER_FAILURE_RATE: float = 0.5  # 近期失败率达到该值后熔断
+    OUTBOUND_BREAKER_RESET: float = 30.0  # 熔断后多久放行探测请求（秒）
+    
+    # 实时事件推送配置
+    EVENT_BUFFER_SIZE: int = 100  # 每个客户端最多缓冲的事件数
+    EVENT_REDIS_CHANNEL: str = "inbox-events"
+    
+    # 性能剖析配置
+    PROFILING_ENABLED: bool = False
+    PROFILE_SAMPLE_RATE: float = 0.0  # 自动剖析的请求比例（0~1）
+    ADMIN_TOKEN: Optional[str] = None  # 管理接口令牌，未配置时管理接口不可用
+    
+    # 响应压缩配置
+    COMPRESSION_MINIMUM_SIZE: int = 1024  # 超过该字节数的响应才压缩，0表示关闭
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4  # 需安装brotli，客户端支持br时优先使用
+    
+    # 限流配置
+    SEND_RATE_LIMIT_PER_MINUTE: int = 0  # 每个接收者每分钟发送上限，0表示不限流
+    
     # WhatsApp配置
     WHATSAPP_API_TOKEN: Optional[str] = None
     WHATSAPP_PHONE_NUMBER_ID: Optional[str] = None
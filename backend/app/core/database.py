@@ -27,4 +27,13 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+def dispose_engine_after_fork():
+    """
+    fork后丢弃从父进程继承的连接池
+
+    preload模式下应用在master进程中导入，子进程必须使用自己的连接，
+    close=False 保证不会关闭父进程仍在使用的连接。
+    """
+    engine.dispose(close=False)
@@ -0,0 +1,328 @@
+"""
+性能剖析和热点路径计时
+
+- 分段计时：traced 装饰器和 span 上下文管理器记录关键路径耗时，
+  汇总为全局统计，并通过 Server-Timing 响应头返回单个请求的分段耗时
+- 请求级剖析：按请求头或采样率对单个请求运行 pyinstrument（已安装时）或 cProfile
+- 进程级采样：定时采集所有线程的调用栈，输出火焰图可用的折叠栈格式
+
+PROFILING_ENABLED 为 False 时 traced 直接返回原函数、span 返回空操作对象，
+中间件也不会注册，关闭状态下几乎没有额外开销。
+"""
+
+import cProfile
+import functools
+import inspect
+import io
+import itertools
+import pstats
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from .config import settings
+
+_enabled = settings.PROFILING_ENABLED
+
+# 全局分段统计：名称 -> [次数, 总耗时, 最大耗时]
+_span_stats: Dict[str, List[float]] = {}
+_stats_lock = threading.Lock()
+
+# 当前请求内的分段记录
+_request_spans: ContextVar[Optional[List]] = ContextVar("request_spans", default=None)
+
+# 最近的请求剖析结果
+_request_profiles: deque = deque(maxlen=20)
+_profile_ids = itertools.count(1)
+_profiler_busy = threading.Lock()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(enabled: bool):
+    """切换计时开关（只影响之后装饰的函数和新创建的 span）"""
+    global _enabled
+    _enabled = enabled
+
+
+def _record(name: str, elapsed: float):
+    with _stats_lock:
+        stats = _span_stats.get(name)
+        if stats is None:
+            _span_stats[name] = [1, elapsed, elapsed]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed
+            if elapsed > stats[2]:
+                stats[2] = elapsed
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, elapsed))
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """
+    计时上下文管理器
+
+    用法：
+        with span("db.commit"):
+            db.commit()
+    """
+    if not _enabled:
+        return _NOOP_SPAN
+    return _Span(name)
+
+
+def traced(name: str):
+    """
+    函数计时装饰器（支持同步和异步函数）
+
+    未启用时直接返回原函数，不增加调用开销。
+    """
+    def decorator(func):
+        if not _enabled:
+            return func
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    _record(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - start)
+        return wrapper
+
+    return decorator
+
+
+def get_span_stats() -> Dict[str, Dict]:
+    """获取全局分段统计（毫秒）"""
+    with _stats_lock:
+        items = [(name, list(stats)) for name, stats in _span_stats.items()]
+    return {
+        name: {
+            "count": int(count),
+            "total_ms": round(total * 1000, 3),
+            "avg_ms": round(total / count * 1000, 3),
+            "max_ms": round(max_elapsed * 1000, 3)
+        }
+        for name, (count, total, max_elapsed) in sorted(items)
+    }
+
+
+def reset_span_stats():
+    with _stats_lock:
+        _span_stats.clear()
+
+
+def install_db_hooks(session_factory):
+    """为数据库提交记录耗时"""
+    from sqlalchemy import event
+
+    @event.listens_for(session_factory, "before_commit")
+    def _before_commit(session):
+        session.info["_commit_start"] = time.perf_counter()
+
+    @event.listens_for(session_factory, "after_commit")
+    def _after_commit(session):
+        start = session.info.pop("_commit_start", None)
+        if start is not None:
+            _record("db.commit", time.perf_counter() - start)
+
+
+class _RequestProfiler:
+    """单个请求的剖析器（优先使用 pyinstrument）"""
+
+    def __init__(self):
+        try:
+            from pyinstrument import Profiler
+
+            self._profiler = Profiler(async_mode="enabled")
+            self.kind = "pyinstrument"
+        except ImportError:
+            self._profiler = cProfile.Profile()
+            self.kind = "cprofile"
+
+    def start(self):
+        if self.kind == "pyinstrument":
+            self._profiler.start()
+        else:
+            self._profiler.enable()
+
+    def stop(self) -> str:
+        if self.kind == "pyinstrument":
+            self._profiler.stop()
+            return self._profiler.output_text(unicode=True)
+        self._profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(self._profiler, stream=output).sort_stats("cumulative").print_stats(40)
+        return output.getvalue()
+
+
+def list_request_profiles() -> List[Dict]:
+    return [
+        {key: value for key, value in profile.items() if key != "output"}
+        for profile in reversed(_request_profiles)
+    ]
+
+
+def get_request_profile(profile_id: int) -> Optional[Dict]:
+    for profile in _request_profiles:
+        if profile["id"] == profile_id:
+            return profile
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    请求计时和剖析中间件（ASGI）
+
+    - 每个请求收集分段耗时，写入 Server-Timing 响应头
+    - 请求头 X-Profile: 1 且携带正确的 X-Admin-Token，或命中 PROFILE_SAMPLE_RATE 采样时，
+      对该请求运行剖析器，结果可通过 /admin/profiling/requests 查看。
+      cProfile 按线程剖析，会同时记录期间在事件循环上运行的其他协程。
+    """
+
+    def __init__(self, app, sample_rate: float = 0.0, admin_token: Optional[str] = None):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.admin_token = admin_token
+
+    def _should_profile(self, headers: Dict[bytes, bytes]) -> bool:
+        if headers.get(b"x-profile") == b"1" and self.admin_token:
+            return secrets.compare_digest(headers.get(b"x-admin-token", b""),
+                                          self.admin_token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: List = []
+        token = _request_spans.set(spans)
+        headers = dict(scope.get("headers") or [])
+        profiler = None
+        profile_id = None
+        if self._should_profile(headers) and _profiler_busy.acquire(blocking=False):
+            profiler = _RequestProfiler()
+            profile_id = next(_profile_ids)
+            profiler.start()
+
+        request_start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing = ", ".join(
+                    f"{name.replace('.', '-')};dur={elapsed * 1000:.2f}"
+                    for name, elapsed in spans
+                )
+                extra = []
+                if timing:
+                    extra.append((b"server-timing", timing.encode()))
+                if profile_id is not None:
+                    extra.append((b"x-profile-id", str(profile_id).encode()))
+                if extra:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + extra
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            if profiler is not None:
+                try:
+                    output = profiler.stop()
+                finally:
+                    _profiler_busy.release()
+                _request_profiles.append({
+                    "id": profile_id,
+                    "path": scope.get("path"),
+                    "method": scope.get("method"),
+                    "profiler": profiler.kind,
+                    "duration_ms": round((time.perf_counter() - request_start) * 1000, 3),
+                    "timestamp": time.time(),
+                    "output": output
+                })
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+
+
+def sample_process(seconds: float = 10.0, interval: float = 0.005) -> str:
+    """
+    对当前进程的所有线程做定时栈采样
+
+    Args:
+        seconds: 采样时长（秒）
+        interval: 采样间隔（秒）
+
+    Returns:
+        折叠栈格式（每行 "栈帧;栈帧;... 次数"），可直接用于 flamegraph.pl / speedscope
+    """
+    own_thread = threading.get_ident()
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    counts: Counter = Counter()
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)))
+            counts[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+
+    return "\n".join(f"{stack} {count}" for stack, count in counts.most_common())
@@ -0,0 +1,382 @@
+"""
+外部API调用的容错层
+
+各渠道服务（WhatsApp等）共用，按端点分别维护：
+- 熔断器：连续失败或近期失败率过高时打开，打开期间直接失败，冷却后放行单个探测请求
+- 自适应超时：按近期延迟的 p99 乘以系数计算单次请求超时，限制在上下限之间
+- 重试：指数退避加抖动，整个调用受总期限约束；非幂等请求只有携带幂等键时
+  才重试结果不确定的失败（超时、5xx），连接失败和429总是可以重试
+- 对冲请求：幂等读请求超过 p95 延迟仍未返回时再发一个，取先返回的结果
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# 视为上游故障、计入熔断器且可重试的状态码
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+# 可以安全重复发送的方法
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器打开，请求未发出"""
+
+    def __init__(self, endpoint: str, retry_after: float):
+        super().__init__(f"Circuit open for {endpoint}, retry after {retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class UpstreamTimeout(httpx.TimeoutException):
+    """单次请求超过自适应超时"""
+
+
+class CircuitBreaker:
+    """
+    熔断器（closed → open → half_open → closed）
+
+    只在事件循环线程中使用，不需要加锁。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, failure_rate: float = 0.5,
+                 window: int = 20, min_calls: int = 10, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.failed_probes = 0
+        self.opened_count = 0
+        self._outcomes = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        """距离允许下一次探测的秒数"""
+        if self.state == self.OPEN:
+            return max(self._opened_at + self.reset_timeout - time.monotonic(), 0.0)
+        return 0.0
+
+    def before_call(self):
+        """请求前检查，打开状态或已有探测请求时抛出 CircuitOpenError"""
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.OPEN:
+            remaining = self.retry_after()
+            if remaining > 0:
+                raise CircuitOpenError(self.name, remaining)
+            self.state = self.HALF_OPEN
+        if self._probing:
+            raise CircuitOpenError(self.name, min(self.reset_timeout, 1.0))
+        self._probing = True
+
+    def release(self):
+        """请求被取消（如对冲请求中落后的一个），不计入结果"""
+        self._probing = False
+
+    def record_success(self):
+        self._probing = False
+        self.consecutive_failures = 0
+        self._outcomes.append(False)
+        if self.state != self.CLOSED:
+            logger.info(f"熔断器 {self.name} 已恢复")
+            self.state = self.CLOSED
+            self.failed_probes = 0
+            self._outcomes.clear()
+
+    def record_failure(self):
+        self._probing = False
+        self.consecutive_failures += 1
+        self._outcomes.append(True)
+        if self.state == self.HALF_OPEN:
+            self.failed_probes += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold or (
+            len(self._outcomes) >= self.min_calls
+            and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate
+        ):
+            self._open()
+
+    def _open(self):
+        if self.state != self.OPEN:
+            self.opened_count += 1
+            logger.warning(f"熔断器 {self.name} 已打开（连续失败 {self.consecutive_failures} 次）")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+
+    def get_status(self) -> Dict:
+        outcomes = len(self._outcomes)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "failure_rate": round(sum(self._outcomes) / outcomes, 3) if outcomes else 0.0,
+            "retry_after": round(self.retry_after(), 1),
+            "opened_count": self.opened_count,
+        }
+
+
+class LatencyTracker:
+    """
+    近期请求延迟统计，用于计算自适应超时和对冲延迟
+
+    只记录收到响应的请求；超时不计入，避免故障期间超时被不断推高。
+    """
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._sorted: Optional[list] = None
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self._sorted = None
+
+    def reset(self):
+        self._samples.clear()
+        self._sorted = None
+
+    def percentile(self, q: float) -> Optional[float]:
+        """样本不足时返回None"""
+        if len(self._samples) < self.min_samples:
+            return None
+        if self._sorted is None:
+            self._sorted = sorted(self._samples)
+        return self._sorted[min(int(len(self._sorted) * q), len(self._sorted) - 1)]
+
+
+class Endpoint:
+    """单个上游端点的熔断器和延迟统计"""
+
+    def __init__(self, name: str, breaker: CircuitBreaker, latency: LatencyTracker,
+                 timeout_min: float, timeout_max: float, timeout_multiplier: float):
+        self.name = name
+        self.breaker = breaker
+        self.latency = latency
+        self.timeout_min = timeout_min
+        self.timeout_max = timeout_max
+        self.timeout_multiplier = timeout_multiplier
+
+    def timeout(self) -> float:
+        """
+        当前单次请求超时（样本不足时使用上限）
+
+        熔断探测每失败一次超时翻倍，上游整体变慢后探测请求最终仍能成功并恢复。
+        """
+        p99 = self.latency.percentile(0.99)
+        if p99 is None:
+            return self.timeout_max
+        timeout = max(p99 * self.timeout_multiplier, self.timeout_min)
+        if self.breaker.state == CircuitBreaker.HALF_OPEN:
+            timeout *= 2 ** self.breaker.failed_probes
+        return min(timeout, self.timeout_max)
+
+    def hedge_delay(self) -> Optional[float]:
+        """发出对冲请求前的等待时间（p95，样本不足时不对冲）"""
+        p95 = self.latency.percentile(0.95)
+        return max(p95, 0.01) if p95 is not None else None
+
+    def get_status(self) -> Dict:
+        p50 = self.latency.percentile(0.5)
+        p99 = self.latency.percentile(0.99)
+        return {
+            **self.breaker.get_status(),
+            "timeout": round(self.timeout(), 3),
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+        }
+
+
+class ResilientClient:
+    """
+    带熔断、自适应超时、重试和对冲的HTTP调用封装
+
+    HTTP客户端由 client_factory 提供，连接池的创建和fork处理仍由渠道服务负责。
+    """
+
+    def __init__(self, name: str, client_factory: Callable[[], httpx.AsyncClient],
+                 timeout_min: float = None, timeout_max: float = None,
+                 timeout_multiplier: float = None, deadline: float = None,
+                 max_attempts: int = None, backoff_base: float = None,
+                 breaker_failures: int = None, breaker_failure_rate: float = None,
+                 breaker_reset: float = None, idempotency_header: str = "Idempotency-Key"):
+        self.name = name
+        self.client_factory = client_factory
+        self.timeout_min = timeout_min or settings.OUTBOUND_TIMEOUT_MIN
+        self.timeout_max = timeout_max or settings.OUTBOUND_TIMEOUT_MAX
+        self.timeout_multiplier = timeout_multiplier or settings.OUTBOUND_TIMEOUT_MULTIPLIER
+        self.deadline = deadline or settings.OUTBOUND_DEADLINE
+        self.max_attempts = max_attempts or settings.OUTBOUND_MAX_ATTEMPTS
+        self.backoff_base = backoff_base or settings.OUTBOUND_BACKOFF_BASE
+        self.breaker_failures = breaker_failures or settings.OUTBOUND_BREAKER_FAILURES
+        self.breaker_failure_rate = breaker_failure_rate or settings.OUTBOUND_BREAKER_FAILURE_RATE
+        self.breaker_reset = breaker_reset or settings.OUTBOUND_BREAKER_RESET
+        self.idempotency_header = idempotency_header
+        self._endpoints: Dict[str, Endpoint] = {}
+
+    def endpoint(self, name: str) -> Endpoint:
+        """获取（必要时创建）端点状态"""
+        endpoint = self._endpoints.get(name)
+        if endpoint is None:
+            endpoint = self._endpoints[name] = Endpoint(
+                f"{self.name}.{name}",
+                CircuitBreaker(f"{self.name}.{name}", failure_threshold=self.breaker_failures,
+                               failure_rate=self.breaker_failure_rate,
+                               reset_timeout=self.breaker_reset),
+                LatencyTracker(),
+                self.timeout_min, self.timeout_max, self.timeout_multiplier
+            )
+        return endpoint
+
+    def get_status(self) -> Dict[str, Dict]:
+        """各端点的熔断器状态和延迟统计"""
+        return {name: endpoint.get_status() for name, endpoint in self._endpoints.items()}
+
+    async def _attempt(self, endpoint: Endpoint, method: str, url: str,
+                       timeout: float, kwargs: Dict) -> httpx.Response:
+        """发出一次请求并记录结果（调用前已通过熔断器检查）"""
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                self.client_factory().request(method, url, **kwargs), timeout
+            )
+        except asyncio.CancelledError:
+            endpoint.breaker.release()
+            raise
+        except asyncio.TimeoutError:
+            endpoint.breaker.record_failure()
+            raise UpstreamTimeout(f"{endpoint.name} timed out after {timeout:.2f}s")
+        except Exception:
+            endpoint.breaker.record_failure()
+            raise
+
+        if response.status_code in RETRYABLE_STATUS:
+            endpoint.breaker.record_failure()
+        else:
+            if endpoint.breaker.state != CircuitBreaker.CLOSED:
+                # 熔断恢复，之前的延迟分布已不能代表上游现状
+                endpoint.latency.reset()
+            endpoint.breaker.record_success()
+        endpoint.latency.record(time.monotonic() - start)
+        return response
+
+    async def _hedged(self, endpoint: Endpoint, method: str, url: str,
+                      timeout: float, kwargs: Dict) -> httpx.Response:
+        """超过对冲延迟仍未返回时再发一个请求，返回先成功的结果"""
+        delay = endpoint.hedge_delay()
+        if delay is None or delay >= timeout or endpoint.breaker.state != CircuitBreaker.CLOSED:
+            return await self._attempt(endpoint, method, url, timeout, kwargs)
+
+        pending = {asyncio.ensure_future(self._attempt(endpoint, method, url, timeout, kwargs))}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=delay)
+            if not done:
+                pending.add(asyncio.ensure_future(
+                    self._attempt(endpoint, method, url, timeout - delay, kwargs)
+                ))
+            fallback = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        if task.result().status_code not in RETRYABLE_STATUS:
+                            return task.result()
+                        fallback = task
+                    elif fallback is None:
+                        fallback = task
+                if not pending:
+                    # 都失败时优先返回上游响应，其次抛出异常
+                    return fallback.result()
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+    @staticmethod
+    def _retry_delay(response: Optional[httpx.Response], attempt: int, base: float) -> float:
+        """指数退避加抖动；429/503 带 Retry-After 时以其为准"""
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after and retry_after.isdigit():
+                return float(retry_after)
+        return random.uniform(0, base * 2 ** (attempt - 1))
+
+    async def request(self, endpoint_name: str, method: str, url: str, *,
+                      idempotency_key: Optional[str] = None, hedge: bool = False,
+                      **kwargs) -> httpx.Response:
+        """
+        发送请求
+
+        Args:
+            endpoint_name: 端点名称（熔断和延迟统计按端点区分）
+            method: HTTP方法
+            url: 请求地址
+            idempotency_key: 幂等键，非幂等请求提供后才会重试结果不确定的失败
+            hedge: 是否对冲（仅对幂等方法生效）
+            **kwargs: 传给 httpx 的其他参数
+
+        Returns:
+            最后一次请求的响应（包括重试用尽后的 429/5xx 响应）
+
+        Raises:
+            CircuitOpenError: 熔断器打开
+            httpx.TransportError: 连接失败或超时（重试用尽或超过总期限）
+        """
+        method = method.upper()
+        endpoint = self.endpoint(endpoint_name)
+        if idempotency_key:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), self.idempotency_header: idempotency_key}
+        repeatable = method in IDEMPOTENT_METHODS or bool(idempotency_key)
+        hedge = hedge and method in IDEMPOTENT_METHODS
+        deadline = time.monotonic() + self.deadline
+
+        attempt = 0
+        while True:
+            attempt += 1
+            # 先检查总期限再占用熔断器（半开状态下 before_call 会占用唯一的探测名额）
+            timeout = min(endpoint.timeout(), deadline - time.monotonic())
+            if timeout <= 0:
+                raise UpstreamTimeout(f"{endpoint.name} deadline of {self.deadline:.1f}s exceeded")
+            endpoint.breaker.before_call()
+
+            response: Optional[httpx.Response] = None
+            try:
+                if hedge:
+                    response = await self._hedged(endpoint, method, url, timeout, kwargs)
+                else:
+                    response = await self._attempt(endpoint, method, url, timeout, kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout) as e:
+                # 请求未到达上游，总是可以重试
+                if attempt >= self.max_attempts:
+                    raise
+                error = e
+            except httpx.TransportError as e:
+                if not repeatable or attempt >= self.max_attempts:
+                    raise
+                error = e
+            else:
+                if response.status_code not in RETRYABLE_STATUS or attempt >= self.max_attempts:
+                    return response
+                # 429 表示请求未被处理；5xx 结果不确定
+                if response.status_code != 429 and not repeatable:
+                    return response
+
+            delay = self._retry_delay(response, attempt, self.backoff_base)
+            if time.monotonic() + delay >= deadline:
+                if response is not None:
+                    return response
+                raise error
+            await asyncio.sleep(delay)
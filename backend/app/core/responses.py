@@ -0,0 +1,104 @@
+"""
+JSON响应和条件请求
+
+- DefaultJSONResponse：安装了 orjson 时使用 ORJSONResponse，否则退回标准库 JSONResponse
+- conditional_json：根据 ETag / Last-Modified 处理条件GET，未变化时直接返回304，
+  不再查询明细和序列化；变化时直接返回响应对象，跳过 FastAPI 的 jsonable_encoder
+"""
+
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse as DefaultJSONResponse
+except ImportError:  # pragma: no cover - 未安装orjson时使用标准库
+    orjson = None
+    DefaultJSONResponse = JSONResponse
+
+
+def make_etag(*parts: Any) -> str:
+    """由版本信息（数量、最后更新时间、查询参数等）生成弱ETag"""
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return 'W/"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+
+def format_http_date(value: datetime) -> str:
+    """将UTC时间（数据库中为naive UTC）格式化为HTTP日期"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match 使用弱比较
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: Optional[str],
+                    last_modified: Optional[datetime]) -> bool:
+    """
+    判断条件GET是否可以返回304
+
+    同时携带 If-None-Match 和 If-Modified-Since 时以 If-None-Match 为准。
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # HTTP日期只精确到秒
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def conditional_json(
+    request: Request,
+    etag: str,
+    last_modified: Optional[datetime],
+    build: Callable[[], Any],
+    cache_control: str = "private, no-cache"
+) -> Response:
+    """
+    返回支持条件GET的JSON响应
+
+    Args:
+        request: 当前请求
+        etag: make_etag 生成的ETag
+        last_modified: 数据的最后更新时间（通常为 max(updated_at)）
+        build: 生成响应内容的函数，只在数据变化时调用
+        cache_control: Cache-Control 响应头
+
+    Returns:
+        304响应或JSON响应
+    """
+    headers: Dict[str, str] = {"ETag": etag, "Cache-Control": cache_control}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_http_date(last_modified)
+
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    return DefaultJSONResponse(build(), headers=headers)
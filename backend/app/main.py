@@ -6,7 +6,16 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .core.config import settings
+from .core.cache import cache
+from .core.compression import CompressionMiddleware
+from .core.database import SessionLocal
+from .core.profiling import ProfilingMiddleware, install_db_hooks
+from .core.responses import DefaultJSONResponse
 from .api import api_router
+from .services.event_hub import event_hub
+from .services.outbox_service import outbox_dispatcher
+from .services.rollup_service import install_rollup_hooks, rollup_aggregator
+from .services.whatsapp_service import whatsapp_service
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -15,6 +24,7 @@ app = FastAPI(
     description="多渠道AI客户服务平台",
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    default_response_class=DefaultJSONResponse,
 )
 
 # 配置CORS
@@ -27,10 +37,52 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_headers=["*"],
     )
 
+# 响应压缩（流式响应和SSE不压缩）
+if settings.COMPRESSION_MINIMUM_SIZE > 0:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+# 性能剖析（关闭时不注册中间件）
+if settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        sample_rate=settings.PROFILE_SAMPLE_RATE,
+        admin_token=settings.ADMIN_TOKEN,
+    )
+    install_db_hooks(SessionLocal)
+
+# 统计汇总：提交后记录消息变化
+if settings.ROLLUPS_ENABLED:
+    install_rollup_hooks(SessionLocal)
+
 # 包含API路由
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 
+@app.on_event("startup")
+async def startup():
+    """启动当前worker的后台任务"""
+    if settings.OUTBOX_DISPATCHER_ENABLED:
+        outbox_dispatcher.start()
+    event_hub.start()
+    if settings.ROLLUPS_ENABLED:
+        rollup_aggregator.start()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """停止后台任务并关闭当前worker持有的外部连接"""
+    await outbox_dispatcher.stop()
+    await event_hub.stop()
+    await rollup_aggregator.stop()
+    await whatsapp_service.aclose()
+    await cache.close()
+
+
 @app.get("/")
 async def root():
     """根路径"""
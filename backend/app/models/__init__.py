@@ -3,8 +3,11 @@
 """
 
 from .message import Message
+from .message_archive import MessageArchive
+from .message_rollup import MessageRollup, RollupRebuild
+from .outbox import OutboxMessage
 from .customer import Customer
 from .response import Response
 from .business import BusinessConfig
 
-__all__ = ["Message", "Customer", "Response", "BusinessConfig"]
\ No newline at end of file
+__all__ = ["Message", "MessageArchive", "MessageRollup", "RollupRebuild", "OutboxMessage", "Customer", "Response", "BusinessConfig"]
\ No newline at end of file
@@ -0,0 +1,25 @@
+"""
+商家配置数据模型
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class BusinessConfig(Base):
+    """商家配置模型（键值形式保存营业时间、自动回复模板等配置）"""
+    
+    __tablename__ = "business_configs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    key = Column(String, unique=True, index=True, nullable=False)
+    value = Column(JSON, default=dict)
+    
+    # 时间戳
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<BusinessConfig(key={self.key})>"
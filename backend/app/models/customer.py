@@ -2,12 +2,30 @@
 客户数据模型
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Text
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Index, func, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
 from ..core.database import Base
 
+# 电话号码中去重时忽略的分隔符
+PHONE_SEPARATORS = "+ -()."
+
+
+def normalized_phone(column):
+    """去掉分隔符的电话号码（字面量直接写入SQL，查询才能命中表达式索引）"""
+    for char in PHONE_SEPARATORS:
+        column = func.replace(column, text(f"'{char}'"), text("''"))
+    return column
+
+
+def normalized_email(column):
+    return func.lower(func.trim(column))
+
+
+def normalized_handle(column):
+    return func.lower(func.ltrim(func.trim(column), text("'@'")))
+
 
 class Customer(Base):
     """客户模型"""
@@ -23,7 +41,7 @@ class Customer(Base):
     instagram_handle = Column(String, unique=True, index=True, nullable=True)
     
     # 客户元数据
-    metadata = Column(JSON, default=dict)
+    meta = Column("metadata", JSON, default=dict)  # metadata 是声明式模型的保留属性名
     preferences = Column(JSON, default=dict)
     tags = Column(JSON, default=list)
     
@@ -39,4 +57,11 @@ class Customer(Base):
     messages = relationship("Message", back_populates="customer")
     
     def __repr__(self):
-        return f"<Customer(id={self.id}, name={self.name})>"
\ No newline at end of file
+        return f"<Customer(id={self.id}, name={self.name})>"
+
+
+# 按规范化后的联系方式去重（批量导入时匹配格式不同的已有记录）
+Index("ix_customers_phone_normalized", normalized_phone(Customer.__table__.c.phone))
+Index("ix_customers_email_normalized", normalized_email(Customer.__table__.c.email))
+Index("ix_customers_instagram_handle_normalized",
+      normalized_handle(Customer.__table__.c.instagram_handle))
@@ -2,8 +2,8 @@
 消息数据模型
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Enum, JSON, Text, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Enum, JSON, Text, ForeignKey, event
+from sqlalchemy.orm import column_property, relationship
 from datetime import datetime
 import enum
 
@@ -43,27 +43,43 @@ class Message(Base):
     external_id = Column(String, unique=True, index=True, nullable=True)
     
     # 消息基本信息
-    channel = Column(Enum(ChannelType), nullable=False)
+    # 渠道、状态、优先级和元数据是统计汇总的维度，active_history 保证修改已过期的
+    # 对象（如提交后）时先加载旧值，汇总才能从旧维度行移到新维度行
+    channel = column_property(Column(Enum(ChannelType), nullable=False), active_history=True)
     sender = Column(String, nullable=False)
     recipient = Column(String, nullable=True)
     content = Column(Text, nullable=False)
     
     # 消息元数据
-    status = Column(Enum(MessageStatus), default=MessageStatus.UNREAD)
-    priority = Column(Enum(MessagePriority), default=MessagePriority.NORMAL)
-    metadata = Column(JSON, default=dict)
+    status = column_property(
+        Column(Enum(MessageStatus), default=MessageStatus.UNREAD, index=True), active_history=True
+    )
+    priority = column_property(
+        Column(Enum(MessagePriority), default=MessagePriority.NORMAL), active_history=True
+    )
+    # metadata 是声明式模型的保留属性名
+    meta = column_property(Column("metadata", JSON, default=dict), active_history=True)
     
     # 时间戳
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     received_at = Column(DateTime, default=datetime.utcnow)
+    # 首次变为已回复的时间（之后再归档或转发也保留）
+    replied_at = column_property(Column(DateTime, nullable=True), active_history=True)
     
     # 关联关系
-    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True)
+    customer_id = Column(Integer, ForeignKey("customers.id"), nullable=True, index=True)
     customer = relationship("Customer", back_populates="messages")
     
     response_id = Column(Integer, ForeignKey("responses.id"), nullable=True)
     response = relationship("Response", back_populates="message")
     
     def __repr__(self):
-        return f"<Message(id={self.id}, channel={self.channel}, sender={self.sender[:20]})>"
\ No newline at end of file
+        return f"<Message(id={self.id}, channel={self.channel}, sender={self.sender[:20]})>"
+
+
+@event.listens_for(Message.status, "set")
+def _mark_replied(target, value, oldvalue, initiator):
+    """消息第一次变为已回复时记录回复时间"""
+    if value == MessageStatus.REPLIED and target.replied_at is None:
+        target.replied_at = datetime.utcnow()
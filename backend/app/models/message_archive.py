@@ -0,0 +1,60 @@
+"""
+归档消息数据模型
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, Enum, JSON, Text, Index
+from datetime import datetime
+
+from ..core.database import Base
+from .message import ChannelType, MessageStatus, MessagePriority
+
+
+class MessageArchive(Base):
+    """
+    归档消息模型（冷数据）
+
+    字段与 messages 表一致并保留原消息ID。Postgres 上按 archive_month（YYYYMM）
+    做 LIST 分区，每月一个分区表（messages_archive_YYYYMM，归档时按需创建），
+    整月清理直接删除分区表，不产生大范围 DELETE 和 VACUUM 开销。
+    SQLite（开发环境）不支持分区，仍是单表，按月清理退化为分批删除。
+    """
+
+    __tablename__ = "messages_archive"
+
+    # 分区表的主键必须包含分区键
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    external_id = Column(String, index=True, nullable=True)
+
+    # 消息基本信息
+    channel = Column(Enum(ChannelType), nullable=False)
+    sender = Column(String, nullable=False)
+    recipient = Column(String, nullable=True)
+    content = Column(Text, nullable=False)
+
+    # 消息元数据
+    status = Column(Enum(MessageStatus), nullable=True)
+    priority = Column(Enum(MessagePriority), nullable=True)
+    meta = Column("metadata", JSON, default=dict)
+
+    # 时间戳
+    created_at = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, nullable=True)
+    received_at = Column(DateTime, nullable=True)
+    replied_at = Column(DateTime, nullable=True)
+
+    # 关联（归档后不再维护外键约束）
+    customer_id = Column(Integer, nullable=True)
+    response_id = Column(Integer, nullable=True)
+
+    # 分区信息
+    archive_month = Column(String(6), primary_key=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_messages_archive_month_id", "archive_month", "id"),
+        Index("ix_messages_archive_customer_created", "customer_id", "created_at"),
+        {"postgresql_partition_by": "LIST (archive_month)"},
+    )
+
+    def __repr__(self):
+        return f"<MessageArchive(id={self.id}, channel={self.channel}, month={self.archive_month})>"
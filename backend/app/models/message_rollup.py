@@ -0,0 +1,64 @@
+"""
+消息统计汇总数据模型
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, Float, UniqueConstraint
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class MessageRollup(Base):
+    """
+    消息统计汇总模型
+
+    每行对应 (粒度, 时间桶, 渠道, 意图, 优先级, 状态) 的一个组合，维度保存枚举值字符串。
+    粒度为 hour 或 day，天行与当天的小时行同步维护，按天查询时直接读取天行。
+    时间桶按消息的 created_at 归属；状态变化时从旧状态行移到新状态行，
+    首次回复耗时计入回复时状态（replied）所在的行。
+    """
+
+    __tablename__ = "message_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # 维度
+    period = Column(String(5), nullable=False, default="hour")
+    bucket = Column(DateTime, nullable=False)
+    channel = Column(String(20), nullable=False)
+    intent = Column(String(50), nullable=False)
+    priority = Column(String(20), nullable=False)
+    status = Column(String(20), nullable=False)
+
+    # 指标
+    message_count = Column(Integer, nullable=False, default=0)
+    first_reply_count = Column(Integer, nullable=False, default=0)
+    first_reply_seconds = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        # 同时作为按粒度和时间范围查询的索引
+        UniqueConstraint("period", "bucket", "channel", "intent", "priority", "status",
+                         name="uq_message_rollups_dims"),
+    )
+
+    def __repr__(self):
+        return f"<MessageRollup(bucket={self.bucket}, channel={self.channel}, count={self.message_count})>"
+
+
+class RollupRebuild(Base):
+    """
+    统计汇总重建记录
+
+    自增ID即汇总版本号。各worker的内存增量带着产生时的版本号，
+    写入时丢弃版本早于某次重建、且时间桶落在该次重建范围内的增量（已由重建计入）。
+    """
+
+    __tablename__ = "rollup_rebuilds"
+
+    id = Column(Integer, primary_key=True)
+    start = Column(DateTime, nullable=True)  # 为空表示不限
+    end = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<RollupRebuild(id={self.id}, start={self.start}, end={self.end})>"
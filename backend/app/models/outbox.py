@@ -0,0 +1,62 @@
+"""
+发件箱数据模型
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, Enum, JSON, Text, Index
+from datetime import datetime
+import enum
+
+from ..core.database import Base
+from .message import ChannelType
+
+
+class OutboxStatus(enum.Enum):
+    """发件箱状态"""
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    SENT = "sent"
+    FAILED = "failed"
+
+
+class OutboxMessage(Base):
+    """
+    发件箱模型
+
+    待发送的回复与对应的消息记录在同一事务中写入，由后台分发器异步投递。
+    """
+
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # 投递目标
+    channel = Column(Enum(ChannelType), nullable=False)
+    recipient = Column(String, nullable=False, index=True)
+    message_type = Column(String, default="text")
+    payload = Column(JSON, default=dict)
+
+    # 投递状态
+    status = Column(Enum(OutboxStatus), default=OutboxStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=5)
+    available_at = Column(DateTime, default=datetime.utcnow)
+    locked_until = Column(DateTime, nullable=True)
+    claim_token = Column(String, nullable=True, index=True)
+    external_id = Column(String, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    # 时间戳
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+    # 关联的回复消息（不加外键约束：消息超过保留期会移入归档表，ID保持不变）
+    message_id = Column(Integer, nullable=True, index=True)
+
+    __table_args__ = (
+        Index("ix_outbox_status_available", "status", "available_at", "id"),
+        # 认领时判断接收者队首（是否有更早的未完成记录）
+        Index("ix_outbox_recipient_status_id", "recipient", "status", "id"),
+    )
+
+    def __repr__(self):
+        return f"<OutboxMessage(id={self.id}, recipient={self.recipient}, status={self.status})>"
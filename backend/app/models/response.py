@@ -0,0 +1,32 @@
+"""
+回复数据模型
+"""
+
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Float, Text
+from sqlalchemy.orm import relationship
+from datetime import datetime
+
+from ..core.database import Base
+
+
+class Response(Base):
+    """回复模型（自动生成或人工编写的回复内容）"""
+    
+    __tablename__ = "responses"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    
+    # 回复内容
+    content = Column(Text, nullable=False)
+    intent = Column(String, nullable=True)
+    confidence = Column(Float, nullable=True)
+    is_auto = Column(Boolean, default=True)
+    
+    # 时间戳
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    # 关联关系
+    message = relationship("Message", back_populates="response", uselist=False)
+    
+    def __repr__(self):
+        return f"<Response(id={self.id}, intent={self.intent})>"
@@ -2,16 +2,8 @@
 业务服务
 """
 
-from .message_service import MessageService
-from .customer_service import CustomerService
 from .intent_classifier import IntentClassifier
-from .response_generator import ResponseGenerator
-from .knowledge_base import KnowledgeBase
 
 __all__ = [
-    "MessageService",
-    "CustomerService", 
-    "IntentClassifier",
-    "ResponseGenerator",
-    "KnowledgeBase"
-]
\ No newline at end of file
+    "IntentClassifier"
+]
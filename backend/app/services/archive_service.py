@@ -0,0 +1,368 @@
+"""
+消息归档服务
+
+将超过保留期或已标记为 ARCHIVED 的消息分批迁移到 messages_archive 表，
+保持 messages 热表（收件箱查询）的索引规模和清理成本可控。
+归档后的消息仍可通过客户历史接口透明读取。
+归档表按月分区（Postgres），整月数据可以导出为 NDJSON 后删除分区。
+
+手动执行：
+    python -m app.services.archive_service --retention-days 90
+    python -m app.services.archive_service --export-month 202401 --output archive-202401.ndjson
+    python -m app.services.archive_service --drop-month 202401
+"""
+
+import argparse
+import json
+import logging
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, or_, select, text
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..models.message import Message, MessageStatus
+from ..models.message_archive import MessageArchive
+
+logger = logging.getLogger(__name__)
+
+_MONTH_PATTERN = re.compile(r"^\d{4}(0[1-9]|1[0-2])$")
+
+
+def _check_month(month: str) -> str:
+    """校验月份格式（YYYYMM），分区表名由其拼接"""
+    if not _MONTH_PATTERN.match(month or ""):
+        raise ValueError(f"Invalid archive month: {month!r}, expected YYYYMM")
+    return month
+
+
+def partition_name(month: str) -> str:
+    """月份对应的分区表名"""
+    return f"{MessageArchive.__tablename__}_{_check_month(month)}"
+
+
+class ArchiveService:
+    """消息归档服务"""
+
+    def __init__(self, retention_days: int = None, batch_size: int = None):
+        self.retention_days = retention_days or settings.MESSAGE_RETENTION_DAYS
+        self.batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+
+    def _archive_conditions(self, cutoff: datetime):
+        """归档条件（分开执行，每个条件都能走索引）"""
+        messages = Message.__table__
+        return [
+            messages.c.created_at < cutoff,
+            messages.c.status == MessageStatus.ARCHIVED,
+        ]
+
+    @staticmethod
+    def _is_partitioned(db: Session) -> bool:
+        return db.get_bind().dialect.name == "postgresql"
+
+    def ensure_partitions(self, db: Session, months) -> None:
+        """创建尚不存在的月分区（仅 Postgres，在当前事务中执行）"""
+        if not self._is_partitioned(db):
+            return
+        for month in sorted(set(months)):
+            db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+                f"PARTITION OF {MessageArchive.__tablename__} FOR VALUES IN ('{month}')"
+            ))
+
+    def archive_batch(self, db: Session, condition) -> int:
+        """
+        归档一批满足条件的消息（单个事务内插入归档表并从热表删除）
+
+        Returns:
+            本批归档的消息数
+        """
+        messages = Message.__table__
+        rows = db.execute(
+            select(messages)
+            .where(condition)
+            .order_by(messages.c.id)
+            .limit(self.batch_size)
+        ).mappings().all()
+
+        if not rows:
+            return 0
+
+        archived_at = datetime.utcnow()
+        archive_rows = []
+        for row in rows:
+            values = dict(row)
+            values["meta"] = values.pop("metadata")
+            created_at = values.get("created_at") or archived_at
+            values["archive_month"] = created_at.strftime("%Y%m")
+            values["archived_at"] = archived_at
+            archive_rows.append(values)
+
+        ids = [row["id"] for row in rows]
+        self.ensure_partitions(db, (values["archive_month"] for values in archive_rows))
+        db.execute(insert(MessageArchive), archive_rows)
+        db.execute(delete(messages).where(messages.c.id.in_(ids)))
+        db.commit()
+        return len(rows)
+
+    def run(self, db: Session, max_batches: Optional[int] = None) -> Dict:
+        """
+        执行归档任务
+
+        Args:
+            db: 数据库会话
+            max_batches: 最多处理的批次数（None表示处理到没有可归档消息为止）
+
+        Returns:
+            归档统计
+        """
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        total = 0
+        batches = 0
+
+        for condition in self._archive_conditions(cutoff):
+            while max_batches is None or batches < max_batches:
+                try:
+                    count = self.archive_batch(db, condition)
+                except Exception as e:
+                    db.rollback()
+                    logger.error(f"消息归档失败（已归档 {total} 条）: {e}")
+                    raise
+                if not count:
+                    break
+                total += count
+                batches += 1
+
+        logger.info(f"消息归档完成: {total} 条, {batches} 批, 截止时间 {cutoff.isoformat()}")
+        return {
+            "archived_count": total,
+            "batches": batches,
+            "cutoff": cutoff.isoformat()
+        }
+
+    @staticmethod
+    def _before(table, before: Optional[datetime], before_id: Optional[int]):
+        """
+        翻页游标条件：排在 (before, before_id) 之后（按 created_at、id 倒序）
+
+        两张表共用消息ID，(created_at, id) 在合并后的历史中唯一，
+        同一时间戳的多条消息跨页时不会被跳过。
+        """
+        if before is None:
+            return None
+        if before_id is None:
+            return table.c.created_at < before
+        return or_(
+            table.c.created_at < before,
+            and_(table.c.created_at == before, table.c.id < before_id)
+        )
+
+    def get_customer_history(self, db: Session, customer_id: int, limit: int = 50,
+                             before: Optional[datetime] = None,
+                             before_id: Optional[int] = None) -> List[Dict]:
+        """
+        读取客户消息历史（合并热表和归档表）
+
+        Args:
+            db: 数据库会话
+            customer_id: 客户ID
+            limit: 返回条数
+            before: 翻页游标，上一页最后一条消息的创建时间
+            before_id: 翻页游标，上一页最后一条消息的ID
+
+        Returns:
+            按创建时间、ID倒序的消息列表
+        """
+        history = []
+        for model, archived in ((Message, False), (MessageArchive, True)):
+            table = model.__table__
+            query = select(table).where(table.c.customer_id == customer_id)
+            condition = self._before(table, before, before_id)
+            if condition is not None:
+                query = query.where(condition)
+            query = query.order_by(table.c.created_at.desc(), table.c.id.desc()).limit(limit)
+            for row in db.execute(query).mappings():
+                history.append(self._to_dict(row, archived))
+
+        history.sort(key=lambda m: (m["created_at"] or "", m["id"]), reverse=True)
+        return history[:limit]
+
+    def get_history_version(self, db: Session, customer_id: int,
+                            before: Optional[datetime] = None,
+                            before_id: Optional[int] = None) -> Tuple[int, int, Optional[datetime]]:
+        """
+        客户消息历史的版本信息，用于生成ETag
+
+        Returns:
+            (热表消息数, 归档表消息数, 最后更新时间)。归档只在两张表之间移动消息，
+            总数和更新时间都不变，因此两张表的数量分开返回；updated_at 为空时取 created_at。
+        """
+        counts = []
+        last_modified = None
+        for model in (Message, MessageArchive):
+            table = model.__table__
+            query = select(
+                func.count(),
+                func.max(func.coalesce(table.c.updated_at, table.c.created_at))
+            ).where(table.c.customer_id == customer_id)
+            condition = self._before(table, before, before_id)
+            if condition is not None:
+                query = query.where(condition)
+            count, latest = db.execute(query).one()
+            counts.append(count)
+            if latest is not None and (last_modified is None or latest > last_modified):
+                last_modified = latest
+        return counts[0], counts[1], last_modified
+
+    def get_stats(self, db: Session) -> Dict:
+        """热表和归档表的消息数"""
+        return {
+            "hot_count": db.execute(select(func.count()).select_from(Message.__table__)).scalar(),
+            "archived_count": db.execute(
+                select(func.count()).select_from(MessageArchive.__table__)
+            ).scalar()
+        }
+
+    def list_months(self, db: Session) -> List[Dict]:
+        """各归档月份的消息数"""
+        table = MessageArchive.__table__
+        rows = db.execute(
+            select(table.c.archive_month, func.count())
+            .group_by(table.c.archive_month)
+            .order_by(table.c.archive_month)
+        ).all()
+        return [{"month": month, "count": count} for month, count in rows]
+
+    def export_month(self, db: Session, month: str, page_size: int = 1000) -> Iterator[str]:
+        """
+        按ID顺序导出某月的归档消息（每行一个JSON对象，包含全部字段）
+
+        Args:
+            db: 数据库会话
+            month: 归档月份（YYYYMM）
+            page_size: 每次查询的行数
+
+        Yields:
+            NDJSON 行（含换行符）
+        """
+        _check_month(month)
+        table = MessageArchive.__table__
+        last_id = None
+        while True:
+            query = select(table).where(table.c.archive_month == month)
+            if last_id is not None:
+                query = query.where(table.c.id > last_id)
+            rows = db.execute(query.order_by(table.c.id).limit(page_size)).mappings().all()
+            if not rows:
+                return
+            for row in rows:
+                record = {key: self._export_value(value) for key, value in row.items()}
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+            last_id = rows[-1]["id"]
+
+    def drop_month(self, db: Session, month: str) -> Dict:
+        """
+        删除某月的全部归档消息
+
+        Postgres 直接删除该月分区表；SQLite 按批删除。
+        已写入统计汇总表的计数不受影响，但之后重建该时间段的汇总会不再包含这些消息。
+
+        Returns:
+            删除的消息数
+        """
+        _check_month(month)
+        table = MessageArchive.__table__
+        count = db.execute(
+            select(func.count()).select_from(table).where(table.c.archive_month == month)
+        ).scalar()
+
+        if self._is_partitioned(db):
+            db.execute(text(f"DROP TABLE IF EXISTS {partition_name(month)}"))
+            db.commit()
+        else:
+            while True:
+                ids = select(table.c.id).where(table.c.archive_month == month).limit(self.batch_size)
+                deleted = db.execute(
+                    delete(table).where(table.c.archive_month == month, table.c.id.in_(ids))
+                ).rowcount
+                db.commit()
+                if not deleted:
+                    break
+
+        logger.info(f"已删除归档月份 {month}: {count} 条")
+        return {"month": month, "deleted_count": count}
+
+    @staticmethod
+    def _export_value(value):
+        if hasattr(value, "value"):
+            return value.value
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    @staticmethod
+    def _to_dict(row, archived: bool) -> Dict:
+        def value(v):
+            if hasattr(v, "value"):
+                return v.value
+            if isinstance(v, datetime):
+                return v.isoformat()
+            return v
+
+        return {
+            "id": row["id"],
+            "external_id": row["external_id"],
+            "channel": value(row["channel"]),
+            "sender": row["sender"],
+            "recipient": row["recipient"],
+            "content": row["content"],
+            "status": value(row["status"]),
+            "priority": value(row["priority"]),
+            "created_at": value(row["created_at"]),
+            "updated_at": value(row["updated_at"]),
+            "archived": archived
+        }
+
+
+# 创建全局实例
+archive_service = ArchiveService()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="归档过期消息")
+    parser.add_argument("--retention-days", type=int, default=settings.MESSAGE_RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--export-month", help="导出某月的归档消息（YYYYMM）")
+    parser.add_argument("--output", help="导出文件路径（默认输出到标准输出）")
+    parser.add_argument("--drop-month", help="删除某月的归档消息（YYYYMM）")
+    args = parser.parse_args()
+
+    from ..core.database import SessionLocal
+
+    service = ArchiveService(args.retention_days, args.batch_size)
+    db = SessionLocal()
+    try:
+        if args.export_month:
+            output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+            try:
+                for line in service.export_month(db, args.export_month):
+                    output.write(line)
+            finally:
+                if output is not sys.stdout:
+                    output.close()
+            return
+        if args.drop_month:
+            result = service.drop_month(db, args.drop_month)
+        else:
+            result = service.run(db, args.max_batches)
+    finally:
+        db.close()
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,606 @@
+"""
+客户批量导入导出服务
+
+导入：
+- 流式读取 CSV / NDJSON 请求体，按块（CUSTOMER_IMPORT_CHUNK_SIZE 行）解析和写入，
+  内存占用与文件大小无关
+- 按 phone / email / instagram_handle 去重：块内先合并重复行，再按三个字段的规范化
+  表达式索引查询已有客户（库中已有的 "+86 138-..."、大写邮箱等也能命中），
+  命中则批量更新（非空字段覆盖，tags 合并，preferences 按键合并），
+  未命中则批量插入；同时命中多个不同客户的行记为冲突跳过
+- Postgres（psycopg2）使用 COPY 写入临时表，再以 UPDATE ... FROM 和
+  INSERT ... ON CONFLICT DO NOTHING 合并；其他情况使用 executemany；每块一个事务
+- 进度写入共享缓存，任意worker都可以查询
+
+导出：按主键分页读取，逐页输出 CSV / NDJSON，不长时间占用数据库连接。
+"""
+
+import asyncio
+import codecs
+import csv
+import io
+import itertools
+import json
+import logging
+import re
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+
+from ..core.cache import cache
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.customer import Customer, normalized_email, normalized_handle, normalized_phone
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "ndjson")
+KEY_FIELDS = ("phone", "email", "instagram_handle")
+# 已有记录一侧的规范化表达式（与导入行的 _normalize_* 对应，均有表达式索引）
+KEY_EXPRESSIONS = {
+    "phone": normalized_phone,
+    "email": normalized_email,
+    "instagram_handle": normalized_handle,
+}
+EXPORT_FIELDS = ("id", "name", "phone", "email", "instagram_handle", "tags", "preferences",
+                 "message_count", "last_message_at", "created_at", "updated_at")
+
+# COPY 临时表的列（id 为空表示新客户）
+STAGE_FIELDS = ("id", "name", "phone", "email", "instagram_handle", "tags", "preferences", "updated_at")
+
+UPDATE_SQL = text(
+    "UPDATE customers SET name = :name, phone = :phone, email = :email, "
+    "instagram_handle = :instagram_handle, tags = :tags, preferences = :preferences, "
+    "updated_at = :updated_at WHERE id = :id"
+)
+INSERT_SQL = text(
+    "INSERT INTO customers (name, phone, email, instagram_handle, tags, preferences, metadata, "
+    "message_count, created_at, updated_at) VALUES (:name, :phone, :email, :instagram_handle, "
+    ":tags, :preferences, '{}', 0, :updated_at, :updated_at) ON CONFLICT DO NOTHING"
+)
+
+_NON_DIGITS = re.compile(r"\D")
+
+# 进度保留时间（秒）
+PROGRESS_TTL = 24 * 3600
+# 每个任务最多记录的错误数
+MAX_ERRORS = 100
+
+
+class CustomerImportError(ValueError):
+    """导入数据格式错误"""
+
+
+def _normalize_phone(value) -> Optional[str]:
+    # 只保留数字；库中已有记录匹配时只去掉 PHONE_SEPARATORS 中的分隔符
+    if value is None:
+        return None
+    return _NON_DIGITS.sub("", str(value)) or None
+
+
+def _normalize_email(value) -> Optional[str]:
+    value = str(value).strip().lower() if value is not None else ""
+    return value or None
+
+
+def _normalize_handle(value) -> Optional[str]:
+    value = str(value).strip().lstrip("@").lower() if value is not None else ""
+    return value or None
+
+
+def _parse_tags(value) -> List[str]:
+    if value in (None, ""):
+        return []
+    if isinstance(value, str):
+        value = value.strip()
+        if value.startswith("["):
+            value = json.loads(value)
+        else:
+            value = value.split(";")
+    if not isinstance(value, list):
+        raise CustomerImportError("tags must be a list")
+    return [str(tag).strip() for tag in value if str(tag).strip()]
+
+
+def _parse_preferences(value) -> Dict:
+    if value in (None, ""):
+        return {}
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, dict):
+        raise CustomerImportError("preferences must be an object")
+    return value
+
+
+def normalize_row(raw: Dict) -> Dict:
+    """
+    规范化一行导入数据
+
+    Raises:
+        CustomerImportError: 缺少去重字段或字段格式错误
+    """
+    name = str(raw.get("name") or "").strip()
+    row = {
+        "name": name or None,
+        "phone": _normalize_phone(raw.get("phone")),
+        "email": _normalize_email(raw.get("email")),
+        "instagram_handle": _normalize_handle(raw.get("instagram_handle")),
+    }
+    try:
+        row["tags"] = _parse_tags(raw.get("tags"))
+        row["preferences"] = _parse_preferences(raw.get("preferences"))
+    except json.JSONDecodeError as e:
+        raise CustomerImportError(f"invalid JSON: {e}")
+    if not any(row[key] for key in KEY_FIELDS):
+        raise CustomerImportError("phone, email or instagram_handle is required")
+    return row
+
+
+def _merge_into(target: Dict, source: Dict):
+    """source 的非空字段覆盖 target，tags 合并去重，preferences 按键合并"""
+    for field in ("name", *KEY_FIELDS):
+        if source.get(field):
+            target[field] = source[field]
+    target["tags"] = list(dict.fromkeys((target.get("tags") or []) + (source.get("tags") or [])))
+    target["preferences"] = {**(target.get("preferences") or {}), **(source.get("preferences") or {})}
+
+
+def dedupe_rows(rows: List[Dict]) -> List[Dict]:
+    """
+    合并块内按去重字段相连的行
+
+    相连是传递的：A、B手机号相同，B、C邮箱相同时三行合并为一行（并查集），
+    合并后各行的去重字段值互不相同。每组按原顺序合并，顺序为各组第一行的顺序。
+    """
+    parent = list(range(len(rows)))
+
+    def find(position: int) -> int:
+        while parent[position] != position:
+            parent[position] = parent[parent[position]]
+            position = parent[position]
+        return position
+
+    first: Dict[Tuple[str, str], int] = {}
+    for position, row in enumerate(rows):
+        for key in KEY_FIELDS:
+            if row[key]:
+                a, b = find(first.setdefault((key, row[key]), position)), find(position)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+
+    merged: Dict[int, Dict] = {}
+    for position, row in enumerate(rows):
+        root = find(position)
+        if root in merged:
+            _merge_into(merged[root], row)
+        else:
+            merged[root] = dict(row)
+    return list(merged.values())
+
+
+class ImportProgress:
+    """导入任务进度"""
+
+    def __init__(self, job_id: str, fmt: str):
+        self.data = {
+            "job_id": job_id,
+            "format": fmt,
+            "status": "running",
+            "rows": 0,
+            "inserted": 0,
+            "updated": 0,
+            "skipped": 0,
+            "invalid": 0,
+            "chunks": 0,
+            "errors": [],
+            "started_at": datetime.utcnow().isoformat(),
+            "finished_at": None,
+        }
+
+    def add_errors(self, errors: List[Dict]):
+        room = MAX_ERRORS - len(self.data["errors"])
+        if room > 0:
+            self.data["errors"].extend(errors[:room])
+
+    def apply(self, result: Dict):
+        for key in ("inserted", "updated", "skipped"):
+            self.data[key] += result[key]
+        self.data["chunks"] += 1
+
+    def finish(self, status: str, error: Optional[str] = None):
+        self.data["status"] = status
+        self.data["finished_at"] = datetime.utcnow().isoformat()
+        if error:
+            self.data["error"] = error
+
+
+class CustomerBulkService:
+    """客户批量导入导出"""
+
+    def __init__(self, session_factory=SessionLocal, chunk_size: int = None):
+        self.session_factory = session_factory
+        self.chunk_size = chunk_size or settings.CUSTOMER_IMPORT_CHUNK_SIZE
+
+    # ---------- 解析 ----------
+
+    @staticmethod
+    async def _iter_lines(stream: AsyncIterator[bytes]) -> AsyncIterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8-sig")()
+        buffer = ""
+        async for data in stream:
+            buffer += decoder.decode(data)
+            if "\n" not in buffer:
+                continue
+            lines = buffer.split("\n")
+            buffer = lines.pop()
+            for line in lines:
+                yield line
+        buffer += decoder.decode(b"", final=True)
+        if buffer:
+            yield buffer
+
+    async def _iter_records(self, stream: AsyncIterator[bytes], fmt: str) -> AsyncIterator[str]:
+        """按记录输出原始文本（CSV中引号内的换行不会拆分记录）"""
+        pending = None
+        async for line in self._iter_lines(stream):
+            if fmt == "ndjson":
+                if line.strip():
+                    yield line
+                continue
+            pending = line if pending is None else pending + "\n" + line
+            # 引号成对出现时记录才完整（转义的引号为两个引号）
+            if pending.count('"') % 2 == 0:
+                if pending.strip():
+                    yield pending.rstrip("\r")
+                pending = None
+        if pending is not None and pending.strip():
+            yield pending
+
+    async def iter_chunks(self, stream: AsyncIterator[bytes], fmt: str
+                          ) -> AsyncIterator[Tuple[Optional[List[str]], List[str]]]:
+        """
+        把请求体切分为记录块
+
+        Yields:
+            (CSV表头, 原始记录列表)
+        """
+        header = None
+        chunk: List[str] = []
+        async for record in self._iter_records(stream, fmt):
+            if fmt == "csv" and header is None:
+                header = [name.strip().lower() for name in next(csv.reader([record]))]
+                if not any(name in header for name in KEY_FIELDS):
+                    raise CustomerImportError("CSV header must include phone, email or instagram_handle")
+                continue
+            chunk.append(record)
+            if len(chunk) >= self.chunk_size:
+                yield header, chunk
+                chunk = []
+        if chunk:
+            yield header, chunk
+
+    @staticmethod
+    def parse_records(header: Optional[List[str]], records: List[str], fmt: str,
+                      first_row: int) -> Tuple[List[Dict], List[Dict]]:
+        """
+        解析并规范化一块记录
+
+        Returns:
+            (有效行, 错误列表)
+        """
+        rows, errors = [], []
+        items = csv.reader(records) if fmt == "csv" else iter(records)
+        for row_number in itertools.count(first_row):
+            try:
+                item = next(items)
+            except StopIteration:
+                break
+            except csv.Error as e:
+                errors.append({"row": row_number, "error": str(e)})
+                continue
+            try:
+                raw = dict(zip(header, item)) if fmt == "csv" else json.loads(item)
+                if not isinstance(raw, dict):
+                    raise CustomerImportError("each line must be a JSON object")
+                rows.append(normalize_row(raw))
+            except ValueError as e:
+                errors.append({"row": row_number, "error": str(e)})
+        return rows, errors
+
+    # ---------- 写入 ----------
+
+    def _find_existing(self, db: Session, rows: List[Dict]) -> Tuple[Dict, Dict]:
+        """
+        查询已命中的客户
+
+        先按三个字段的规范化表达式分别只查ID（每个查询都能走表达式索引），
+        再按ID读取一次完整记录，避免同一客户的JSON字段被重复解析。
+        库中格式不同的多条记录规范化后相同时，命中的行记为冲突。
+
+        Returns:
+            ({(字段, 规范化值): 客户ID集合}, {客户ID: 客户记录})
+        """
+        table = Customer.__table__
+        by_key: Dict[Tuple[str, str], Set[int]] = {}
+        for key in KEY_FIELDS:
+            values = list({row[key] for row in rows if row[key]})
+            if not values:
+                continue
+            normalized = KEY_EXPRESSIONS[key](table.c[key])
+            query = select(table.c.id, normalized).where(normalized.in_(values))
+            for customer_id, value in db.execute(query):
+                by_key.setdefault((key, value), set()).add(customer_id)
+
+        customers: Dict[int, Dict] = {}
+        if by_key:
+            query = select(
+                table.c.id, table.c.name, table.c.phone, table.c.email,
+                table.c.instagram_handle, table.c.tags, table.c.preferences
+            ).where(table.c.id.in_(set().union(*by_key.values())))
+            for existing in db.execute(query).mappings():
+                customers[existing["id"]] = dict(existing)
+        return by_key, customers
+
+    @staticmethod
+    def _serialize(row: Dict, customer_id: Optional[int], timestamp) -> Dict:
+        return {
+            "id": customer_id,
+            "name": row["name"],
+            "phone": row["phone"],
+            "email": row["email"],
+            "instagram_handle": row["instagram_handle"],
+            "tags": json.dumps(row["tags"], ensure_ascii=False),
+            "preferences": json.dumps(row["preferences"], ensure_ascii=False),
+            "updated_at": timestamp,
+        }
+
+    def _write_copy(self, db: Session, rows: List[Dict]) -> int:
+        """
+        Postgres：COPY 到临时表，再以集合操作更新和插入
+
+        Args:
+            rows: _serialize 生成的行，id 为空表示新客户
+
+        Returns:
+            实际插入行数（与并发写入冲突的行跳过）
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow([row[field] for field in STAGE_FIELDS])
+        buffer.seek(0)
+
+        cursor = db.connection().connection.cursor()
+        try:
+            # 临时表随连接保留，提交时清空
+            cursor.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS customer_import_stage ("
+                "id integer, name varchar, phone varchar, email varchar, "
+                "instagram_handle varchar, tags json, preferences json, "
+                "updated_at timestamp) ON COMMIT DELETE ROWS"
+            )
+            cursor.copy_expert(
+                f"COPY customer_import_stage ({', '.join(STAGE_FIELDS)}) "
+                "FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            cursor.execute(
+                "UPDATE customers AS c SET name = s.name, phone = s.phone, email = s.email, "
+                "instagram_handle = s.instagram_handle, tags = s.tags, "
+                "preferences = s.preferences, updated_at = s.updated_at "
+                "FROM customer_import_stage AS s WHERE s.id IS NOT NULL AND c.id = s.id"
+            )
+            cursor.execute(
+                "INSERT INTO customers (name, phone, email, instagram_handle, tags, preferences, "
+                "metadata, message_count, created_at, updated_at) "
+                "SELECT name, phone, email, instagram_handle, tags, preferences, "
+                "'{}', 0, updated_at, updated_at FROM customer_import_stage "
+                "WHERE id IS NULL ON CONFLICT DO NOTHING"
+            )
+            return cursor.rowcount
+        finally:
+            cursor.close()
+
+    def _write_executemany(self, db: Session, rows: List[Dict]) -> int:
+        """
+        批量 executemany（SQLite 及非 psycopg2 驱动）
+
+        使用文本语句并预先序列化JSON，省去逐行的类型处理。
+        """
+        updates = [row for row in rows if row["id"] is not None]
+        inserts = [row for row in rows if row["id"] is None]
+        if updates:
+            db.execute(UPDATE_SQL, updates)
+        if not inserts:
+            return 0
+        result = db.execute(INSERT_SQL, inserts)
+        return result.rowcount if result.rowcount is not None and result.rowcount >= 0 else len(inserts)
+
+    def write_rows(self, db: Session, inserts: List[Dict], updates: Dict[int, Dict],
+                   now: datetime) -> int:
+        """
+        写入新客户和合并后的已有客户（不提交）
+
+        Returns:
+            实际插入行数
+        """
+        bind = db.get_bind()
+        use_copy = bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2"
+        # SQLite 文本语句不经过DateTime类型处理，按SQLAlchemy的存储格式传入
+        timestamp = now if bind.dialect.name != "sqlite" else now.strftime("%Y-%m-%d %H:%M:%S.%f")
+        rows = [
+            self._serialize(values, customer_id, timestamp)
+            for customer_id, values in sorted(updates.items())
+        ] + [self._serialize(row, None, timestamp) for row in inserts]
+        if not rows:
+            return 0
+        if use_copy:
+            return self._write_copy(db, rows)
+        return self._write_executemany(db, rows)
+
+    def load_chunk(self, rows: List[Dict]) -> Dict:
+        """
+        写入一块已规范化的行（单个事务）
+
+        Returns:
+            本块的插入/更新/跳过行数和冲突明细
+        """
+        merged = dedupe_rows(rows)
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            by_key, customers = self._find_existing(db, merged)
+            inserts, updates, conflicts = [], {}, []
+            for row in merged:
+                ids = set().union(*(by_key.get((key, row[key]), ()) for key in KEY_FIELDS))
+                if not ids:
+                    inserts.append(row)
+                elif len(ids) > 1:
+                    conflicts.append({
+                        "error": "matches multiple customers",
+                        "customer_ids": sorted(ids),
+                        **{key: row[key] for key in KEY_FIELDS},
+                    })
+                else:
+                    customer_id = ids.pop()
+                    target = updates.get(customer_id) or dict(customers[customer_id])
+                    _merge_into(target, row)
+                    updates[customer_id] = target
+
+            inserted = self.write_rows(db, inserts, updates, now)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        return {
+            "inserted": inserted,
+            "updated": len(updates),
+            # 块内重复行、合并到同一客户的行、冲突行和并发写入中已存在的行
+            "skipped": len(rows) - inserted - len(updates),
+            "conflicts": conflicts,
+        }
+
+    # ---------- 任务 ----------
+
+    async def import_stream(self, stream: AsyncIterator[bytes], fmt: str,
+                            job_id: Optional[str] = None) -> Dict:
+        """
+        流式导入客户
+
+        Args:
+            stream: 请求体字节流
+            fmt: csv 或 ndjson
+            job_id: 任务ID（用于查询进度，默认自动生成）
+
+        Returns:
+            最终进度
+        """
+        if fmt not in FORMATS:
+            raise CustomerImportError(f"Unsupported format: {fmt}")
+        progress = ImportProgress(job_id or uuid.uuid4().hex, fmt)
+        await self._save_progress(progress)
+
+        try:
+            async for header, records in self.iter_chunks(stream, fmt):
+                first_row = progress.data["rows"] + (2 if fmt == "csv" else 1)
+                rows, errors = await asyncio.to_thread(
+                    self.parse_records, header, records, fmt, first_row
+                )
+                result = await asyncio.to_thread(self.load_chunk, rows) if rows else {
+                    "inserted": 0, "updated": 0, "skipped": 0, "conflicts": []
+                }
+                progress.data["rows"] += len(records)
+                progress.data["invalid"] += len(errors)
+                progress.apply(result)
+                progress.add_errors(errors + result["conflicts"])
+                await self._save_progress(progress)
+        except Exception as e:
+            logger.error(f"客户导入失败（已处理 {progress.data['rows']} 行）: {e}")
+            progress.finish("failed", str(e))
+            await self._save_progress(progress)
+            raise
+
+        progress.finish("completed")
+        await self._save_progress(progress)
+        logger.info(
+            f"客户导入完成: {progress.data['rows']} 行, 新增 {progress.data['inserted']}, "
+            f"更新 {progress.data['updated']}, 跳过 {progress.data['skipped']}, "
+            f"无效 {progress.data['invalid']}"
+        )
+        return progress.data
+
+    @staticmethod
+    async def _save_progress(progress: ImportProgress):
+        await cache.set(f"customer_import:{progress.data['job_id']}", progress.data, ttl=PROGRESS_TTL)
+
+    @staticmethod
+    async def get_progress(job_id: str) -> Optional[Dict]:
+        return await cache.get(f"customer_import:{job_id}")
+
+    # ---------- 导出 ----------
+
+    def _fetch_page(self, after_id: int, limit: int) -> List[Dict]:
+        table = Customer.__table__
+        db = self.session_factory()
+        try:
+            return [
+                dict(row) for row in db.execute(
+                    select(*(table.c[field] for field in EXPORT_FIELDS))
+                    .where(table.c.id > after_id)
+                    .order_by(table.c.id)
+                    .limit(limit)
+                ).mappings()
+            ]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _format_page(rows: List[Dict], fmt: str) -> bytes:
+        def value(v):
+            return v.isoformat() if isinstance(v, datetime) else v
+
+        if fmt == "ndjson":
+            return "".join(
+                json.dumps({field: value(row[field]) for field in EXPORT_FIELDS},
+                           ensure_ascii=False) + "\n"
+                for row in rows
+            ).encode()
+
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        for row in rows:
+            writer.writerow([
+                json.dumps(row[field] or ([] if field == "tags" else {}), ensure_ascii=False)
+                if field in ("tags", "preferences") else value(row[field])
+                for field in EXPORT_FIELDS
+            ])
+        return buffer.getvalue().encode()
+
+    async def export_stream(self, fmt: str) -> AsyncIterator[bytes]:
+        """
+        流式导出全部客户
+
+        每页单独读取（按主键分页），页与页之间不持有数据库连接。
+        """
+        if fmt not in FORMATS:
+            raise CustomerImportError(f"Unsupported format: {fmt}")
+        if fmt == "csv":
+            yield (",".join(EXPORT_FIELDS) + "\n").encode()
+
+        after_id = 0
+        while True:
+            rows = await asyncio.to_thread(self._fetch_page, after_id, self.chunk_size)
+            if not rows:
+                break
+            after_id = rows[-1]["id"]
+            yield self._format_page(rows, fmt)
+
+
+# 创建全局实例
+customer_bulk_service = CustomerBulkService()
@@ -0,0 +1,197 @@
+"""
+收件箱实时事件分发
+
+进程内的发布/订阅中心：消息接入时发布精简事件，按渠道和优先级过滤后
+推送给已连接的坐席（WebSocket/SSE）。每个订阅者使用有界缓冲区，
+慢消费者只会丢弃自己最旧的事件，不会阻塞发布方。
+
+配置了 REDIS_URL 时通过Redis pub/sub在多个worker之间转发事件。
+"""
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Set
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """单个客户端的订阅"""
+
+    def __init__(self, channels: Optional[Set[str]], priorities: Optional[Set[str]],
+                 buffer_size: int):
+        self.channels = channels
+        self.priorities = priorities
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+        self.dropped = 0
+
+    def offer(self, data: str):
+        """放入事件，缓冲区满时丢弃最旧的事件"""
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(data)
+
+    def take_dropped(self) -> int:
+        """取出并清零丢弃计数"""
+        dropped, self.dropped = self.dropped, 0
+        return dropped
+
+    async def get(self) -> str:
+        return await self.queue.get()
+
+
+class EventHub:
+    """事件分发中心"""
+
+    def __init__(self, redis_url: Optional[str] = None, buffer_size: int = 100,
+                 redis_channel: str = "inbox-events"):
+        self.redis_url = redis_url
+        self.buffer_size = buffer_size
+        self.redis_channel = redis_channel
+        # 按渠道索引订阅，None 表示订阅全部渠道
+        self._by_channel: Dict[Optional[str], Set[Subscription]] = {}
+        self._redis = None
+        self._pid: Optional[int] = None
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subs) for subs in self._by_channel.values())
+
+    def subscribe(self, channels: Optional[Iterable[str]] = None,
+                  priorities: Optional[Iterable[str]] = None) -> Subscription:
+        """
+        创建订阅
+
+        Args:
+            channels: 订阅的渠道（None表示全部）
+            priorities: 订阅的优先级（None表示全部）
+        """
+        channel_set = set(channels) if channels else None
+        priority_set = set(priorities) if priorities else None
+        subscription = Subscription(channel_set, priority_set, self.buffer_size)
+        for channel in channel_set or [None]:
+            self._by_channel.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        """取消订阅"""
+        for channel in subscription.channels or [None]:
+            subs = self._by_channel.get(channel)
+            if subs is not None:
+                subs.discard(subscription)
+                if not subs:
+                    del self._by_channel[channel]
+
+    def _fan_out(self, data: str, channel: Optional[str], priority: Optional[str]):
+        """将已序列化的事件投递给本进程内匹配的订阅者"""
+        for key in ((channel, None) if channel is not None else (None,)):
+            for subscription in self._by_channel.get(key, ()):
+                if subscription.priorities is None or priority in subscription.priorities:
+                    subscription.offer(data)
+
+    async def publish(self, event: Dict):
+        """
+        发布事件
+
+        事件只序列化一次；配置了Redis时经由Redis转发（包括本进程的订阅者）。
+        """
+        data = json.dumps(event, ensure_ascii=False, separators=(",", ":"))
+        if self.redis_url:
+            try:
+                await self._get_redis().publish(self.redis_channel, data)
+                return
+            except Exception as e:
+                logger.error(f"Redis事件转发失败，仅推送本进程订阅者: {e}")
+        self._fan_out(data, event.get("channel"), event.get("priority"))
+
+    def _get_redis(self):
+        if self._redis is None or self._pid != os.getpid():
+            import redis.asyncio as redis
+
+            self._redis = redis.from_url(self.redis_url)
+            self._pid = os.getpid()
+        return self._redis
+
+    async def _listen(self):
+        """从Redis接收其他worker发布的事件"""
+        while True:
+            try:
+                pubsub = self._get_redis().pubsub()
+                await pubsub.subscribe(self.redis_channel)
+                async for message in pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    data = message["data"]
+                    if isinstance(data, bytes):
+                        data = data.decode("utf-8")
+                    event = json.loads(data)
+                    self._fan_out(data, event.get("channel"), event.get("priority"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis事件订阅中断，1秒后重连: {e}")
+                await asyncio.sleep(1)
+
+    def start(self):
+        """启动Redis转发（未配置Redis时无操作）"""
+        if self.redis_url and (self._listener is None or self._listener.done()):
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+        if self._redis is not None and self._pid == os.getpid():
+            await self._redis.close()
+        self._redis = None
+
+    def reset_after_fork(self):
+        """fork后丢弃父进程的Redis连接"""
+        self._redis = None
+        self._pid = None
+        self._listener = None
+
+
+def message_text(message: Dict) -> str:
+    """提取消息文本，媒体消息取说明文字"""
+    content = message.get("content")
+    if isinstance(content, dict):
+        return content.get("caption") or ""
+    return content or ""
+
+
+def message_event(channel: str, message: Dict, priority: str = "normal") -> Dict:
+    """构造精简的新消息事件"""
+    content = message.get("content")
+    if isinstance(content, dict):
+        preview = content.get("caption") or f"[{content.get('type', 'media')}]"
+    else:
+        preview = content or ""
+    return {
+        "type": "message.created",
+        "channel": channel,
+        "priority": priority,
+        "message_id": message.get("message_id"),
+        "from": message.get("from"),
+        "preview": preview[:100],
+        "ts": datetime.now().isoformat()
+    }
+
+
+# 创建全局实例
+event_hub = EventHub(
+    settings.REDIS_URL,
+    buffer_size=settings.EVENT_BUFFER_SIZE,
+    redis_channel=settings.EVENT_REDIS_CHANNEL
+)
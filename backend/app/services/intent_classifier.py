@@ -3,13 +3,22 @@
 """
 
 from typing import Dict, List, Optional
-import re
+
+from ..core.config import settings
+from ..core.profiling import traced
+from ..models.message import MessagePriority
+from .intent_model import intent_model_store
+from .language_detector import language_detector
 
 
 class IntentClassifier:
     """意图分类器"""
     
-    def __init__(self):
+    def __init__(self, model_store=None):
+        # 统计模型（置信度不足时回退到关键词规则）
+        self.model_store = model_store if model_store is not None else intent_model_store
+        self.model_min_confidence = settings.INTENT_MODEL_MIN_CONFIDENCE
+        
         # 意图分类规则
         self.rules: Dict[str, List[str]] = {
             "business_hours": [
@@ -68,6 +77,9 @@ class IntentClassifier:
             "thanks": 1,
             "general_inquiry": 0
         }
+        
+        # 需要坐席立即处理的意图，新消息事件按紧急优先级推送
+        self.urgent_intents = {"complaint"}
     
     def classify(self, text: str, language: str = "zh") -> Dict[str, any]:
         """
@@ -80,11 +92,47 @@ class IntentClassifier:
         Returns:
             意图分类结果
         """
-        text_lower = text.lower().strip()
+        return self.classify_batch([text], language)[0]
+    
+    @traced("intent.classify")
+    def classify_batch(self, texts: List[str], language: str = "zh") -> List[Dict[str, any]]:
+        """
+        批量分类消息意图
+        
+        配置了统计模型时整批推理，置信度低于阈值的消息回退到关键词规则。
+        
+        Args:
+            texts: 消息文本列表
+            language: 语言代码
+            
+        Returns:
+            与输入顺序一致的意图分类结果
+        """
+        languages = [
+            self._detect_language(text) if language == "auto" else language
+            for text in texts
+        ]
         
-        # 检测语言（简单实现）
-        if language == "auto":
-            language = self._detect_language(text)
+        model = self.model_store.get()
+        predictions = model.predict_batch(texts) if model is not None else [None] * len(texts)
+        
+        results = []
+        for text, text_language, prediction in zip(texts, languages, predictions):
+            if prediction is not None and prediction[1] >= self.model_min_confidence:
+                results.append({
+                    "intent": prediction[0],
+                    "confidence": prediction[1],
+                    "language": text_language,
+                    "matched_keywords": [],
+                    "source": "model"
+                })
+            else:
+                results.append(self._classify_rules(text, text_language))
+        return results
+    
+    def _classify_rules(self, text: str, language: str) -> Dict[str, any]:
+        """关键词规则分类"""
+        text_lower = text.lower().strip()
         
         # 匹配所有意图
         matched_intents = []
@@ -100,7 +148,8 @@ class IntentClassifier:
                 "intent": "general_inquiry",
                 "confidence": 0.3,
                 "language": language,
-                "matched_keywords": []
+                "matched_keywords": [],
+                "source": "rules"
             }
         
         # 选择优先级最高的意图
@@ -116,21 +165,19 @@ class IntentClassifier:
             "intent": best_intent,
             "confidence": confidence,
             "language": language,
-            "matched_keywords": matched_intents
+            "matched_keywords": matched_intents,
+            "source": "rules"
         }
     
+    def get_message_priority(self, intent: str) -> MessagePriority:
+        """根据意图获取消息优先级"""
+        if intent in self.urgent_intents:
+            return MessagePriority.URGENT
+        return MessagePriority.NORMAL
+    
     def _detect_language(self, text: str) -> str:
         """检测语言"""
-        # 简单的中英文检测
-        chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
-        english_chars = len(re.findall(r'[a-zA-Z]', text))
-        
-        if chinese_chars > english_chars:
-            return "zh"
-        elif english_chars > chinese_chars:
-            return "en"
-        else:
-            return "zh"  # 默认中文
+        return language_detector.detect(text)
     
     def get_intent_description(self, intent: str) -> str:
         """获取意图描述"""
@@ -147,4 +194,8 @@ class IntentClassifier:
             "thanks": "感谢和好评",
             "general_inquiry": "一般咨询"
         }
-        return descriptions.get(intent, "未知意图")
\ No newline at end of file
+        return descriptions.get(intent, "未知意图")
+
+
+# 创建全局实例
+intent_classifier = IntentClassifier()
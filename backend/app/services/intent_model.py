@@ -0,0 +1,355 @@
+"""
+统计意图模型（可选，依赖numpy）
+
+- 特征：字符n-gram哈希到固定维度的稀疏向量（log词频 + L2归一化）
+- 模型：多分类逻辑回归，离线用带标注的历史消息训练
+- 推理：整批消息构造CSR稀疏矩阵后与权重矩阵相乘
+
+批量推理每1000条消息约比关键词规则慢3倍（benchmarks/bench_intent_model.py），
+换来的是对不含关键词的改写表达的识别能力。
+
+模型文件以 .npy 格式保存，推理时通过内存映射加载，多个worker进程共享同一份物理页。
+模型目录结构：
+
+    INTENT_MODEL_DIR/
+        CURRENT              # 当前版本名，通过原子替换切换版本
+        v1700000000/
+            weights.npy      # (特征维度, 意图数)
+            bias.npy         # (意图数,)
+            meta.json        # 意图标签、特征配置
+
+训练：
+    python -m app.services.intent_model train --output models/intent
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy为可选依赖
+    np = None
+
+from ..core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_N_FEATURES = 2 ** 18
+DEFAULT_NGRAM_RANGE = (1, 3)
+CURRENT_FILE = "CURRENT"
+
+
+class HashingFeaturizer:
+    """字符n-gram哈希特征"""
+
+    def __init__(self, n_features: int = DEFAULT_N_FEATURES,
+                 ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+
+    def features(self, text: str) -> Dict[int, float]:
+        """提取单条文本的稀疏特征（索引 -> 权重）"""
+        padded = f" {' '.join(text.lower().split())} "
+        counts: Dict[int, int] = {}
+        low, high = self.ngram_range
+
+        # crc32 在进程间稳定，训练和推理得到相同的哈希
+        for n in range(low, high + 1):
+            for i in range(len(padded) - n + 1):
+                gram = padded[i:i + n]
+                if not gram.strip():
+                    continue
+                index = zlib.crc32(gram.encode("utf-8")) % self.n_features
+                counts[index] = counts.get(index, 0) + 1
+
+        weights = {index: 1.0 + math.log(count) for index, count in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {index: w / norm for index, w in weights.items()}
+
+    def transform(self, texts: Sequence[str]):
+        """
+        批量提取特征
+
+        Returns:
+            CSR格式的 (indptr, indices, data)
+        """
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for text in texts:
+            row = self.features(text)
+            indices.extend(row.keys())
+            data.extend(row.values())
+            indptr.append(len(indices))
+        return (
+            np.asarray(indptr, dtype=np.int64),
+            np.asarray(indices, dtype=np.int64),
+            np.asarray(data, dtype=np.float32),
+        )
+
+
+def sparse_dot(indptr, indices, data, weights):
+    """CSR稀疏矩阵与稠密权重矩阵相乘"""
+    n_rows = len(indptr) - 1
+    result = np.zeros((n_rows, weights.shape[1]), dtype=np.float32)
+    if len(indices) == 0:
+        return result
+
+    contributions = weights[indices] * data[:, None]
+    non_empty = indptr[:-1] < indptr[1:]
+    result[non_empty] = np.add.reduceat(contributions, indptr[:-1][non_empty], axis=0)
+    return result
+
+
+def softmax(scores):
+    shifted = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class IntentModel:
+    """线性意图模型"""
+
+    def __init__(self, weights, bias, labels: List[str],
+                 featurizer: HashingFeaturizer, version: str = ""):
+        self.weights = weights
+        self.bias = bias
+        self.labels = labels
+        self.featurizer = featurizer
+        self.version = version
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IntentModel":
+        """从目录加载模型（默认内存映射权重文件）"""
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        mmap_mode = "r" if mmap else None
+        weights = np.load(os.path.join(path, "weights.npy"), mmap_mode=mmap_mode)
+        bias = np.load(os.path.join(path, "bias.npy"))
+        featurizer = HashingFeaturizer(meta["n_features"], tuple(meta["ngram_range"]))
+        return cls(weights, bias, meta["labels"], featurizer, os.path.basename(path))
+
+    def save(self, path: str):
+        """保存模型到目录"""
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, "weights.npy"), np.asarray(self.weights, dtype=np.float32))
+        np.save(os.path.join(path, "bias.npy"), np.asarray(self.bias, dtype=np.float32))
+        meta = {
+            "labels": self.labels,
+            "n_features": self.featurizer.n_features,
+            "ngram_range": list(self.featurizer.ngram_range),
+        }
+        with open(os.path.join(path, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    def predict_batch(self, texts: Sequence[str]) -> List[Tuple[str, float]]:
+        """
+        批量预测意图
+
+        Returns:
+            每条文本的 (意图, 置信度)
+        """
+        if not texts:
+            return []
+        indptr, indices, data = self.featurizer.transform(texts)
+        probabilities = softmax(sparse_dot(indptr, indices, data, self.weights) + self.bias)
+        best = probabilities.argmax(axis=1)
+        return [
+            (self.labels[label], float(probabilities[row, label]))
+            for row, label in enumerate(best)
+        ]
+
+
+def train(samples: Iterable[Tuple[str, str]], n_features: int = DEFAULT_N_FEATURES,
+          epochs: int = 10, learning_rate: float = 5.0, batch_size: int = 64,
+          seed: int = 0) -> IntentModel:
+    """
+    用小批量梯度下降训练多分类逻辑回归
+
+    Args:
+        samples: (文本, 意图标签) 序列
+        n_features: 哈希特征维度
+        epochs: 训练轮数
+        learning_rate: 学习率
+        batch_size: 批大小
+
+    Returns:
+        训练好的模型
+    """
+    texts, targets = [], []
+    for text, intent in samples:
+        if text and intent:
+            texts.append(text)
+            targets.append(intent)
+    if not texts:
+        raise ValueError("没有可用于训练的带标注消息")
+
+    labels = sorted(set(targets))
+    label_index = {label: i for i, label in enumerate(labels)}
+    y = np.asarray([label_index[t] for t in targets], dtype=np.int64)
+
+    featurizer = HashingFeaturizer(n_features)
+    indptr, indices, data = featurizer.transform(texts)
+    weights = np.zeros((n_features, len(labels)), dtype=np.float32)
+    bias = np.zeros(len(labels), dtype=np.float32)
+    rng = np.random.default_rng(seed)
+
+    for _ in range(epochs):
+        order = rng.permutation(len(texts))
+        for start in range(0, len(order), batch_size):
+            rows = order[start:start + batch_size]
+            starts, ends = indptr[rows], indptr[rows + 1]
+            lengths = ends - starts
+            positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+            batch_indptr = np.concatenate([[0], np.cumsum(lengths)])
+            batch_indices = indices[positions]
+            batch_data = data[positions]
+
+            probabilities = softmax(
+                sparse_dot(batch_indptr, batch_indices, batch_data, weights) + bias
+            )
+            gradient = probabilities
+            gradient[np.arange(len(rows)), y[rows]] -= 1.0
+            gradient /= len(rows)
+
+            row_of_nonzero = np.repeat(np.arange(len(rows)), lengths)
+            np.add.at(
+                weights, batch_indices,
+                -learning_rate * batch_data[:, None] * gradient[row_of_nonzero],
+            )
+            bias -= learning_rate * gradient.sum(axis=0)
+
+    return IntentModel(weights, bias, labels, featurizer)
+
+
+def publish(model: IntentModel, model_dir: str) -> str:
+    """
+    发布新版本模型
+
+    先写入新的版本目录，再原子替换 CURRENT 文件，正在运行的worker会在下次检查时切换。
+
+    Returns:
+        版本名
+    """
+    millis = int(time.time() * 1000)
+    # 同一毫秒内多次发布时顺延，不覆盖已发布的版本目录
+    while os.path.exists(os.path.join(model_dir, f"v{millis}")):
+        millis += 1
+    version = f"v{millis}"
+    model.save(os.path.join(model_dir, version))
+    tmp_path = os.path.join(model_dir, f"{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_path, os.path.join(model_dir, CURRENT_FILE))
+    logger.info(f"意图模型已发布: {version}")
+    return version
+
+
+class IntentModelStore:
+    """意图模型仓库（按 CURRENT 文件检测新版本并原子切换）"""
+
+    def __init__(self, model_dir: Optional[str], reload_interval: float = 30.0):
+        self.model_dir = model_dir
+        self.reload_interval = reload_interval
+        self._model: Optional[IntentModel] = None
+        self._version: Optional[str] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.model_dir) and np is not None
+
+    def get(self) -> Optional[IntentModel]:
+        """获取当前模型，未配置或加载失败时返回None"""
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_interval:
+            self._checked_at = now
+            self._maybe_reload()
+        return self._model
+
+    def _maybe_reload(self):
+        try:
+            with open(os.path.join(self.model_dir, CURRENT_FILE), encoding="utf-8") as f:
+                version = f.read().strip()
+        except FileNotFoundError:
+            return
+        if version == self._version:
+            return
+
+        with self._lock:
+            if version == self._version:
+                return
+            try:
+                model = IntentModel.load(os.path.join(self.model_dir, version))
+            except Exception as e:
+                logger.error(f"加载意图模型失败 {version}: {e}")
+                return
+            # 单次引用赋值，正在推理的请求继续使用旧模型
+            self._model = model
+            self._version = version
+            logger.info(f"意图模型已切换到 {version}")
+
+
+def load_training_samples(db) -> List[Tuple[str, str]]:
+    """从消息历史读取带标注的训练样本（metadata.intent）"""
+    from ..models.message import Message
+
+    metadata = Message.__table__.c["metadata"]
+    rows = db.query(Message.content, metadata).yield_per(1000)
+    return [
+        (content, (meta or {}).get("intent"))
+        for content, meta in rows
+        if meta and meta.get("intent")
+    ]
+
+
+# 创建全局实例
+intent_model_store = IntentModelStore(
+    settings.INTENT_MODEL_DIR,
+    reload_interval=settings.INTENT_MODEL_RELOAD_INTERVAL,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练并发布意图模型")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    train_parser = subparsers.add_parser("train")
+    train_parser.add_argument("--output", default=settings.INTENT_MODEL_DIR,
+                              help="模型目录（默认 INTENT_MODEL_DIR）")
+    train_parser.add_argument("--from-file", help="JSONL训练数据（每行包含text和intent），默认读取数据库")
+    train_parser.add_argument("--epochs", type=int, default=10)
+    args = parser.parse_args()
+
+    if not args.output:
+        parser.error("需要 --output 或配置 INTENT_MODEL_DIR")
+
+    if args.from_file:
+        with open(args.from_file, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        samples = [(row["text"], row["intent"]) for row in rows]
+    else:
+        from ..core.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            samples = load_training_samples(db)
+        finally:
+            db.close()
+
+    model = train(samples, epochs=args.epochs)
+    version = publish(model, args.output)
+    print(f"训练完成: {len(samples)} 条样本, {len(model.labels)} 个意图, 版本 {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+语言检测服务
+
+两级检测：
+1. 单次遍历文本统计文字类别（拉丁字母、汉字、假名、谚文），直接区分 ko/ja 和拉丁/汉字文本，
+   只有汉字且没有日文特有字形的文本直接判为 zh；
+2. 对同一文字体系下的候选语言（en/es/fr 或 zh/ja）使用字符n-gram模型打分。
+
+n-gram模型在首次使用时构建并缓存，短文本的检测结果使用LRU缓存。
+"""
+
+import math
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+DEFAULT_LANGUAGE = "zh"
+SUPPORTED_LANGUAGES = ("zh", "en", "ja", "ko", "es", "fr")
+
+# 文字类别（_HAN_JA 为日文特有的汉字字形，计入汉字）
+_OTHER, _LATIN, _HAN, _KANA, _HANGUL, _HAN_JA = range(6)
+
+# 日本新字体和国字：简体、繁体中文都不使用，出现时才需要区分 zh/ja
+_JAPANESE_HAN = "営駅円済変様図売読労働込枠峠畑実広転気県鉄団価払薬楽歳辺帰対沢桜戻栄"
+
+
+def _build_script_table() -> bytes:
+    """构建BMP码位到文字类别的查找表"""
+    table = bytearray(0x10000)
+
+    def mark(start: int, end: int, script: int):
+        for cp in range(start, end + 1):
+            table[cp] = script
+
+    mark(0x41, 0x5A, _LATIN)
+    mark(0x61, 0x7A, _LATIN)
+    mark(0xC0, 0x24F, _LATIN)       # 拉丁字母扩展（带重音字母）
+    table[0xD7] = _OTHER            # ×
+    table[0xF7] = _OTHER            # ÷
+    mark(0x4E00, 0x9FFF, _HAN)
+    mark(0x3400, 0x4DBF, _HAN)
+    mark(0xF900, 0xFAFF, _HAN)
+    mark(0x3040, 0x30FF, _KANA)
+    mark(0x31F0, 0x31FF, _KANA)
+    mark(0xFF66, 0xFF9F, _KANA)     # 半角片假名
+    mark(0x1100, 0x11FF, _HANGUL)
+    mark(0x3130, 0x318F, _HANGUL)
+    mark(0xAC00, 0xD7AF, _HANGUL)
+    table[0x30FC] = _KANA           # 长音符
+    for ch in _JAPANESE_HAN:
+        table[ord(ch)] = _HAN_JA
+    return bytes(table)
+
+
+_SCRIPT_TABLE = _build_script_table()
+
+# 语言模型训练语料（客服场景常见用语）
+_TRAINING_TEXT: Dict[str, str] = {
+    "en": (
+        "hello what time do you open today. are you open on sunday. "
+        "i would like to book a table for two people tonight. "
+        "how much does the lunch set cost. can you recommend a dish. "
+        "where is your restaurant located. is there parking nearby. "
+        "thank you so much the food was great. i want a refund the order was wrong. "
+        "do you offer delivery to my address. please call me back when you can. "
+        "the service was slow and the soup was cold. what is the price of the menu. "
+        "we are looking forward to seeing you this weekend. have a nice day."
+    ),
+    "es": (
+        "hola a qué hora abren hoy. están abiertos el domingo. "
+        "quisiera reservar una mesa para dos personas esta noche. "
+        "cuánto cuesta el menú del día. me puede recomendar un plato. "
+        "dónde está ubicado el restaurante. hay estacionamiento cerca. "
+        "muchas gracias la comida estaba muy buena. quiero un reembolso el pedido llegó mal. "
+        "hacen entregas a domicilio a mi dirección. por favor llámeme cuando pueda. "
+        "el servicio fue lento y la sopa estaba fría. cuál es el precio de la carta. "
+        "¿tienen opciones vegetarianas? ¡qué buen servicio! nos vemos el fin de semana."
+    ),
+    "fr": (
+        "bonjour à quelle heure ouvrez vous aujourd'hui. êtes vous ouverts le dimanche. "
+        "je voudrais réserver une table pour deux personnes ce soir. "
+        "combien coûte le menu du jour. pouvez vous me recommander un plat. "
+        "où se trouve le restaurant. est ce qu'il y a un parking à côté. "
+        "merci beaucoup le repas était très bon. je veux un remboursement la commande était fausse. "
+        "est ce que vous livrez à mon adresse. rappelez moi s'il vous plaît. "
+        "le service était lent et la soupe était froide. quel est le prix de la carte. "
+        "nous avons hâte de vous voir ce week-end. bonne journée."
+    ),
+    "zh": (
+        "你好，请问今天几点开门？周日营业吗？我想预订今晚两个人的位置。"
+        "午餐套餐多少钱？有什么推荐的菜吗？你们的餐厅在哪里？附近有停车场吗？"
+        "非常感谢，菜很好吃。我要退款，订单送错了。可以送外卖到我的地址吗？"
+        "方便的时候请给我回电话。服务太慢了，汤也是凉的。菜单的价格是多少？"
+        "这个问题什么时候能解决？我们周末见，祝你们生意兴隆。"
+    ),
+    "ja": (
+        "こんにちは、今日は何時に開きますか。日曜日は営業していますか。"
+        "今夜二人で予約したいのですが。ランチセットはいくらですか。おすすめの料理はありますか。"
+        "お店はどこにありますか。近くに駐車場はありますか。"
+        "ありがとうございました、料理はとても美味しかったです。注文が間違っていたので返金してください。"
+        "私の住所まで配達できますか。お手数ですが折り返しお電話ください。"
+        "営業時間を教えてください。メニューの値段はいくらですか。週末にまた来ます。"
+    ),
+    "ko": (
+        "안녕하세요 오늘 몇 시에 문을 여나요. 일요일에도 영업하나요. "
+        "오늘 저녁 두 명 예약하고 싶어요. 점심 세트는 얼마예요. 추천 메뉴가 있나요. "
+        "식당이 어디에 있나요. 근처에 주차장이 있나요. "
+        "정말 감사합니다 음식이 아주 맛있었어요. 주문이 잘못 와서 환불을 원합니다. "
+        "제 주소로 배달 가능한가요. 시간 되실 때 전화 부탁드립니다. "
+        "서비스가 느리고 국이 식어 있었어요. 메뉴 가격이 어떻게 되나요. 주말에 뵐게요."
+    ),
+}
+
+# 每种语言保留的n-gram数量
+_PROFILE_SIZE = 400
+_NGRAM_ORDERS = (1, 2, 3)
+_SHORT_TEXT_LENGTH = 64
+
+
+def _ngrams(text: str) -> List[str]:
+    """提取字符n-gram（首尾补空格）"""
+    padded = f" {' '.join(text.lower().split())} "
+    grams = []
+    for n in _NGRAM_ORDERS:
+        for i in range(len(padded) - n + 1):
+            gram = padded[i:i + n]
+            if gram.strip():
+                grams.append(gram)
+    return grams
+
+
+class NgramLanguageModel:
+    """紧凑的字符n-gram语言模型（每种语言只保留高频n-gram的对数概率）"""
+
+    def __init__(self, corpus: Dict[str, str], profile_size: int = _PROFILE_SIZE):
+        self.profiles: Dict[str, Dict[str, float]] = {}
+        self.unseen: Dict[str, float] = {}
+
+        for language, text in corpus.items():
+            counts = Counter(_ngrams(text))
+            top = counts.most_common(profile_size)
+            total = sum(count for _, count in top) + len(top) + 1
+            self.profiles[language] = {
+                gram: math.log((count + 1) / total) for gram, count in top
+            }
+            self.unseen[language] = math.log(1 / total)
+
+    def score(self, text: str, candidates: Tuple[str, ...]) -> Dict[str, float]:
+        """计算候选语言的对数似然"""
+        grams = _ngrams(text)
+        scores = {}
+        for language in candidates:
+            profile = self.profiles[language]
+            unseen = self.unseen[language]
+            scores[language] = sum(profile.get(gram, unseen) for gram in grams)
+        return scores
+
+
+@lru_cache(maxsize=None)
+def load_model() -> NgramLanguageModel:
+    """加载n-gram模型（进程内只构建一次）"""
+    return NgramLanguageModel(_TRAINING_TEXT)
+
+
+class LanguageDetector:
+    """语言检测器"""
+
+    def count_scripts(self, text: str) -> List[int]:
+        """
+        单次遍历统计各文字类别的字符数
+
+        Returns:
+            按 [其他, 拉丁, 汉字, 假名, 谚文, 日文特有汉字] 顺序的计数（汉字不含日文特有汉字）
+        """
+        table = _SCRIPT_TABLE
+        counts = [0, 0, 0, 0, 0, 0]
+        for ch in text:
+            cp = ord(ch)
+            if cp < 0x10000:
+                counts[table[cp]] += 1
+        return counts
+
+    def detect(self, text: str) -> str:
+        """
+        检测文本语言
+
+        Args:
+            text: 消息文本
+
+        Returns:
+            语言代码（zh, en, ja, ko, es, fr）
+        """
+        if len(text) <= _SHORT_TEXT_LENGTH:
+            return _detect_cached(text)
+        return self._detect(text)
+
+    def _detect(self, text: str) -> str:
+        _, latin, han, kana, hangul, han_ja = self.count_scripts(text)
+        han += han_ja
+        cjk = han + kana + hangul
+
+        if not cjk and not latin:
+            return DEFAULT_LANGUAGE
+
+        if cjk >= latin:
+            if hangul >= han + kana:
+                return "ko"
+            if kana:
+                return "ja"
+            if not han_ja:
+                # 没有日文特征的汉字文本，不必再做 zh/ja 打分
+                return "zh"
+            candidates = ("zh", "ja")
+        else:
+            candidates = ("en", "es", "fr")
+
+        scores = load_model().score(text, candidates)
+        # 得分相同时按候选顺序取第一个（zh、en优先）
+        return max(candidates, key=lambda language: scores[language])
+
+
+# 创建全局实例
+language_detector = LanguageDetector()
+
+
+@lru_cache(maxsize=4096)
+def _detect_cached(text: str) -> str:
+    return language_detector._detect(text)
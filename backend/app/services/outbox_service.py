@@ -0,0 +1,464 @@
+"""
+事务性发件箱服务
+
+回复写入 outbox 表，与消息记录、状态更新在同一事务中提交；
+后台分发器批量认领待发送记录，同一接收者按写入顺序依次投递，
+不同接收者之间并行投递，投递结果批量回写。
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, bindparam, exists, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..core.config import settings
+from ..core.database import SessionLocal
+from ..models.message import ChannelType, Message, MessageStatus
+from ..models.outbox import OutboxMessage, OutboxStatus
+
+logger = logging.getLogger(__name__)
+
+Sender = Callable[[Dict], Awaitable[Dict]]
+
+# 占住接收者队列的状态
+UNFINISHED = (OutboxStatus.PENDING, OutboxStatus.IN_FLIGHT)
+
+
+class OutboxService:
+    """发件箱写入"""
+
+    def enqueue_reply(self, db: Session, channel: ChannelType, recipient: str, content: str,
+                      message_type: str = "text", payload: Optional[Dict] = None,
+                      reply_to: Optional[int] = None, sender: Optional[str] = None) -> OutboxMessage:
+        """
+        记录一条待发送的回复（不提交，由调用方在同一事务中提交）
+
+        Args:
+            db: 数据库会话
+            channel: 渠道
+            recipient: 接收者
+            content: 回复内容
+            message_type: 消息类型
+            payload: 渠道相关的发送参数（默认 {"message": content}）
+            reply_to: 被回复的消息ID，提交时同时标记为已回复
+            sender: 发送方标识
+
+        Returns:
+            发件箱记录
+        """
+        message = Message(
+            channel=channel,
+            sender=sender or "business",
+            recipient=recipient,
+            content=content,
+            status=MessageStatus.REPLIED
+        )
+        db.add(message)
+
+        if reply_to is not None:
+            # 通过ORM更新状态，统计汇总据此记录首次回复耗时
+            original = db.get(Message, reply_to)
+            if original is not None:
+                original.status = MessageStatus.REPLIED
+
+        # flush 以获得消息ID，但不提交
+        db.flush()
+        outbox = OutboxMessage(
+            channel=channel,
+            recipient=recipient,
+            message_type=message_type,
+            payload=payload or {"message": content},
+            message_id=message.id,
+            max_attempts=settings.OUTBOX_MAX_ATTEMPTS
+        )
+        db.add(outbox)
+        db.flush()
+        return outbox
+
+
+class OutboxDispatcher:
+    """发件箱分发器"""
+
+    def __init__(self, sender: Optional[Sender] = None, session_factory=SessionLocal,
+                 batch_size: int = None, concurrency: int = None,
+                 lease_seconds: int = None, poll_interval: float = None):
+        self.sender = sender or deliver
+        self.session_factory = session_factory
+        self.batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+        self.concurrency = concurrency or settings.OUTBOX_CONCURRENCY
+        self.lease_seconds = lease_seconds or settings.OUTBOX_LEASE_SECONDS
+        self.poll_interval = poll_interval or settings.OUTBOX_POLL_INTERVAL
+        # 发送前租约至少还要剩下一次外部调用的最长耗时
+        self.send_margin = min(settings.OUTBOUND_DEADLINE, self.lease_seconds / 2)
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def claim_batch(self, max_recipients: Optional[int] = None) -> List[Dict]:
+        """
+        认领一批待发送记录
+
+        每个接收者只有最早一条未完成（待发送或投递中）的记录可以作为队首认领，
+        队首之后连续可发送的记录随队首一起认领并按顺序投递；队首投递中或退避中时
+        整个接收者跳过。Postgres 上队首使用 FOR UPDATE SKIP LOCKED：其他分发器
+        已锁定但未提交的队首在本事务中仍是待发送状态，其后的记录不会被当作队首，
+        多个分发器并发认领时也能保证同一接收者按顺序投递。
+        认领通过带状态条件的 UPDATE 确认（SQLite 无行锁），再按 claim_token 读回。
+
+        Args:
+            max_recipients: 最多认领的接收者数（调用方按空闲的投递并发数传入，
+                避免认领的记录排队等待超过租约）
+
+        Returns:
+            认领到的记录（按ID排序，包含 claim_token 和本地租约截止时间 lease_deadline）
+        """
+        lease_deadline = time.monotonic() + self.lease_seconds
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            token = uuid.uuid4().hex
+            outbox = OutboxMessage.__table__
+            earlier = outbox.alias("earlier")
+            claimable = or_(
+                and_(outbox.c.status == OutboxStatus.PENDING, outbox.c.available_at <= now),
+                and_(outbox.c.status == OutboxStatus.IN_FLIGHT, outbox.c.locked_until < now),
+            )
+            is_head = ~exists().where(
+                earlier.c.recipient == outbox.c.recipient,
+                earlier.c.status.in_(UNFINISHED),
+                earlier.c.id < outbox.c.id,
+            )
+
+            heads = db.execute(
+                select(outbox.c.id, outbox.c.recipient)
+                .where(claimable, is_head)
+                .order_by(outbox.c.id)
+                .limit(min(self.batch_size, max_recipients or self.batch_size))
+                .with_for_update(skip_locked=True, of=outbox)
+            ).all()
+            if not heads:
+                db.rollback()
+                return []
+
+            ids = [head.id for head in heads]
+            head_of = {head.recipient: head.id for head in heads}
+            if len(ids) < self.batch_size:
+                ids.extend(self._claim_followers(db, head_of, now, self.batch_size - len(ids)))
+
+            db.execute(
+                update(outbox)
+                .where(outbox.c.id.in_(ids), claimable)
+                .values(
+                    status=OutboxStatus.IN_FLIGHT,
+                    claim_token=token,
+                    locked_until=now + timedelta(seconds=self.lease_seconds)
+                )
+            )
+            db.commit()
+
+            rows = db.execute(
+                select(
+                    outbox.c.id, outbox.c.channel, outbox.c.recipient,
+                    outbox.c.message_type, outbox.c.payload,
+                    outbox.c.attempts, outbox.c.max_attempts,
+                    outbox.c.message_id, outbox.c.claim_token,
+                )
+                .where(outbox.c.claim_token == token)
+                .order_by(outbox.c.id)
+            ).mappings().all()
+            return [{**row, "lease_deadline": lease_deadline} for row in rows]
+        finally:
+            db.close()
+
+    @staticmethod
+    def _claim_followers(db: Session, head_of: Dict[str, int], now: datetime, limit: int) -> List[int]:
+        """
+        锁定队首之后连续可发送的记录
+
+        这些记录前面有未完成的队首，其他分发器不会认领，可以直接加锁；
+        遇到退避中或投递中的记录即停止，之后的记录留到下一轮。
+        """
+        outbox = OutboxMessage.__table__
+        rows = db.execute(
+            select(outbox.c.id, outbox.c.recipient, outbox.c.status,
+                   outbox.c.available_at, outbox.c.locked_until)
+            .where(
+                outbox.c.recipient.in_(list(head_of)),
+                outbox.c.status.in_(UNFINISHED),
+                outbox.c.id > min(head_of.values()),
+            )
+            .order_by(outbox.c.id)
+            .with_for_update()
+        ).all()
+
+        ids = []
+        stopped = set()
+        for row in rows:
+            if len(ids) >= limit:
+                break
+            if row.id <= head_of[row.recipient] or row.recipient in stopped:
+                continue
+            if row.status == OutboxStatus.PENDING:
+                ready = row.available_at is None or row.available_at <= now
+            else:
+                ready = row.locked_until is not None and row.locked_until < now
+            if ready:
+                ids.append(row.id)
+            else:
+                stopped.add(row.recipient)
+        return ids
+
+    def record_results(self, results: List[Dict]) -> int:
+        """
+        批量回写投递结果
+
+        只更新 claim_token 仍为本次认领的记录：租约过期后被其他分发器重新认领的
+        记录，以新认领的状态为准。
+
+        Returns:
+            实际回写的记录数
+        """
+        if not results:
+            return 0
+        outbox = OutboxMessage.__table__
+        statement = update(outbox).where(
+            outbox.c.id == bindparam("_id"),
+            outbox.c.claim_token == bindparam("_token"),
+        )
+        # executemany 要求参数键一致，按更新的字段分组
+        groups: Dict[tuple, List[Dict]] = {}
+        for result in results:
+            values = {key: value for key, value in result["outbox"].items() if key != "id"}
+            params = {"_id": result["outbox"]["id"], "_token": result["token"], **values}
+            groups.setdefault(tuple(sorted(values)), []).append(params)
+
+        db = self.session_factory()
+        try:
+            updated = 0
+            for params in groups.values():
+                updated += db.execute(statement, params).rowcount
+            message_updates = [r["message"] for r in results if r.get("message")]
+            if message_updates:
+                db.execute(update(Message), message_updates)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        if updated < len(results):
+            logger.warning(f"{len(results) - updated} 条投递结果未回写（租约过期后已被重新认领）")
+        return updated
+
+    async def _deliver_recipient(self, rows: List[Dict], semaphore: asyncio.Semaphore,
+                                 results: List[Dict]):
+        """
+        按顺序投递同一接收者的记录，失败后其余记录退回等待
+
+        租约剩余时间不足一次调用的最长耗时时不再发送，其余记录退回，
+        避免租约过期后被其他分发器重新认领而重复发送。
+        """
+        async with semaphore:
+            for index, row in enumerate(rows):
+                if time.monotonic() + self.send_margin > row["lease_deadline"]:
+                    results.extend(self._released(pending) for pending in rows[index:])
+                    return
+
+                now = datetime.utcnow()
+                try:
+                    result = await self.sender(row)
+                except Exception as e:
+                    result = {"success": False, "error": str(e)}
+
+                if result.get("success"):
+                    results.append(self._sent(row, result, now))
+                    continue
+
+                if result.get("retry_after") is not None:
+                    # 渠道熔断中，请求未发出，不消耗投递次数
+                    results.append(self._deferred(row, result, now))
+                else:
+                    results.append(self._failed(row, result.get("error", "unknown error"), now))
+                for pending in rows[index + 1:]:
+                    results.append(self._released(pending))
+                return
+
+    @staticmethod
+    def _sent(row: Dict, result: Dict, now: datetime) -> Dict:
+        external_id = result.get("message_id")
+        return {
+            "token": row["claim_token"],
+            "outbox": {
+                "id": row["id"],
+                "status": OutboxStatus.SENT,
+                "attempts": row["attempts"] + 1,
+                "external_id": external_id,
+                "sent_at": now,
+                "claim_token": None,
+                "locked_until": None,
+                "last_error": None,
+            },
+            "message": {"id": row["message_id"], "external_id": external_id}
+            if row.get("message_id") and external_id else None,
+        }
+
+    @staticmethod
+    def _failed(row: Dict, error: str, now: datetime) -> Dict:
+        attempts = row["attempts"] + 1
+        exhausted = attempts >= row["max_attempts"]
+        backoff = min(2 ** attempts, 300)
+        return {
+            "token": row["claim_token"],
+            "outbox": {
+                "id": row["id"],
+                "status": OutboxStatus.FAILED if exhausted else OutboxStatus.PENDING,
+                "attempts": attempts,
+                "available_at": now + timedelta(seconds=backoff),
+                "claim_token": None,
+                "locked_until": None,
+                "last_error": error[:1000],
+            }
+        }
+
+    @staticmethod
+    def _deferred(row: Dict, result: Dict, now: datetime) -> Dict:
+        return {
+            "token": row["claim_token"],
+            "outbox": {
+                "id": row["id"],
+                "status": OutboxStatus.PENDING,
+                "available_at": now + timedelta(seconds=max(result["retry_after"], 1.0)),
+                "claim_token": None,
+                "locked_until": None,
+                "last_error": result.get("error", "circuit open")[:1000],
+            }
+        }
+
+    @staticmethod
+    def _released(row: Dict) -> Dict:
+        return {
+            "token": row["claim_token"],
+            "outbox": {
+                "id": row["id"],
+                "status": OutboxStatus.PENDING,
+                "claim_token": None,
+                "locked_until": None,
+            }
+        }
+
+    @staticmethod
+    def _group_by_recipient(rows: List[Dict]) -> List[List[Dict]]:
+        by_recipient: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        for row in rows:
+            by_recipient.setdefault(row["recipient"], []).append(row)
+        return list(by_recipient.values())
+
+    async def dispatch_once(self) -> int:
+        """
+        认领并投递一批记录（等待整批完成后回写结果）
+
+        Returns:
+            本批认领的记录数
+        """
+        rows = await asyncio.to_thread(self.claim_batch, self.concurrency)
+        if not rows:
+            return 0
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results: List[Dict] = []
+        await asyncio.gather(*(
+            self._deliver_recipient(group, semaphore, results)
+            for group in self._group_by_recipient(rows)
+        ))
+        await asyncio.to_thread(self.record_results, results)
+        return len(rows)
+
+    async def run_forever(self):
+        """
+        持续分发，直到 stop() 被调用
+
+        认领和投递流水线进行：投递中的接收者少于并发上限时继续认领，
+        慢接收者不会阻塞其他接收者；投递结果按批量或轮询间隔回写。
+        """
+        logger.info("发件箱分发器已启动")
+        semaphore = asyncio.Semaphore(self.concurrency)
+        in_flight = set()
+        results: List[Dict] = []
+        last_flush = time.monotonic()
+
+        while not self._stopping or in_flight:
+            claimed = 0
+            free = self.concurrency - len(in_flight)
+            if not self._stopping and free > 0:
+                try:
+                    # 只认领能立即开始投递的接收者，认领的记录不在信号量上排队
+                    rows = await asyncio.to_thread(self.claim_batch, free)
+                except Exception as e:
+                    logger.error(f"发件箱认领失败: {e}")
+                    rows = []
+                claimed = len(rows)
+                for group in self._group_by_recipient(rows):
+                    task = asyncio.create_task(self._deliver_recipient(group, semaphore, results))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+
+            now = time.monotonic()
+            if results and (len(results) >= self.batch_size or now - last_flush >= self.poll_interval):
+                batch = results[:]
+                del results[:]
+                try:
+                    await asyncio.to_thread(self.record_results, batch)
+                except Exception as e:
+                    # 未回写的记录在租约过期后会被重新认领
+                    logger.error(f"发件箱结果回写失败: {e}")
+                last_flush = now
+
+            if claimed < self.batch_size:
+                await asyncio.sleep(min(self.poll_interval, 0.05) if in_flight else self.poll_interval)
+
+        if results:
+            await asyncio.to_thread(self.record_results, results)
+        logger.info("发件箱分发器已停止")
+
+    def start(self):
+        """在当前事件循环中启动分发任务"""
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.get_running_loop().create_task(self.run_forever())
+
+    async def stop(self):
+        """停止分发任务（等待当前批次完成）"""
+        self._stopping = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+
+async def deliver(row: Dict) -> Dict:
+    """按渠道投递一条发件箱记录"""
+    from .whatsapp_service import whatsapp_service
+
+    payload = row["payload"] or {}
+    # 同一发件箱记录的重试使用相同的幂等键
+    idempotency_key = f"outbox-{row['id']}"
+    if row["channel"] == ChannelType.WHATSAPP:
+        if row["message_type"] == "template":
+            return await whatsapp_service.send_template_message(
+                row["recipient"], payload["template"], payload.get("language_code", "zh_CN"),
+                idempotency_key=idempotency_key
+            )
+        return await whatsapp_service.send_message(
+            row["recipient"], payload["message"], row["message_type"], idempotency_key
+        )
+    return {"success": False, "error": f"Unsupported channel: {row['channel'].value}"}
+
+
+# 创建全局实例
+outbox_service = OutboxService()
+outbox_dispatcher = OutboxDispatcher()
@@ -4,11 +4,14 @@ WhatsApp Business API 集成服务
 
 import json
 import logging
+import os
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import httpx
 
 from ..core.config import settings
+from ..core.profiling import span, traced
+from ..core.resilience import CircuitOpenError, ResilientClient
 
 logger = logging.getLogger(__name__)
 
@@ -24,12 +27,39 @@ class WhatsAppService:
         # 模拟模式（用于开发测试）
         self.simulation_mode = not (self.access_token and self.phone_number_id)
         
+        # HTTP连接池在当前进程首次使用时创建，不跨fork共享
+        self._client: Optional[httpx.AsyncClient] = None
+        self._client_pid: Optional[int] = None
+        
+        # 熔断、自适应超时和重试（按端点统计，每个进程独立）
+        self.resilience = ResilientClient("whatsapp", self._get_client)
+        
         if self.simulation_mode:
             logger.warning("WhatsApp服务运行在模拟模式（缺少API配置）")
         else:
             logger.info("WhatsApp服务已初始化")
     
-    async def send_message(self, to: str, message: str, message_type: str = "text") -> Dict:
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取当前进程的HTTP客户端（复用连接池）"""
+        if self._client is None or self._client_pid != os.getpid():
+            # 单次请求超时由容错层按延迟自适应控制，这里只作兜底
+            self._client = httpx.AsyncClient(timeout=settings.OUTBOUND_TIMEOUT_MAX)
+            self._client_pid = os.getpid()
+        return self._client
+    
+    def reset_after_fork(self):
+        """fork后丢弃父进程的HTTP连接池（不关闭，连接仍属于父进程）"""
+        self._client = None
+        self._client_pid = None
+    
+    async def aclose(self):
+        """关闭HTTP客户端"""
+        if self._client is not None and self._client_pid == os.getpid():
+            await self._client.aclose()
+        self._client = None
+    
+    async def send_message(self, to: str, message: str, message_type: str = "text",
+                           idempotency_key: Optional[str] = None) -> Dict:
         """
         发送WhatsApp消息
         
@@ -37,9 +67,10 @@ class WhatsAppService:
             to: 接收者电话号码（格式：国家代码+号码，如8613800138000）
             message: 消息内容
             message_type: 消息类型（text, template, media等）
+            idempotency_key: 幂等键（如发件箱记录ID），提供后超时和5xx也会重试
             
         Returns:
-            发送结果
+            发送结果（熔断时立即返回，retry_after 为建议的重试等待秒数）
         """
         if self.simulation_mode:
             logger.info(f"[模拟] 发送WhatsApp消息到 {to}: {message[:50]}...")
@@ -75,21 +106,32 @@ class WhatsAppService:
             }
         
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                result = response.json()
-                
-                logger.info(f"WhatsApp消息发送成功: {result.get('messages', [{}])[0].get('id', 'unknown')}")
-                return {
-                    "success": True,
-                    "message_id": result.get("messages", [{}])[0].get("id"),
-                    "status": "sent",
-                    "recipient": to,
-                    "timestamp": datetime.now().isoformat(),
-                    "raw_response": result
-                }
-                
+            with span("whatsapp.http_send"):
+                response = await self.resilience.request(
+                    "messages", "POST", url, headers=headers, json=payload,
+                    idempotency_key=idempotency_key
+                )
+            response.raise_for_status()
+            result = response.json()
+            
+            logger.info(f"WhatsApp消息发送成功: {result.get('messages', [{}])[0].get('id', 'unknown')}")
+            return {
+                "success": True,
+                "message_id": result.get("messages", [{}])[0].get("id"),
+                "status": "sent",
+                "recipient": to,
+                "timestamp": datetime.now().isoformat(),
+                "raw_response": result
+            }
+            
+        except CircuitOpenError as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "retry_after": e.retry_after,
+                "recipient": to,
+                "timestamp": datetime.now().isoformat()
+            }
         except Exception as e:
             logger.error(f"WhatsApp消息发送失败: {e}")
             return {
@@ -99,6 +141,7 @@ class WhatsAppService:
                 "timestamp": datetime.now().isoformat()
             }
     
+    @traced("whatsapp.receive_webhook")
     async def receive_webhook(self, webhook_data: Dict) -> Dict:
         """
         处理WhatsApp Webhook数据
@@ -142,6 +185,7 @@ class WhatsAppService:
                 "timestamp": datetime.now().isoformat()
             }
     
+    @traced("whatsapp.parse_message")
     def _parse_message(self, message: Dict) -> Optional[Dict]:
         """解析消息数据"""
         try:
@@ -220,7 +264,8 @@ class WhatsAppService:
     
     async def send_template_message(self, to: str, template_name: str, 
                                    language_code: str = "zh_CN", 
-                                   components: List[Dict] = None) -> Dict:
+                                   components: List[Dict] = None,
+                                   idempotency_key: Optional[str] = None) -> Dict:
         """
         发送模板消息
         
@@ -229,6 +274,7 @@ class WhatsAppService:
             template_name: 模板名称
             language_code: 语言代码
             components: 模板组件
+            idempotency_key: 幂等键
             
         Returns:
             发送结果
@@ -244,15 +290,47 @@ class WhatsAppService:
             }
         
         # 实际实现
-        return await self.send_message(to, template_name, "template")
+        return await self.send_message(to, template_name, "template", idempotency_key)
+    
+    async def get_phone_number_status(self) -> Dict:
+        """
+        读取业务电话号码状态（对冲请求，用于主动探测上游）
+        
+        Returns:
+            号码状态（显示号码、质量评级等）
+        """
+        if self.simulation_mode:
+            return {"success": True, "status": "simulated", "timestamp": datetime.now().isoformat()}
+        
+        url = f"{self.base_url}/{self.phone_number_id}"
+        try:
+            with span("whatsapp.http_status"):
+                response = await self.resilience.request(
+                    "phone_number", "GET", url,
+                    headers={"Authorization": f"Bearer {self.access_token}"},
+                    params={"fields": "display_phone_number,quality_rating,verified_name"},
+                    hedge=True
+                )
+            response.raise_for_status()
+            return {"success": True, **response.json(), "timestamp": datetime.now().isoformat()}
+        except Exception as e:
+            return {"success": False, "error": str(e), "timestamp": datetime.now().isoformat()}
     
     def get_health_status(self) -> Dict:
-        """获取服务健康状态"""
+        """获取服务健康状态（包括各端点熔断器状态）"""
+        breakers = self.resilience.get_status()
+        if self.simulation_mode:
+            status = "simulation"
+        elif any(b["state"] != "closed" for b in breakers.values()):
+            status = "degraded"
+        else:
+            status = "healthy"
         return {
             "service": "whatsapp",
-            "status": "healthy" if not self.simulation_mode else "simulation",
+            "status": status,
             "simulation_mode": self.simulation_mode,
             "configured": not self.simulation_mode,
+            "circuit_breakers": breakers,
             "timestamp": datetime.now().isoformat()
         }
 
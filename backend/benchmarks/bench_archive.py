@@ -0,0 +1,147 @@
+"""
+消息归档前后热表查询延迟基准测试
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_archive.py --rows 10000000 --old-ratio 0.9
+
+在临时SQLite库中生成消息数据（old-ratio 比例的消息早于保留期，另有少量 ARCHIVED 消息），
+测量收件箱查询延迟，执行归档后再次测量，并核对热表/归档表行数。
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import create_engine, func, insert, select, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.database import Base  # noqa: E402
+from app.models import Message, MessageArchive  # noqa: E402
+from app.models.message import ChannelType, MessagePriority, MessageStatus  # noqa: E402
+from app.services.archive_service import ArchiveService  # noqa: E402
+
+RETENTION_DAYS = 90
+CHUNK = 50000
+
+INBOX_QUERIES = {
+    "latest unread (whatsapp)": lambda t: select(t.c.id, t.c.sender, t.c.content)
+    .where(t.c.status == MessageStatus.UNREAD, t.c.channel == ChannelType.WHATSAPP)
+    .order_by(t.c.created_at.desc())
+    .limit(50),
+    "unread count": lambda t: select(func.count()).select_from(t)
+    .where(t.c.status == MessageStatus.UNREAD),
+    "last 24h": lambda t: select(t.c.id)
+    .where(t.c.created_at >= datetime.utcnow() - timedelta(days=1))
+    .order_by(t.c.created_at.desc())
+    .limit(200),
+}
+
+
+def populate(engine, rows: int, old_ratio: float, archived_ratio: float, seed: int = 0):
+    """生成消息数据，返回 (超过保留期的条数, 保留期内ARCHIVED的条数)"""
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    channels = list(ChannelType)
+    statuses = [MessageStatus.UNREAD, MessageStatus.READ, MessageStatus.REPLIED]
+    old = archived = 0
+    table = Message.__table__
+
+    with engine.begin() as conn:
+        for start in range(0, rows, CHUNK):
+            batch = []
+            for i in range(start, min(start + CHUNK, rows)):
+                is_old = rng.random() < old_ratio
+                age_days = rng.uniform(RETENTION_DAYS + 1, 730) if is_old else rng.uniform(0, RETENTION_DAYS - 1)
+                status = rng.choice(statuses)
+                if is_old:
+                    old += 1
+                elif rng.random() < archived_ratio:
+                    status = MessageStatus.ARCHIVED
+                    archived += 1
+                created_at = now - timedelta(days=age_days)
+                batch.append({
+                    "channel": rng.choice(channels),
+                    "sender": f"86138{i % 100000:08d}",
+                    "content": f"消息内容 {i}",
+                    "status": status,
+                    "priority": MessagePriority.NORMAL,
+                    "metadata": {},
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                    "received_at": created_at,
+                    "customer_id": i % 50000,
+                })
+            conn.execute(insert(table), batch)
+    return old, archived
+
+
+def measure(engine, table, repeat: int):
+    results = {}
+    with engine.connect() as conn:
+        for name, build in INBOX_QUERIES.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(build(table)).all()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--old-ratio", type=float, default=0.9)
+    parser.add_argument("--archived-ratio", type=float, default=0.05)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        engine = create_engine(f"sqlite:///{db_path}")
+        Base.metadata.create_all(engine, tables=[Message.__table__, MessageArchive.__table__])
+
+        start = time.perf_counter()
+        old, archived = populate(engine, args.rows, args.old_ratio, args.archived_ratio)
+        print(f"生成 {args.rows} 条消息用时 {time.perf_counter() - start:.1f}s")
+
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        before = measure(engine, Message.__table__, args.repeat)
+        size_before = os.path.getsize(db_path)
+
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        start = time.perf_counter()
+        result = ArchiveService(RETENTION_DAYS, args.batch_size).run(db)
+        elapsed = time.perf_counter() - start
+        stats = ArchiveService().get_stats(db)
+        db.close()
+
+        with engine.begin() as conn:
+            conn.execute(text("ANALYZE"))
+        after = measure(engine, Message.__table__, args.repeat)
+
+        print(f"归档 {result['archived_count']} 条用时 {elapsed:.1f}s"
+              f"（{result['archived_count'] / elapsed:.0f} 行/秒）")
+        assert stats["archived_count"] == old + archived, stats
+        assert stats["hot_count"] + stats["archived_count"] == args.rows, stats
+        print(f"行数核对通过: 热表 {stats['hot_count']}, 归档表 {stats['archived_count']}"
+              f"（数据库文件 {size_before / 1e6:.0f} MB）")
+
+        print(f"\n{'query':<28} {'before ms':>10} {'after ms':>10}")
+        for name in INBOX_QUERIES:
+            print(f"{name:<28} {before[name]:>10.2f} {after[name]:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
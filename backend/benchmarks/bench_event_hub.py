@@ -0,0 +1,110 @@
+"""
+实时事件分发延迟和CPU开销基准测试
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_event_hub.py --clients 1000 --events 2000 --rate 200
+
+在进程内创建N个订阅者（渠道/优先级过滤混合，部分为从不读取的慢消费者），
+按固定速率发布消息事件，统计：
+- 发布端每个事件的扇出耗时
+- 事件从发布到订阅者取出的延迟 p50/p99
+- 整个进程每个事件消耗的CPU时间
+- 慢消费者的缓冲区是否有界
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.event_hub import EventHub, message_event  # noqa: E402
+
+CHANNELS = ["whatsapp", "instagram", "email", "review"]
+PRIORITIES = ["normal", "urgent", "critical"]
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def run(args):
+    rng = random.Random(0)
+    hub = EventHub(buffer_size=args.buffer_size)
+    latencies = []
+    received = 0
+
+    async def consume(subscription):
+        nonlocal received
+        while True:
+            data = await subscription.get()
+            latencies.append(time.perf_counter() - json.loads(data)["sent"])
+            received += 1
+
+    consumers = []
+    slow_subscriptions = []
+    for i in range(args.clients):
+        channels = None if i % 2 == 0 else [rng.choice(CHANNELS)]
+        priorities = None if i % 3 else ["urgent", "critical"]
+        subscription = hub.subscribe(channels, priorities)
+        if rng.random() < args.slow_ratio:
+            slow_subscriptions.append(subscription)
+        else:
+            consumers.append(asyncio.create_task(consume(subscription)))
+
+    fan_out = []
+    interval = 1.0 / args.rate
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+
+    for i in range(args.events):
+        event = message_event(rng.choice(CHANNELS), {
+            "message_id": f"wamid.{i}",
+            "from": "8613800138000",
+            "content": "你好，请问今天还有位置吗？"
+        }, priority=rng.choice(PRIORITIES))
+        event["sent"] = time.perf_counter()
+        start = time.perf_counter()
+        await hub.publish(event)
+        fan_out.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+    await asyncio.sleep(0.5)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    for task in consumers:
+        task.cancel()
+
+    max_buffer = max((s.queue.qsize() for s in slow_subscriptions), default=0)
+    dropped = sum(s.dropped for s in slow_subscriptions)
+
+    print(f"{args.clients} 个订阅者（{len(slow_subscriptions)} 个慢消费者）, "
+          f"{args.events} 个事件, {received} 次投递")
+    print(f"扇出耗时/事件:   p50 {statistics.median(fan_out) * 1e6:8.1f} us"
+          f"   p99 {percentile(fan_out, 0.99) * 1e6:8.1f} us")
+    print(f"投递延迟:        p50 {statistics.median(latencies) * 1e3:8.3f} ms"
+          f"   p99 {percentile(latencies, 0.99) * 1e3:8.3f} ms")
+    print(f"CPU/事件（含订阅者解析）: {cpu / args.events * 1e3:.3f} ms,"
+          f" CPU占用 {cpu / wall:.1%}")
+    print(f"慢消费者最大缓冲 {max_buffer}/{args.buffer_size}, 丢弃 {dropped} 个事件")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=200, help="每秒发布的事件数")
+    parser.add_argument("--buffer-size", type=int, default=100)
+    parser.add_argument("--slow-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
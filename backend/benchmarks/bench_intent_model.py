@@ -0,0 +1,199 @@
+"""
+统计意图模型与关键词规则的延迟和内存基准测试
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_intent_model.py --messages 5000 --workers 4
+
+1. 用关键词模板生成的合成消息加上人工标注的改写消息训练模型，发布到临时目录；
+2. 在人工标注、不含规则关键词的留出改写消息上比较规则、模型和混合分类的准确率
+   （合成消息的标签来自规则本身，只用来测延迟，不能说明模型对改写的泛化）；
+3. 比较关键词规则、逐条模型推理、批量模型推理每1000条消息的耗时；
+4. fork多个worker加载模型，比较内存映射和普通加载时每个worker独占的内存（USS）。
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.intent_classifier import IntentClassifier  # noqa: E402
+from app.services.intent_model import IntentModel, publish, train  # noqa: E402
+
+TEMPLATES = [
+    "你好，{}？", "请问{}", "想问一下{}的事情", "{}，谢谢", "hi, {} please", "about {}",
+    "Hello, question about {}", "能帮我看看{}吗",
+]
+
+
+# 人工标注的改写消息（不含规则关键词），模拟坐席在历史消息上标注的意图
+TRAIN_PARAPHRASES = [
+    ("今天开到几点", "business_hours"), ("周一你们休息吗", "business_hours"),
+    ("晚上十点以后还营业吗", "business_hours"), ("are you guys still serving lunch", "business_hours"),
+    ("what days are you shut", "business_hours"),
+    ("周六晚上帮我留个四人桌", "reservation"), ("我想订明晚六点两位", "reservation"),
+    ("包间还能约吗", "reservation"), ("save us seats for 8 at seven", "reservation"),
+    ("we'd like to reserve for friday night", "reservation"),
+    ("菜里吃出了头发", "complaint"), ("服务员态度太差了", "complaint"),
+    ("等了一个小时还没上菜", "complaint"), ("the soup was cold and salty", "complaint"),
+    ("worst dinner ever, very disappointed", "complaint"),
+    ("你们店开在哪条街", "location"), ("从地铁站过去要走多久", "location"),
+    ("停车场在店的哪一边", "location"), ("which street is the shop on", "location"),
+    ("how do i get there from the station", "location"),
+    ("公司楼下能送吗", "delivery"), ("外送要多久能到", "delivery"),
+    ("骑手到哪了", "delivery"), ("do you bring food to my house", "delivery"),
+    ("has the rider left yet", "delivery"),
+    ("辛苦了，菜真香", "thanks"), ("下次还来，棒棒的", "thanks"),
+    ("服务太周到了", "thanks"), ("loved everything, cheers", "thanks"),
+    ("the staff were lovely", "thanks"),
+    ("老板的手机号是多少", "contact"), ("怎么找到你们的人工", "contact"),
+    ("留个微信吧", "contact"), ("what's your whatsapp number", "contact"),
+    ("who do i talk to about catering", "contact"),
+    ("招牌菜是什么", "menu_inquiry"), ("有没有素食", "menu_inquiry"),
+    ("儿童餐有哪些", "menu_inquiry"), ("do you have vegan options", "menu_inquiry"),
+    ("what's in the chef's special", "menu_inquiry"),
+]
+
+HELD_OUT_PARAPHRASES = [
+    ("明天开到几点", "business_hours"), ("周日你们休息吗", "business_hours"),
+    ("are you still serving dinner", "business_hours"),
+    ("周五晚上帮我留个六人桌", "reservation"), ("我想订后天中午三位", "reservation"),
+    ("save us seats for 4 at eight", "reservation"),
+    ("汤里吃出了虫子", "complaint"), ("等了半个小时还没上菜", "complaint"),
+    ("the steak was cold and salty", "complaint"),
+    ("你们店开在哪个商场", "location"), ("从火车站过去要走多久", "location"),
+    ("which floor is the shop on", "location"),
+    ("学校门口能送吗", "delivery"), ("骑手走了吗", "delivery"),
+    ("do you bring food to my office", "delivery"),
+    ("辛苦了，汤真好喝", "thanks"), ("服务太贴心了", "thanks"),
+    ("the waiters were lovely", "thanks"),
+    ("店长的手机号是多少", "contact"), ("留个邮箱吧", "contact"),
+    ("what's your wechat id", "contact"),
+    ("招牌甜品是什么", "menu_inquiry"), ("有没有清真的", "menu_inquiry"),
+    ("anything without gluten", "menu_inquiry"),
+]
+
+
+def synthetic_samples(count: int, seed: int = 0):
+    """根据关键词规则生成带标注的合成消息"""
+    rng = random.Random(seed)
+    rules = IntentClassifier(model_store=_NoModel()).rules
+    intents = list(rules)
+    samples = []
+    for _ in range(count):
+        intent = rng.choice(intents)
+        keyword = rng.choice(rules[intent])
+        samples.append((rng.choice(TEMPLATES).format(keyword), intent))
+    return samples
+
+
+class _NoModel:
+    def get(self):
+        return None
+
+
+class _FixedModel:
+    def __init__(self, model):
+        self.model = model
+
+    def get(self):
+        return self.model
+
+
+def per_thousand(func, texts, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(texts)
+        best = min(best, time.perf_counter() - start)
+    return best / len(texts) * 1000 * 1000
+
+
+def read_uss_kb() -> int:
+    """当前进程独占的内存（Private_Clean + Private_Dirty）"""
+    total = 0
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            if line.startswith(("Private_Clean:", "Private_Dirty:")):
+                total += int(line.split()[1])
+    return total
+
+
+def worker_uss(model_path: str, mmap: bool, workers: int) -> float:
+    """fork多个worker各自加载模型并做一次推理，返回平均独占内存增量（KB）"""
+    pipes = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            before = read_uss_kb()
+            model = IntentModel.load(model_path, mmap=mmap)
+            model.predict_batch(["请问营业时间", "I want a refund"] * 200)
+            # 触碰全部权重页（模拟长时间运行后的常驻内存），并等待其他worker加载完成
+            float(model.weights.sum())
+            time.sleep(1.0)
+            os.write(write_fd, str(read_uss_kb() - before).encode())
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append((pid, read_fd))
+
+    deltas = []
+    for pid, read_fd in pipes:
+        deltas.append(int(os.read(read_fd, 64).decode() or 0))
+        os.close(read_fd)
+        os.waitpid(pid, 0)
+    return sum(deltas) / len(deltas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    samples = synthetic_samples(args.messages)
+    split = int(len(samples) * 0.8)
+    # 改写消息重复若干次，避免被大量合成消息淹没
+    model = train(samples[:split] + TRAIN_PARAPHRASES * 10)
+    texts = [text for text, _ in samples[split:]]
+
+    rules = IntentClassifier(model_store=_NoModel())
+    hybrid = IntentClassifier(model_store=_FixedModel(model))
+
+    held_out = [text for text, _ in HELD_OUT_PARAPHRASES]
+    labels = [intent for _, intent in HELD_OUT_PARAPHRASES]
+    print(f"人工标注留出改写消息 {len(held_out)} 条（不含规则关键词）")
+    print(f"{'method':<24} {'accuracy':>9}")
+    for name, predicted in (
+        ("rules", [r["intent"] for r in rules.classify_batch(held_out)]),
+        ("model", [p[0] for p in model.predict_batch(held_out)]),
+        ("hybrid classify_batch", [r["intent"] for r in hybrid.classify_batch(held_out)]),
+    ):
+        accuracy = sum(p == label for p, label in zip(predicted, labels)) / len(labels)
+        print(f"{name:<24} {accuracy:>8.1%}")
+
+    print(f"\n合成消息 {len(texts)} 条")
+    print(f"{'method':<24} {'ms/1k msgs':>11}")
+    print(f"{'rules':<24} {per_thousand(lambda t: [rules.classify(x) for x in t], texts):>11.2f}")
+    print(f"{'model (one by one)':<24}"
+          f" {per_thousand(lambda t: [model.predict_batch([x]) for x in t], texts):>11.2f}")
+    print(f"{'model (batched)':<24} {per_thousand(model.predict_batch, texts):>11.2f}")
+    print(f"{'hybrid classify_batch':<24} {per_thousand(hybrid.classify_batch, texts):>11.2f}")
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        version = publish(model, model_dir)
+        model_path = os.path.join(model_dir, version)
+        size_kb = os.path.getsize(os.path.join(model_path, "weights.npy")) / 1024
+        print(f"\n权重文件 {size_kb:.0f} KB，{args.workers} 个worker")
+        print(f"{'load mode':<24} {'USS/worker KB':>14}")
+        print(f"{'np.load':<24} {worker_uss(model_path, False, args.workers):>14.0f}")
+        print(f"{'mmap':<24} {worker_uss(model_path, True, args.workers):>14.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+列表响应序列化、压缩和条件GET基准测试
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_json_responses.py --items 500 --requests 500
+
+构造与客户历史接口相同结构的N条消息列表，统计：
+- 序列化耗时：FastAPI默认路径（jsonable_encoder + json.dumps）与 orjson
+- 响应大小：原始 / gzip / brotli（已安装时）
+- 请求吞吐：默认 JSONResponse、orjson 直接响应、orjson + 压缩，以及命中ETag的304
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.compression import CompressionMiddleware, brotli  # noqa: E402
+from app.core.responses import DefaultJSONResponse, conditional_json, make_etag, orjson  # noqa: E402
+
+
+def build_messages(count: int):
+    start = datetime(2024, 1, 1, 8, 0, 0)
+    return [
+        {
+            "id": 100000 + i,
+            "external_id": f"wamid.HBgNODYxMzgwMDEzODAwMBUCABIYFjNFQjA{i:06d}",
+            "channel": "whatsapp",
+            "sender": "8613800138000",
+            "recipient": "business",
+            "content": f"你好，我想预约明天下午{i % 12 + 1}点，请问还有位置吗？谢谢！",
+            "status": ["read", "replied", "pending"][i % 3],
+            "priority": ["normal", "urgent"][i % 7 == 0],
+            "created_at": (start + timedelta(minutes=i)).isoformat(),
+            "updated_at": (start + timedelta(minutes=i, seconds=30)).isoformat(),
+            "archived": i % 5 == 0
+        }
+        for i in range(count)
+    ]
+
+
+def per_call_ms(func, repeat: int = 5, number: int = 20) -> float:
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1000
+
+
+def build_app(payload, compress: bool) -> FastAPI:
+    app = FastAPI(default_response_class=DefaultJSONResponse)
+    if compress:
+        app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    last_modified = datetime(2024, 1, 2)
+    etag = make_etag("history", 1, len(payload["messages"]), last_modified)
+
+    @app.get("/default", response_class=JSONResponse)
+    def default_route():
+        return payload
+
+    @app.get("/orjson")
+    def orjson_route(request: Request):
+        return conditional_json(request, etag, last_modified, lambda: payload)
+
+    return app, etag
+
+
+def requests_per_second(client, path: str, count: int, headers=None) -> float:
+    client.get(path, headers=headers)
+    start = time.perf_counter()
+    for _ in range(count):
+        response = client.get(path, headers=headers)
+    elapsed = time.perf_counter() - start
+    assert response.status_code in (200, 304), response.status_code
+    return count / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    messages = build_messages(args.items)
+    payload = {"customer_id": 1, "count": len(messages), "messages": messages, "next_before": None}
+
+    default_ms = per_call_ms(
+        lambda: json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":"))
+    )
+    print(f"{args.items} 条消息的序列化耗时")
+    print(f"  jsonable_encoder + json.dumps: {default_ms:8.3f} ms")
+    if orjson is not None:
+        orjson_ms = per_call_ms(lambda: orjson.dumps(payload))
+        print(f"  orjson.dumps:                  {orjson_ms:8.3f} ms  ({default_ms / orjson_ms:.1f}x)")
+    else:
+        print("  orjson 未安装，跳过")
+
+    body = DefaultJSONResponse(payload).body
+    print("\n响应大小")
+    print(f"  原始:   {len(body):8d} bytes")
+    print(f"  gzip:   {len(gzip.compress(body, compresslevel=6)):8d} bytes")
+    if brotli is not None:
+        print(f"  brotli: {len(brotli.compress(body, quality=4)):8d} bytes")
+
+    plain_app, etag = build_app(payload, compress=False)
+    compressed_app, _ = build_app(payload, compress=True)
+    rows = []
+    with TestClient(plain_app) as client:
+        rows.append(("默认 JSONResponse", requests_per_second(client, "/default", args.requests)))
+        rows.append(("orjson 直接响应", requests_per_second(client, "/orjson", args.requests)))
+        rows.append(("If-None-Match 命中 (304)", requests_per_second(
+            client, "/orjson", args.requests, headers={"If-None-Match": etag}
+        )))
+    with TestClient(compressed_app) as client:
+        rows.append(("orjson + gzip", requests_per_second(
+            client, "/orjson", args.requests, headers={"Accept-Encoding": "gzip"}
+        )))
+        if brotli is not None:
+            rows.append(("orjson + brotli", requests_per_second(
+                client, "/orjson", args.requests, headers={"Accept-Encoding": "br"}
+            )))
+
+    print(f"\n请求吞吐（进程内 TestClient, {args.requests} 次请求）")
+    for name, rps in rows:
+        print(f"  {name:<26} {rps:8.0f} req/s")
+
+
+if __name__ == "__main__":
+    main()
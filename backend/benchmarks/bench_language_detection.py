@@ -0,0 +1,134 @@
+"""
+语言检测准确率和延迟基准测试
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_language_detection.py --rounds 2000
+
+在带标注的留出样本上比较旧的正则中英文检测和新的语言检测器，
+输出准确率和每条消息的平均耗时（区分冷缓存和热缓存），以及只含汉字的中文消息的耗时。
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services import language_detector as detector_module  # noqa: E402
+from app.services.language_detector import language_detector  # noqa: E402
+
+# 留出样本：话题（过敏、蛋糕、发票、失物、宠物、支付、招聘等）与 _TRAINING_TEXT 不重叠，
+# 不是训练语料的改写，也不参与模型构建
+LABELLED_SAMPLE = [
+    ("zh", "我对花生过敏，这道菜里有坚果吗"),
+    ("zh", "生日蛋糕需要提前几天订"),
+    ("zh", "能开增值税专用发票吗"),
+    ("zh", "昨晚我的雨伞落在店里了"),
+    ("zh", "可以带狗进去吗"),
+    ("zh", "支持微信支付和支付宝吗"),
+    ("zh", "你们还招兼职服务员吗"),
+    ("zh", "請問有素食餐點嗎"),
+    ("zh", "包间最低消费是多少"),
+    ("zh", "WiFi密码是多少"),
+    ("en", "I'm allergic to shellfish, is the curry safe for me"),
+    ("en", "Could you write Happy Birthday on the cake"),
+    ("en", "I need an itemized receipt for my company"),
+    ("en", "I think I left my scarf under the table last night"),
+    ("en", "Are dogs allowed on the terrace"),
+    ("en", "Do you take Apple Pay or only cash"),
+    ("en", "Are you hiring kitchen staff this summer"),
+    ("en", "Is there a corkage fee if we bring wine"),
+    ("es", "Soy alérgica al gluten, ¿el pan lo hacen ustedes?"),
+    ("es", "Necesito una factura a nombre de mi empresa"),
+    ("es", "Creo que olvidé mi chaqueta en la silla"),
+    ("es", "¿Se puede entrar con perro?"),
+    ("es", "¿Aceptan pagos con tarjeta de crédito?"),
+    ("es", "Busco trabajo de camarero los fines de semana"),
+    ("es", "¿Cuánto cobran por traer nuestra propia tarta?"),
+    ("fr", "Je suis allergique aux arachides, ce dessert en contient-il ?"),
+    ("fr", "Pourriez-vous écrire joyeux anniversaire sur le gâteau ?"),
+    ("fr", "J'ai besoin d'une facture détaillée pour ma société"),
+    ("fr", "J'ai oublié mon parapluie hier soir"),
+    ("fr", "Les chiens sont-ils acceptés en terrasse ?"),
+    ("fr", "Vous recrutez des serveurs pour l'été ?"),
+    ("fr", "Y a-t-il un droit de bouchon si on apporte notre vin ?"),
+    ("ja", "ピーナッツのアレルギーがあります"),
+    ("ja", "誕生日ケーキにメッセージを入れられますか"),
+    ("ja", "会社宛の領収書をお願いします"),
+    ("ja", "昨日傘を忘れてしまいました"),
+    ("ja", "犬を連れて入れますか"),
+    ("ja", "本日貸切営業"),
+    ("ja", "アルバイトは募集していますか"),
+    ("ko", "땅콩 알레르기가 있는데 괜찮을까요"),
+    ("ko", "생일 케이크에 문구를 넣을 수 있나요"),
+    ("ko", "회사 이름으로 영수증 발행해 주세요"),
+    ("ko", "어제 우산을 두고 온 것 같아요"),
+    ("ko", "강아지 데리고 가도 되나요"),
+    ("ko", "아르바이트 구하시나요"),
+]
+
+
+def regex_detect(text: str) -> str:
+    """旧实现：两次 re.findall 统计中英文字符"""
+    chinese_chars = len(re.findall(r'[\u4e00-\u9fff]', text))
+    english_chars = len(re.findall(r'[a-zA-Z]', text))
+    if chinese_chars > english_chars:
+        return "zh"
+    elif english_chars > chinese_chars:
+        return "en"
+    return "zh"
+
+
+# 只含汉字（不含拉丁字母、假名）的中文消息
+HAN_ONLY_SAMPLE = [
+    (label, text) for label, text in LABELLED_SAMPLE
+    if label == "zh" and not re.search(r"[A-Za-z]", text)
+]
+
+
+def measure(detect, rounds: int, clear_cache=None, sample=LABELLED_SAMPLE):
+    texts = [text for _, text in sample]
+    correct = sum(detect(text) == label for label, text in sample)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if clear_cache:
+            clear_cache()
+        for text in texts:
+            detect(text)
+    elapsed = time.perf_counter() - start
+    per_message_us = elapsed / (rounds * len(texts)) * 1e6
+    return correct / len(sample), per_message_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = [
+        ("regex (zh/en)", *measure(regex_detect, args.rounds)),
+        ("detector cold cache", *measure(language_detector.detect, args.rounds,
+                                         detector_module._detect_cached.cache_clear)),
+        ("detector warm cache", *measure(language_detector.detect, args.rounds)),
+        ("detector cold, 纯汉字zh", *measure(language_detector.detect, args.rounds,
+                                          detector_module._detect_cached.cache_clear,
+                                          HAN_ONLY_SAMPLE)),
+    ]
+
+    print(f"{'method':<22} {'accuracy':>9} {'us/msg':>8}")
+    for name, accuracy, latency in rows:
+        print(f"{name:<22} {accuracy:>8.1%} {latency:>8.2f}")
+
+    errors = [
+        (label, language_detector.detect(text), text)
+        for label, text in LABELLED_SAMPLE
+        if language_detector.detect(text) != label
+    ]
+    for label, predicted, text in errors:
+        print(f"  误判 {label} -> {predicted}: {text}")
+
+
+if __name__ == "__main__":
+    main()
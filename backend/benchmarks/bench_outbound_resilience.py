@@ -0,0 +1,173 @@
+"""
+外部API调用容错基准测试：上游故障期间的调用延迟
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_outbound_resilience.py --rate 50 --healthy 5 --outage 10 --recovery 10
+
+用 httpx.MockTransport 在本地模拟上游，按固定速率发起 POST（不等待前一个完成），
+依次经历三个阶段：
+- 正常：延迟约 50ms
+- 故障：请求挂起 --hang 秒后返回 503（模拟 graph.facebook.com 降级）
+- 恢复：恢复正常
+分别用原实现（固定30秒超时、无重试）和容错层（熔断 + 自适应超时 + 重试）调用，
+按阶段报告成功率、延迟 p50/p99/最大值，以及同时挂起的调用数峰值。
+最后用长尾延迟（5% 的请求 500ms）的 GET 对比对冲请求前后的 p99。
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import httpx  # noqa: E402
+
+from app.core.resilience import ResilientClient  # noqa: E402
+
+URL = "https://graph.example.test/v18.0/123/messages"
+
+
+class FaultInjector:
+    """按阶段注入故障的本地上游"""
+
+    def __init__(self, healthy: float, outage: float, hang: float, tail_rate: float = 0.0):
+        self.healthy = healthy
+        self.outage = outage
+        self.hang = hang
+        self.tail_rate = tail_rate
+        self.rng = random.Random(0)
+        self.started = time.monotonic()
+        self.requests = 0
+
+    def in_outage(self) -> bool:
+        elapsed = time.monotonic() - self.started
+        return self.healthy <= elapsed < self.healthy + self.outage
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        if self.in_outage():
+            await asyncio.sleep(self.hang)
+            return httpx.Response(503, json={"error": "unavailable"})
+        latency = 0.5 if self.rng.random() < self.tail_rate else self.rng.uniform(0.03, 0.07)
+        await asyncio.sleep(latency)
+        return httpx.Response(200, json={"messages": [{"id": "wamid.test"}]})
+
+
+def summarize(samples):
+    latencies = sorted(s[1] for s in samples)
+    ok = sum(1 for s in samples if s[2])
+    p = lambda q: latencies[min(int(len(latencies) * q), len(latencies) - 1)] * 1000  # noqa: E731
+    return (f"{len(samples):>6} {ok / len(samples) * 100:>6.1f}% {p(0.5):>9.0f} {p(0.99):>9.0f} "
+            f"{latencies[-1] * 1000:>9.0f}")
+
+
+async def run_outage(label: str, send, injector: FaultInjector, args):
+    phases = [("正常", args.healthy), ("故障", args.outage), ("恢复", args.recovery)]
+    duration = sum(p[1] for p in phases)
+    samples = []
+    in_flight = 0
+    peak = 0
+
+    async def one(started):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            ok = await send()
+        except Exception:
+            ok = False
+        in_flight -= 1
+        samples.append((started - injector.started, time.monotonic() - started, ok))
+
+    injector.started = time.monotonic()
+    tasks = []
+    interval = 1.0 / args.rate
+    next_at = injector.started
+    while time.monotonic() - injector.started < duration:
+        tasks.append(asyncio.create_task(one(time.monotonic())))
+        next_at += interval
+        await asyncio.sleep(max(next_at - time.monotonic(), 0))
+    await asyncio.gather(*tasks)
+
+    print(f"\n{label}（上游收到 {injector.requests} 个请求，同时挂起峰值 {peak}）")
+    print(f"{'阶段':<6} {'调用数':>6} {'成功率':>7} {'p50 ms':>9} {'p99 ms':>9} {'最大 ms':>9}")
+    start = 0.0
+    for name, length in phases:
+        phase = [s for s in samples if start <= s[0] < start + length]
+        if phase:
+            print(f"{name:<6} {summarize(phase)}")
+        start += length
+
+
+async def run_hedging(args):
+    injector = FaultInjector(healthy=1e9, outage=0, hang=0, tail_rate=0.05)
+    client = httpx.AsyncClient(transport=httpx.MockTransport(injector.handler))
+    resilient = ResilientClient("bench", lambda: client, timeout_max=5.0, deadline=5.0)
+
+    print(f"\n长尾GET（5% 请求 500ms）{args.reads} 次")
+    print(f"{'方式':<8} {'p50 ms':>9} {'p99 ms':>9} {'上游请求':>9}")
+    for hedge in (False, True):
+        injector.requests = 0
+        latencies = []
+        for _ in range(args.reads // 10):
+            async def read():
+                start = time.monotonic()
+                await resilient.request("status", "GET", URL, hedge=hedge)
+                latencies.append(time.monotonic() - start)
+            await asyncio.gather(*(read() for _ in range(10)))
+        latencies.sort()
+        print(f"{'对冲' if hedge else '不对冲':<8} {statistics.median(latencies) * 1000:>9.0f} "
+              f"{latencies[int(len(latencies) * 0.99)] * 1000:>9.0f} {injector.requests:>9}")
+    await client.aclose()
+
+
+async def run(args):
+    payload = {"messaging_product": "whatsapp", "to": "8613800138000", "type": "text",
+               "text": {"body": "你好"}}
+
+    injector = FaultInjector(args.healthy, args.outage, args.hang)
+    plain = httpx.AsyncClient(timeout=30.0, transport=httpx.MockTransport(injector.handler))
+
+    async def send_plain():
+        response = await plain.post(URL, json=payload)
+        return response.status_code == 200
+
+    await run_outage("原实现（固定30秒超时）", send_plain, injector, args)
+    await plain.aclose()
+
+    injector = FaultInjector(args.healthy, args.outage, args.hang)
+    client = httpx.AsyncClient(timeout=30.0, transport=httpx.MockTransport(injector.handler))
+    resilient = ResilientClient("bench", lambda: client, breaker_reset=args.breaker_reset)
+    keys = iter(range(10 ** 9))
+
+    async def send_resilient():
+        response = await resilient.request("messages", "POST", URL, json=payload,
+                                           idempotency_key=f"bench-{next(keys)}")
+        return response.status_code == 200
+
+    await run_outage("容错层（熔断 + 自适应超时 + 重试）", send_resilient, injector, args)
+    print(f"熔断器: {resilient.get_status()['messages']}")
+    await client.aclose()
+
+    await run_hedging(args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rate", type=float, default=50, help="每秒调用数")
+    parser.add_argument("--healthy", type=float, default=5, help="正常阶段秒数")
+    parser.add_argument("--outage", type=float, default=10, help="故障阶段秒数")
+    parser.add_argument("--recovery", type=float, default=10, help="恢复阶段秒数")
+    parser.add_argument("--hang", type=float, default=30, help="故障期间上游挂起秒数")
+    parser.add_argument("--breaker-reset", type=float, default=3, help="熔断后放行探测的间隔")
+    parser.add_argument("--reads", type=int, default=1000)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+热点路径计时开销基准测试
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_profiling_overhead.py --calls 1000000
+
+比较关闭/开启计时时 traced 装饰器、span 上下文管理器和 IntentClassifier.classify
+每次调用的耗时，验证 PROFILING_ENABLED=False 时开销接近于零。
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.core import profiling  # noqa: E402
+
+
+def per_call_ns(stmt, calls: int, repeat: int = 5) -> float:
+    return min(timeit.repeat(stmt, number=calls, repeat=repeat)) / calls * 1e9
+
+
+class _NoModel:
+    def get(self):
+        return None
+
+
+def build(enabled: bool):
+    """按开关状态构造被测函数"""
+    from app.services.intent_classifier import IntentClassifier
+
+    profiling.set_enabled(enabled)
+
+    def work(x):
+        return x + 1
+
+    def span_work(x):
+        with profiling.span("bench.span"):
+            return x + 1
+
+    classify = getattr(IntentClassifier.classify, "__wrapped__", IntentClassifier.classify)
+    return (
+        work,
+        profiling.traced("bench.work")(work),
+        span_work,
+        profiling.traced("bench.classify")(classify),
+        IntentClassifier(model_store=_NoModel()),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=1000000)
+    args = parser.parse_args()
+    classify_calls = max(args.calls // 100, 1000)
+    text = "请问今天几点开门？"
+
+    rows = []
+    for enabled in (False, True):
+        work, traced_work, span_work, classify, classifier = build(enabled)
+        rows.append((
+            "on" if enabled else "off",
+            per_call_ns(lambda: work(1), args.calls),
+            per_call_ns(lambda: traced_work(1), args.calls),
+            per_call_ns(lambda: span_work(1), args.calls),
+            per_call_ns(lambda: classify(classifier, text), classify_calls),
+        ))
+    profiling.set_enabled(False)
+
+    print(f"{'tracing':<8} {'plain ns':>9} {'traced ns':>10} {'span ns':>9} {'classify ns':>12}")
+    for name, plain, traced_ns, span_ns, classify_ns in rows:
+        print(f"{name:<8} {plain:>9.1f} {traced_ns:>10.1f} {span_ns:>9.1f} {classify_ns:>12.1f}")
+
+    off = rows[0]
+    print(f"\n关闭时额外开销: traced {off[2] - off[1]:+.1f} ns, span {off[3] - off[1]:+.1f} ns/次")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+仪表盘查询延迟基准测试：原始表 GROUP BY 与汇总表
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_rollups.py --messages 10000000 --days 365 --db /tmp/bench_rollups.db
+
+在独立的 SQLite 数据库中生成N条消息（按时间均匀分布，渠道/意图/优先级/状态随机），
+然后分别在 messages 原始表和 message_rollups 汇总表上执行相同的仪表盘查询：
+- 最近7天按小时×渠道的消息量
+- 最近30天按天×意图的消息量
+- 最近30天按渠道的平均首次回复耗时
+同时报告全量重建汇总的耗时和内存聚合器的单次记录开销。
+数据库文件已存在且消息数一致时复用消息数据，不重新生成。
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from sqlalchemy import case, create_engine, func, insert, select, type_coerce  # noqa: E402
+from sqlalchemy import DateTime  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.core.database import Base  # noqa: E402
+from app.models.message import ChannelType, Message, MessagePriority, MessageStatus  # noqa: E402
+from app.models.message_archive import MessageArchive  # noqa: E402
+from app.models.message_rollup import MessageRollup, RollupRebuild  # noqa: E402
+from app.models.outbox import OutboxMessage  # noqa: E402
+from app.services.rollup_service import RollupAggregator, RollupService, lock_rollup_version  # noqa: E402,E501
+
+INTENTS = [None, "booking", "pricing", "hours", "complaint", "location"]
+STATUSES = [MessageStatus.UNREAD, MessageStatus.READ, MessageStatus.REPLIED, MessageStatus.REPLIED]
+
+
+def generate(engine, count: int, days: int, end: datetime):
+    rng = random.Random(0)
+    table = Message.__table__
+    start = end - timedelta(days=days)
+    span = (end - start).total_seconds()
+    batch = 50000
+    began = time.perf_counter()
+    with engine.begin() as conn:
+        for offset in range(0, count, batch):
+            rows = []
+            for i in range(offset, min(offset + batch, count)):
+                created_at = start + timedelta(seconds=span * i / count)
+                status = rng.choice(STATUSES)
+                intent = rng.choice(INTENTS)
+                replied_at = created_at + timedelta(seconds=rng.randint(30, 7200)) \
+                    if status == MessageStatus.REPLIED else None
+                rows.append({
+                    "channel": rng.choice(list(ChannelType)),
+                    "sender": "8613800138000",
+                    "content": "你好",
+                    "status": status,
+                    "priority": MessagePriority.URGENT if rng.random() < 0.1 else MessagePriority.NORMAL,
+                    "metadata": {"intent": intent} if intent else {},
+                    "created_at": created_at,
+                    "updated_at": replied_at or created_at,
+                    "replied_at": replied_at,
+                })
+            conn.execute(insert(table), rows)
+    print(f"生成 {count} 条消息: {time.perf_counter() - began:.1f} s")
+
+
+def timed(func_, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func_()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000, result
+
+
+def raw_queries(end: datetime):
+    table = Message.__table__
+    hour = type_coerce(func.strftime("%Y-%m-%d %H:00:00", table.c.created_at), DateTime)
+    day = func.date(table.c.created_at)
+    intent = func.coalesce(table.c["metadata"]["intent"].as_string(), "unknown")
+    replied = table.c.replied_at.is_not(None)
+    seconds = (func.julianday(table.c.replied_at) - func.julianday(table.c.created_at)) * 86400.0
+    week, month = end - timedelta(days=7), end - timedelta(days=30)
+    return {
+        "7天 小时×渠道": select(hour.label("h"), table.c.channel, func.count())
+        .where(table.c.created_at >= week).group_by("h", table.c.channel),
+        "30天 天×意图": select(day.label("d"), intent.label("i"), func.count())
+        .where(table.c.created_at >= month).group_by("d", "i"),
+        "30天 渠道首次回复": select(
+            table.c.channel, func.sum(case((replied, seconds), else_=0.0)) / func.sum(case((replied, 1), else_=0))
+        ).where(table.c.created_at >= month).group_by(table.c.channel),
+    }
+
+
+def rollup_queries(service: RollupService, end: datetime):
+    week, month = end - timedelta(days=7), end - timedelta(days=30)
+    return {
+        "7天 小时×渠道": lambda db: service.query(db, week, end, ["channel"]),
+        "30天 天×意图": lambda db: service.query(db, month, end, ["intent"], granularity="day"),
+        "30天 渠道首次回复": lambda db: service.query(db, month, end, ["channel"], granularity="day"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=10000000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--db", default="/tmp/bench_rollups.db")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = create_engine(f"sqlite:///{args.db}")
+    Session = sessionmaker(bind=engine)
+    end = datetime(2024, 12, 31)
+    tables = [t.__table__ for t in (Message, MessageArchive, MessageRollup, RollupRebuild,
+                                    OutboxMessage)]
+
+    reuse = False
+    if os.path.exists(args.db):
+        with engine.connect() as conn:
+            try:
+                reuse = conn.execute(select(func.count()).select_from(Message.__table__)).scalar() == args.messages
+            except Exception:
+                reuse = False
+    if reuse:
+        # 汇总表结构可能已变化，复用消息数据时重新创建
+        MessageRollup.__table__.drop(engine, checkfirst=True)
+        MessageRollup.__table__.create(engine)
+        RollupRebuild.__table__.create(engine, checkfirst=True)
+    else:
+        engine.dispose()
+        if os.path.exists(args.db):
+            os.remove(args.db)
+        Base.metadata.create_all(engine, tables=tables)
+        generate(engine, args.messages, args.days, end)
+
+    service = RollupService()
+    db = Session()
+    start = time.perf_counter()
+    result = service.rebuild(db)
+    print(f"全量重建汇总: {time.perf_counter() - start:.1f} s, {result['rows']} 行汇总")
+
+    print(f"\n{'查询':<14} {'原始表 ms':>12} {'汇总表 ms':>12} {'加速':>8}")
+    raw = raw_queries(end)
+    rolled = rollup_queries(service, end)
+    for name, query in raw.items():
+        raw_ms, _ = timed(lambda: db.execute(query).all(), args.repeat)
+        rollup_ms, _ = timed(lambda: rolled[name](db), args.repeat)
+        print(f"{name:<14} {raw_ms:>12.1f} {rollup_ms:>12.2f} {raw_ms / rollup_ms:>7.0f}x")
+
+    aggregator = RollupAggregator(session_factory=Session)
+    key = (datetime(2024, 12, 30, 10), "whatsapp", "booking", "normal", "unread")
+    # 增量需带上重建后的版本号，否则写入时被当作已由重建计入而丢弃
+    version = lock_rollup_version(db.connection())
+    db.commit()
+    calls = 200000
+    start = time.perf_counter()
+    for _ in range(calls):
+        aggregator.add(key, 1, version=version)
+    per_add = (time.perf_counter() - start) / calls * 1e9
+    start = time.perf_counter()
+    aggregator.flush()
+    print(f"\n聚合器记录开销: {per_add:.0f} ns/次, {calls} 次合并后写入耗时"
+          f" {(time.perf_counter() - start) * 1000:.1f} ms")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
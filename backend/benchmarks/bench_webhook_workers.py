@@ -0,0 +1,130 @@
+"""
+Webhook吞吐量随worker数扩展的基准测试
+
+用法（在backend目录下运行）：
+    python benchmarks/bench_webhook_workers.py --max-workers 4 --requests 20000
+
+依次以 1..N 个worker启动 gunicorn，用多个压测进程并发请求
+/api/v1/whatsapp/webhook，输出每种配置的请求/秒和加速比。
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import httpx
+
+WEBHOOK_PATH = "/api/v1/whatsapp/webhook"
+
+SAMPLE_PAYLOAD = {
+    "entry": [{
+        "changes": [{
+            "value": {
+                "messages": [{
+                    "from": "8613800138000",
+                    "id": "wamid.benchmark",
+                    "timestamp": "1700000000",
+                    "type": "text",
+                    "text": {"body": "你好，请问今天几点开门？"}
+                }]
+            }
+        }]
+    }]
+}
+
+
+async def _client_loop(base_url: str, requests: int, concurrency: int) -> int:
+    body = json.dumps(SAMPLE_PAYLOAD).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    remaining = requests
+    ok = 0
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        async def worker():
+            nonlocal remaining, ok
+            while remaining > 0:
+                remaining -= 1
+                response = await client.post(WEBHOOK_PATH, content=body, headers=headers)
+                if response.status_code == 200:
+                    ok += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return ok
+
+
+def _load_process(base_url: str, requests: int, concurrency: int, queue):
+    queue.put(asyncio.run(_client_loop(base_url, requests, concurrency)))
+
+
+def _wait_ready(base_url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("服务启动超时")
+
+
+def run(workers: int, args) -> float:
+    """以指定worker数运行一轮压测，返回请求/秒"""
+    bind = f"127.0.0.1:{args.port}"
+    base_url = f"http://{bind}"
+    # 只测webhook本身，关闭发件箱分发器的轮询
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=bind, DEBUG="false",
+               OUTBOX_DISPATCHER_ENABLED="false")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"],
+        env=env,
+    )
+    try:
+        _wait_ready(base_url)
+        queue = multiprocessing.Queue()
+        per_process = args.requests // args.load_processes
+        procs = [
+            multiprocessing.Process(
+                target=_load_process,
+                args=(base_url, per_process, args.concurrency, queue),
+            )
+            for _ in range(args.load_processes)
+        ]
+        start = time.perf_counter()
+        for p in procs:
+            p.start()
+        ok = sum(queue.get() for _ in procs)
+        for p in procs:
+            p.join()
+        elapsed = time.perf_counter() - start
+        return ok / elapsed
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--max-workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--concurrency", type=int, default=64, help="每个压测进程的并发连接数")
+    parser.add_argument("--load-processes", type=int, default=4)
+    parser.add_argument("--port", type=int, default=18000)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8}")
+    for workers in range(1, args.max_workers + 1):
+        rps = run(workers, args)
+        baseline = baseline or rps
+        print(f"{workers:>8} {rps:>10.0f} {rps / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
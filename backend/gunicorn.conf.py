@@ -0,0 +1,41 @@
+"""
+Gunicorn 生产环境配置
+
+用法：gunicorn -c gunicorn.conf.py app.main:app
+
+应用在master进程中预加载（preload_app），worker fork后再初始化
+数据库连接池、HTTP连接池和Redis连接，保证这些连接不会在进程间共享。
+"""
+
+import multiprocessing
+
+from app.core.config import settings
+
+bind = settings.BIND
+workers = settings.WEB_CONCURRENCY or multiprocessing.cpu_count()
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+# 超时配置
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# 日志
+accesslog = "-" if settings.DEBUG else None
+errorlog = "-"
+loglevel = "info" if settings.DEBUG else "warning"
+
+
+def post_fork(server, worker):
+    """worker fork后丢弃从master继承的连接"""
+    from app.core.cache import cache
+    from app.core.database import dispose_engine_after_fork
+    from app.services.event_hub import event_hub
+    from app.services.whatsapp_service import whatsapp_service
+
+    dispose_engine_after_fork()
+    whatsapp_service.reset_after_fork()
+    cache.reset_after_fork()
+    event_hub.reset_after_fork()
+    server.log.info(f"worker {worker.pid} 已初始化进程内连接")
@@ -0,0 +1,147 @@
+"""
+应用装配冒烟测试：导入 app.main，经由完整中间件和路由发起请求
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.events import events_stream
+from app.core.config import settings
+from app.core.database import get_db
+from app.main import app
+from app.models.message import ChannelType, Message
+from app.services.event_hub import event_hub
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def client(session_factory, monkeypatch):
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", ADMIN_TOKEN)
+    app.dependency_overrides[get_db] = override_get_db
+    # 不进入上下文，不启动发件箱分发等后台任务
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+def test_all_routers_are_mounted():
+    paths = {route.path for route in app.routes}
+    for path in ("/api/v1/", "/api/v1/customers/import", "/api/v1/whatsapp/webhook",
+                 "/api/v1/archive/run", "/api/v1/events/stream", "/api/v1/admin/profiling/spans",
+                 "/api/v1/analytics/messages"):
+        assert path in paths
+
+
+def test_health(client):
+    assert client.get("/health").json()["status"] == "healthy"
+    assert client.get("/api/v1/").json()["status"] == "healthy"
+
+
+def test_admin_routes_require_token(client):
+    assert client.post("/api/v1/archive/run").status_code == 403
+    assert client.post("/api/v1/archive/run",
+                       headers={"X-Admin-Token": "wrong"}).status_code == 403
+    # 非ASCII令牌按 latin-1 解码后也应返回403，而不是500
+    assert client.post("/api/v1/archive/run",
+                       headers={"X-Admin-Token": "管理令牌".encode()}).status_code == 403
+    response = client.post("/api/v1/archive/run", headers={"X-Admin-Token": ADMIN_TOKEN})
+    assert response.status_code == 200
+    assert response.json()["archived_count"] == 0
+
+
+def test_customer_history_conditional_get(client):
+    response = client.get("/api/v1/archive/customers/1/history")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    assert client.get("/api/v1/archive/customers/1/history",
+                      headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_customer_history_ignores_if_modified_since(client, session_factory):
+    db = session_factory()
+    db.add(Message(channel=ChannelType.WHATSAPP, sender="8613800138000", content="你好",
+                   customer_id=1, created_at=datetime.utcnow() - timedelta(days=200)))
+    db.commit()
+    db.close()
+    response = client.get("/api/v1/archive/customers/1/history")
+    assert "last-modified" not in response.headers
+
+    # 归档不改变最后更新时间，If-Modified-Since 不能判断为未变化
+    client.post("/api/v1/archive/run", headers={"X-Admin-Token": ADMIN_TOKEN})
+    later = client.get("/api/v1/archive/customers/1/history",
+                       headers={"If-Modified-Since": "Fri, 01 Mar 2030 00:00:00 GMT"})
+    assert later.status_code == 200
+    assert later.headers["etag"] != response.headers["etag"]
+    assert later.json()["messages"][0]["archived"] is True
+
+
+@pytest.mark.parametrize("params", ["", "?token=wrong"])
+def test_event_streams_require_token(client, params):
+    assert client.get(f"/api/v1/events/stream{params}").status_code == 403
+    with pytest.raises(WebSocketDisconnect) as disconnect:
+        with client.websocket_connect(f"/api/v1/events/ws{params}") as websocket:
+            websocket.receive_text()
+    assert disconnect.value.code == 1008
+
+
+def test_event_websocket_accepts_token(client):
+    with client.websocket_connect(f"/api/v1/events/ws?token={ADMIN_TOKEN}"):
+        assert event_hub.subscriber_count == 1
+
+
+def test_event_stream_subscribes_only_while_streaming():
+    class DisconnectedRequest:
+        async def is_disconnected(self):
+            return True
+
+    async def open_and_close():
+        response = await events_stream(DisconnectedRequest(), channel="whatsapp")
+        # 响应创建后、开始发送前客户端断开，不应留下订阅
+        assert event_hub.subscriber_count == 0
+        assert [chunk async for chunk in response.body_iterator] == []
+
+    asyncio.run(open_and_close())
+    assert event_hub.subscriber_count == 0
+
+
+def test_customer_history_cursor_includes_id(client, session_factory):
+    created_at = datetime.utcnow() - timedelta(hours=1)
+    db = session_factory()
+    db.add_all([
+        Message(channel=ChannelType.WHATSAPP, sender="8613800138000", content=f"消息 {i}",
+                customer_id=1, created_at=created_at)
+        for i in range(3)
+    ])
+    db.commit()
+    db.close()
+
+    first = client.get("/api/v1/archive/customers/1/history", params={"limit": 2}).json()
+    second = client.get("/api/v1/archive/customers/1/history", params={
+        "limit": 2, "before": first["next_before"], "before_id": first["next_before_id"]
+    }).json()
+
+    ids = [m["id"] for m in first["messages"] + second["messages"]]
+    assert ids == [3, 2, 1]
+    assert second["next_before"] is None and second["next_before_id"] is None
+
+
+def test_whatsapp_probe_requires_admin_token(client):
+    health = client.get("/api/v1/whatsapp/health")
+    assert health.status_code == 200 and "probe" not in health.json()
+
+    assert client.get("/api/v1/whatsapp/health", params={"probe": True}).status_code == 403
+    probed = client.get("/api/v1/whatsapp/health", params={"probe": True},
+                        headers={"X-Admin-Token": ADMIN_TOKEN})
+    assert probed.status_code == 200 and "probe" in probed.json()
@@ -0,0 +1,203 @@
+"""
+消息归档服务测试
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event, func, insert, inspect, select
+
+from app.models.customer import Customer
+from app.models.message import ChannelType, Message, MessagePriority, MessageStatus
+from app.models.message_archive import MessageArchive
+from app.models.outbox import OutboxMessage, OutboxStatus
+from app.services.archive_service import ArchiveService, partition_name
+
+
+def _add_messages(db, ages_days, status=MessageStatus.READ, customer_id=None):
+    now = datetime.utcnow()
+    rows = [{
+        "channel": ChannelType.WHATSAPP,
+        "sender": "8613800138000",
+        "content": f"消息 {i}",
+        "status": status,
+        "priority": MessagePriority.NORMAL,
+        "metadata": {"intent": "booking"},
+        "created_at": now - timedelta(days=age),
+        "updated_at": now - timedelta(days=age),
+        "customer_id": customer_id,
+    } for i, age in enumerate(ages_days)]
+    db.execute(insert(Message.__table__), rows)
+    db.commit()
+
+
+def _count(db, model, *conditions):
+    return db.execute(select(func.count()).select_from(model.__table__).where(*conditions)).scalar()
+
+
+@pytest.fixture
+def service():
+    return ArchiveService(retention_days=90, batch_size=7)
+
+
+def test_run_moves_expired_and_archived_messages(db, service):
+    _add_messages(db, [100, 120, 200, 250, 400] * 5)
+    _add_messages(db, [1, 5, 30] * 4)
+    _add_messages(db, [2, 3] * 3, status=MessageStatus.ARCHIVED)
+    ids_before = set(db.execute(select(Message.id)).scalars())
+
+    result = service.run(db)
+
+    assert result["archived_count"] == 25 + 6
+    assert result["batches"] == 4 + 1
+    assert _count(db, Message) == 12
+    assert _count(db, MessageArchive) == 31
+    assert _count(db, Message, Message.status == MessageStatus.ARCHIVED) == 0
+    # 消息ID保留，两张表合起来不多不少
+    ids_after = set(db.execute(select(Message.id)).scalars()) | set(
+        db.execute(select(MessageArchive.id)).scalars()
+    )
+    assert ids_after == ids_before
+    archived = db.execute(select(MessageArchive)).scalars().first()
+    assert archived.meta == {"intent": "booking"}
+    assert archived.archive_month == archived.created_at.strftime("%Y%m")
+
+
+def test_run_is_idempotent_and_respects_max_batches(db, service):
+    _add_messages(db, [100] * 20)
+
+    assert service.run(db, max_batches=2)["archived_count"] == 14
+    assert service.run(db)["archived_count"] == 6
+    assert service.run(db)["archived_count"] == 0
+    assert service.get_stats(db) == {"hot_count": 0, "archived_count": 20}
+
+
+def _add_sent_replies(db):
+    """为全部热表消息各写一条已发送的发件箱记录（模拟回复消息）"""
+    ids = list(db.execute(select(Message.id)).scalars())
+    db.add_all([
+        OutboxMessage(channel=ChannelType.WHATSAPP, recipient="8613800138000",
+                      status=OutboxStatus.SENT, message_id=message_id)
+        for message_id in ids
+    ])
+    db.commit()
+    return set(ids)
+
+
+def test_archiving_replies_referenced_by_outbox(engine, session_factory, service):
+    @event.listens_for(engine, "connect")
+    def enable_foreign_keys(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA foreign_keys=ON")
+
+    engine.dispose()
+    db = session_factory()
+    try:
+        _add_messages(db, [100, 200])
+        reply_ids = _add_sent_replies(db)
+
+        assert service.run(db)["archived_count"] == 2
+        # 发件箱仍指向归档后的消息ID
+        assert set(db.execute(select(OutboxMessage.message_id)).scalars()) == reply_ids
+        assert set(db.execute(select(MessageArchive.id)).scalars()) == reply_ids
+    finally:
+        db.close()
+
+
+def test_customer_history_merges_hot_and_archive(db, service):
+    db.add_all([Customer(id=7, name="A"), Customer(id=8, name="B")])
+    db.commit()
+    _add_messages(db, [100, 200], customer_id=7)
+    _add_messages(db, [1, 2], customer_id=7)
+    _add_messages(db, [1], customer_id=8)
+    service.run(db)
+
+    history = service.get_customer_history(db, 7)
+
+    assert [m["archived"] for m in history] == [False, False, True, True]
+    assert history == sorted(history, key=lambda m: m["created_at"], reverse=True)
+
+
+def test_customer_history_pages_through_shared_timestamps(db, service):
+    db.add(Customer(id=7, name="A"))
+    db.commit()
+    # 同一时间戳的消息分布在热表和归档表，并跨越页边界
+    _add_messages(db, [100] * 3 + [200] * 2, customer_id=7)
+    service.run(db)
+    shared = datetime.utcnow() - timedelta(days=1)
+    _add_messages(db, [1] * 4, customer_id=7)
+    db.execute(Message.__table__.update().values(created_at=shared))
+    db.commit()
+    expected = [m["id"] for m in service.get_customer_history(db, 7, limit=100)]
+
+    pages, before, before_id = [], None, None
+    while True:
+        page = service.get_customer_history(db, 7, limit=3, before=before, before_id=before_id)
+        pages.append([m["id"] for m in page])
+        if len(page) < 3:
+            break
+        before, before_id = datetime.fromisoformat(page[-1]["created_at"]), page[-1]["id"]
+
+    assert [i for page in pages for i in page] == expected
+    assert len(expected) == 9 and [len(page) for page in pages] == [3, 3, 3, 0]
+
+
+def test_history_version_changes_when_messages_move_to_archive(db, service):
+    db.add(Customer(id=7, name="A"))
+    db.commit()
+    _add_messages(db, [100, 1], customer_id=7)
+    hot_count, archived_count, last_modified = service.get_history_version(db, 7)
+
+    service.run(db)
+
+    # 总数和最后更新时间不变，版本仍需变化，否则客户端会拿到过期的 archived 标记
+    assert service.get_history_version(db, 7) == (hot_count - 1, archived_count + 1, last_modified)
+
+
+def test_export_and_drop_month(db, service):
+    _add_messages(db, [100, 101, 102, 200, 201, 400])
+    service.run(db)
+    months = service.list_months(db)
+    assert sum(m["count"] for m in months) == 6
+
+    month = months[0]["month"]
+    exported = [json.loads(line) for line in service.export_month(db, month, page_size=1)]
+    assert len(exported) == months[0]["count"]
+    assert {row["archive_month"] for row in exported} == {month}
+    assert exported[0]["metadata"] == {"intent": "booking"}
+
+    result = service.drop_month(db, month)
+
+    assert result == {"month": month, "deleted_count": months[0]["count"]}
+    assert _count(db, MessageArchive, MessageArchive.archive_month == month) == 0
+    assert _count(db, MessageArchive) == 6 - months[0]["count"]
+
+
+@pytest.mark.parametrize("month", ["2024", "202413", "2024-01", "202401; DROP TABLE messages"])
+def test_invalid_month_is_rejected(db, service, month):
+    with pytest.raises(ValueError):
+        service.drop_month(db, month)
+    with pytest.raises(ValueError):
+        partition_name(month)
+
+
+def test_postgres_archives_into_monthly_partitions(pg_session_factory, service):
+    db = pg_session_factory()
+    try:
+        _add_messages(db, [100, 101, 200, 201, 400])
+        _add_sent_replies(db)
+        assert service.run(db)["archived_count"] == 5
+        months = [m["month"] for m in service.list_months(db)]
+        tables = set(inspect(db.get_bind()).get_table_names())
+        assert {partition_name(month) for month in months} <= tables
+
+        result = service.drop_month(db, months[0])
+
+        assert result["deleted_count"] >= 1
+        assert partition_name(months[0]) not in set(inspect(db.get_bind()).get_table_names())
+        assert _count(db, MessageArchive) == 5 - result["deleted_count"]
+        # 分区删除后同一月份可以重新归档
+        _add_messages(db, [100])
+        assert service.run(db)["archived_count"] == 1
+    finally:
+        db.close()
@@ -0,0 +1,42 @@
+"""
+响应压缩中间件测试
+"""
+
+import asyncio
+import gzip
+
+import pytest
+
+from app.core.compression import CompressionMiddleware
+
+
+def _request(response_headers, body=b'{"items": []}' * 200):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")] + response_headers})
+        await send({"type": "http.response.body", "body": body})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    asyncio.run(CompressionMiddleware(app)(scope, None, send))
+    headers = [(name.decode(), value.decode()) for name, value in sent[0]["headers"]]
+    return headers, sent[1]["body"]
+
+
+@pytest.mark.parametrize("existing, expected", [
+    ([], "Accept-Encoding"),
+    ([(b"vary", b"Origin")], "Origin, Accept-Encoding"),
+    ([(b"vary", b"Origin"), (b"vary", b"Cookie")], "Origin, Cookie, Accept-Encoding"),
+    ([(b"vary", b"accept-encoding, Origin")], "accept-encoding, Origin"),
+    ([(b"vary", b"*")], "*"),
+])
+def test_compressed_response_appends_to_vary(existing, expected):
+    headers, body = _request(existing)
+
+    assert [value for name, value in headers if name == "vary"] == [expected]
+    assert ("content-encoding", "gzip") in headers
+    assert gzip.decompress(body) == b'{"items": []}' * 200
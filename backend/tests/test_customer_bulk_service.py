@@ -0,0 +1,149 @@
+"""
+客户批量导入测试
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import select, text
+
+from app.models.customer import Customer
+from app.services.customer_bulk_service import (
+    KEY_EXPRESSIONS, CustomerBulkService, dedupe_rows, normalize_row
+)
+
+
+@pytest.fixture
+def service(session_factory):
+    return CustomerBulkService(session_factory=session_factory, chunk_size=2)
+
+
+def _customers(session_factory):
+    db = session_factory()
+    try:
+        return {c.id: c for c in db.execute(select(Customer)).scalars()}
+    finally:
+        db.close()
+
+
+def _import(service, body: bytes, fmt="csv"):
+    async def stream():
+        yield body
+
+    return asyncio.run(service.import_stream(stream(), fmt))
+
+
+def test_import_matches_existing_customers_stored_in_other_formats(session_factory, service):
+    db = session_factory()
+    db.add_all([
+        Customer(id=1, name="张三", phone="+86 138-0013-8000"),
+        Customer(id=2, name="Alice", email="Alice@Example.COM"),
+        Customer(id=3, name="Bob", instagram_handle="@Bob.Eats"),
+    ])
+    db.commit()
+    db.close()
+
+    result = _import(service, (
+        "name,phone,email,instagram_handle,tags\n"
+        "张三丰,8613800138000,,,vip\n"
+        ",,alice@example.com,,\n"
+        ",,,bob.eats,regular\n"
+        "Carol,13900000000,,,\n"
+    ).encode())
+
+    assert (result["inserted"], result["updated"], result["skipped"]) == (1, 3, 0)
+    customers = _customers(session_factory)
+    assert len(customers) == 4
+    assert customers[1].name == "张三丰" and customers[1].phone == "8613800138000"
+    assert customers[1].tags == ["vip"]
+    assert customers[2].email == "alice@example.com"
+    assert customers[3].instagram_handle == "bob.eats" and customers[3].tags == ["regular"]
+
+
+def test_existing_duplicates_after_normalization_are_conflicts(session_factory, service):
+    db = session_factory()
+    db.add_all([
+        Customer(id=1, email="dup@example.com"),
+        Customer(id=2, email=" DUP@example.com"),
+    ])
+    db.commit()
+    db.close()
+
+    result = service.load_chunk([normalize_row({"name": "X", "email": "dup@example.com"})])
+
+    assert (result["inserted"], result["updated"]) == (0, 0)
+    assert result["conflicts"][0]["customer_ids"] == [1, 2]
+    assert {c.name for c in _customers(session_factory).values()} == {None}
+
+
+def test_dedupe_rows_merges_transitively():
+    rows = [normalize_row(raw) for raw in (
+        {"name": "A", "phone": "111", "email": "a@x"},
+        {"name": "B", "phone": "222", "email": "b@x"},
+        {"name": "C", "phone": "333"},
+        {"name": "D", "phone": "111", "email": "b@x", "tags": "vip"},
+    )]
+
+    merged = dedupe_rows(rows)
+
+    assert [(row["name"], row["phone"], row["email"]) for row in merged] == [
+        ("D", "111", "b@x"), ("C", "333", None)
+    ]
+    assert merged[0]["tags"] == ["vip"]
+
+
+def test_import_chunk_with_transitively_duplicate_rows(session_factory):
+    service = CustomerBulkService(session_factory=session_factory, chunk_size=10)
+
+    result = _import(service, b"name,phone,email\nA,111,a@x\nB,222,b@x\nD,111,b@x\n")
+
+    assert (result["inserted"], result["updated"], result["skipped"]) == (1, 0, 2)
+    assert [(c.phone, c.email) for c in _customers(session_factory).values()] == [("111", "b@x")]
+
+
+def test_postgres_copy_path(pg_session_factory):
+    db = pg_session_factory()
+    db.add_all([
+        Customer(id=1, name="张三", phone="+86 138-0013-8000", tags=["old"]),
+        Customer(id=2, name="Alice", email="Alice@Example.COM"),
+        Customer(id=3, email="dup@example.com"),
+        Customer(id=4, email=" DUP@example.com"),
+    ])
+    db.commit()
+    db.execute(text("SELECT setval('customers_id_seq', 4)"))
+    db.commit()
+    db.close()
+    service = CustomerBulkService(session_factory=pg_session_factory, chunk_size=10)
+
+    result = _import(service, (
+        "name,phone,email,tags\n"
+        "张三丰,8613800138000,,vip\n"
+        ",,alice@example.com,\n"
+        "X,,dup@example.com,\n"
+        "Carol,13900000000,c@x,\n"
+        "Dave,13700000000,d@x,\n"
+        "Carol2,13700000000,c@x,\n"
+    ).encode())
+
+    assert (result["inserted"], result["updated"], result["skipped"]) == (1, 2, 3)
+    customers = _customers(pg_session_factory)
+    assert len(customers) == 5
+    assert customers[1].name == "张三丰" and customers[1].tags == ["old", "vip"]
+    assert customers[2].email == "alice@example.com"
+    assert customers[3].name is None and customers[4].name is None
+    assert [(c.name, c.phone, c.email) for c in customers.values() if c.id > 4] == [
+        ("Carol2", "13700000000", "c@x")
+    ]
+
+
+@pytest.mark.parametrize("key, value", [
+    ("phone", "8613800138000"), ("email", "a@b.c"), ("instagram_handle", "bob"),
+])
+def test_existing_lookup_uses_normalized_index(db, key, value):
+    table = Customer.__table__
+    normalized = KEY_EXPRESSIONS[key](table.c[key])
+    query = select(table.c.id).where(normalized.in_([value]))
+    compiled = query.compile(db.get_bind(), compile_kwargs={"literal_binds": True})
+    plan = " ".join(str(row[-1]) for row in db.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+
+    assert f"ix_customers_{key}_normalized" in plan
@@ -0,0 +1,42 @@
+"""
+实时事件分发测试
+"""
+
+import asyncio
+import json
+
+from app.models.message import MessagePriority
+from app.services.event_hub import EventHub, message_event, message_text
+from app.services.intent_classifier import intent_classifier
+
+
+def _priority(message):
+    intent = intent_classifier.classify(message_text(message))["intent"]
+    return intent_classifier.get_message_priority(intent)
+
+
+def test_complaints_are_urgent():
+    assert _priority({"content": "我要投诉，菜是凉的"}) == MessagePriority.URGENT
+    assert _priority({"content": {"type": "image", "caption": "I want a refund"}}) == MessagePriority.URGENT
+    assert _priority({"content": "几点开门？"}) == MessagePriority.NORMAL
+    assert _priority({"content": {"type": "audio", "id": "1"}}) == MessagePriority.NORMAL
+
+
+def test_priority_filter_delivers_only_matching_events():
+    hub = EventHub()
+    urgent_only = hub.subscribe(priorities=["urgent"])
+    everything = hub.subscribe()
+
+    async def publish():
+        for content in ("我要投诉", "几点开门？"):
+            message = {"message_id": content, "from": "8613800000000", "content": content}
+            priority = _priority(message).value
+            await hub.publish(message_event("whatsapp", message, priority))
+
+    asyncio.run(publish())
+
+    received = [json.loads(urgent_only.queue.get_nowait())]
+    assert urgent_only.queue.empty()
+    assert received[0]["message_id"] == "我要投诉"
+    assert received[0]["priority"] == "urgent"
+    assert everything.queue.qsize() == 2
@@ -0,0 +1,119 @@
+"""
+统计意图模型测试：稀疏推理、发布与热切换、低置信度回退
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.intent_classifier import IntentClassifier  # noqa: E402
+from app.services.intent_model import (  # noqa: E402
+    HashingFeaturizer, IntentModel, IntentModelStore, publish, sparse_dot, train
+)
+
+SAMPLES = [
+    ("今天开到几点", "business_hours"), ("周一休息吗", "business_hours"),
+    ("what time do you close", "business_hours"),
+    ("菜里有头发", "complaint"), ("服务员态度太差", "complaint"),
+    ("the soup was cold", "complaint"),
+] * 5
+
+
+class _FixedStore:
+    def __init__(self, model):
+        self.model = model
+
+    def get(self):
+        return self.model
+
+
+def test_sparse_dot_matches_dense_with_empty_rows():
+    weights = np.arange(12, dtype=np.float32).reshape(6, 2)
+    # 第0、2、4行为空，包括首尾
+    indptr = np.array([0, 0, 2, 2, 3, 3], dtype=np.int64)
+    indices = np.array([1, 4, 5], dtype=np.int64)
+    data = np.array([0.5, 2.0, 1.0], dtype=np.float32)
+    dense = np.zeros((5, 6), dtype=np.float32)
+    for row in range(5):
+        for position in range(indptr[row], indptr[row + 1]):
+            dense[row, indices[position]] = data[position]
+
+    np.testing.assert_allclose(sparse_dot(indptr, indices, data, weights), dense @ weights)
+
+
+def test_sparse_dot_all_rows_empty():
+    weights = np.ones((4, 3), dtype=np.float32)
+    result = sparse_dot(np.zeros(3, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                        np.zeros(0, dtype=np.float32), weights)
+    assert result.shape == (2, 3) and not result.any()
+
+
+def test_featurizer_rows_are_normalized_and_blank_text_is_empty():
+    indptr, indices, data = HashingFeaturizer(n_features=2 ** 10).transform(["你好", "   ", "hi"])
+
+    assert np.diff(indptr)[1] == 0
+    for row in (0, 2):
+        values = data[indptr[row]:indptr[row + 1]]
+        assert np.isclose(np.sqrt((values ** 2).sum()), 1.0)
+
+
+def test_trained_model_predicts_batch_including_blank_text():
+    model = train(SAMPLES, n_features=2 ** 12)
+
+    predictions = model.predict_batch(["周二开到几点", "", "the coffee was cold"])
+
+    assert predictions[0][0] == "business_hours" and predictions[2][0] == "complaint"
+    assert all(0 < confidence <= 1 for _, confidence in predictions)
+    assert model.predict_batch([]) == []
+
+
+def test_publish_and_hot_swap(tmp_path):
+    store = IntentModelStore(str(tmp_path), reload_interval=0)
+    assert store.get() is None
+
+    first_version = publish(train(SAMPLES, n_features=2 ** 12), str(tmp_path))
+    first = store.get()
+    assert first.version == first_version
+    assert isinstance(first.weights, np.memmap)
+
+    second_version = publish(train(SAMPLES[:3] * 5 + [("谢谢", "thanks")] * 5, n_features=2 ** 12),
+                             str(tmp_path))
+    second = store.get()
+    assert second_version != first_version
+    assert second.version == second_version and "thanks" in second.labels
+    # 切换前取得的旧模型仍可继续推理
+    assert first.predict_batch(["菜里有头发"])[0][0] == "complaint"
+
+
+def test_store_keeps_current_model_when_new_version_fails_to_load(tmp_path):
+    store = IntentModelStore(str(tmp_path), reload_interval=0)
+    version = publish(train(SAMPLES, n_features=2 ** 12), str(tmp_path))
+    assert store.get().version == version
+
+    (tmp_path / "CURRENT").write_text("v-missing")
+    assert store.get().version == version
+
+
+def _model(bias):
+    featurizer = HashingFeaturizer(n_features=2 ** 8)
+    weights = np.zeros((featurizer.n_features, 2), dtype=np.float32)
+    return IntentModel(weights, np.asarray(bias, dtype=np.float32), ["complaint", "thanks"],
+                       featurizer)
+
+
+def test_low_confidence_predictions_fall_back_to_rules():
+    # 两个意图概率相同（0.5），低于默认阈值0.6
+    classifier = IntentClassifier(model_store=_FixedStore(_model([0.0, 0.0])))
+
+    result = classifier.classify("营业时间是几点")
+
+    assert result["source"] == "rules" and result["intent"] == "business_hours"
+
+
+def test_confident_predictions_come_from_model():
+    classifier = IntentClassifier(model_store=_FixedStore(_model([0.0, 10.0])))
+
+    results = classifier.classify_batch(["营业时间是几点", "你好"])
+
+    assert [r["intent"] for r in results] == ["thanks", "thanks"]
+    assert all(r["source"] == "model" and r["confidence"] > 0.99 for r in results)
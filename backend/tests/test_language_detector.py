@@ -0,0 +1,45 @@
+"""
+语言检测测试
+"""
+
+import pytest
+
+from app.services import language_detector as detector_module
+from app.services.language_detector import LanguageDetector, language_detector
+
+
+@pytest.mark.parametrize("text, language", [
+    ("我对花生过敏，这道菜里有坚果吗", "zh"),
+    ("請問有素食餐點嗎", "zh"),
+    ("WiFi密码是多少", "zh"),
+    ("Could you write Happy Birthday on the cake", "en"),
+    ("¿Se puede entrar con perro?", "es"),
+    ("Les chiens sont-ils acceptés en terrasse ?", "fr"),
+    ("犬を連れて入れますか", "ja"),
+    ("本日貸切営業", "ja"),
+    ("강아지 데리고 가도 되나요", "ko"),
+    ("", "zh"),
+    ("12345 !!!", "zh"),
+])
+def test_detect(text, language):
+    assert language_detector.detect(text) == language
+
+
+def test_long_text_bypasses_cache():
+    text = "Do you take Apple Pay or only cash? " * 5
+    assert len(text) > detector_module._SHORT_TEXT_LENGTH
+    assert language_detector.detect(text) == "en"
+
+
+def test_count_scripts_separates_japanese_only_han():
+    assert LanguageDetector().count_scripts("A汉か한駅1") == [1, 1, 1, 1, 1, 1]
+
+
+def test_han_only_text_skips_ngram_scoring(monkeypatch):
+    def fail():
+        raise AssertionError("纯汉字文本不应加载n-gram模型")
+
+    monkeypatch.setattr(detector_module, "load_model", fail)
+    assert LanguageDetector()._detect("支持微信支付和支付宝吗") == "zh"
+    with pytest.raises(AssertionError):
+        LanguageDetector()._detect("駅前店")
@@ -0,0 +1,213 @@
+"""
+发件箱认领与投递测试
+"""
+
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from app.models.message import ChannelType
+from app.models.outbox import OutboxMessage, OutboxStatus
+from app.services.outbox_service import OutboxDispatcher
+
+
+def _enqueue(session_factory, *recipients, max_attempts=5):
+    """按顺序为每个接收者写入一条记录，返回记录ID"""
+    db = session_factory()
+    try:
+        rows = [
+            OutboxMessage(channel=ChannelType.WHATSAPP, recipient=recipient,
+                          payload={"message": f"reply {i}"}, max_attempts=max_attempts)
+            for i, recipient in enumerate(recipients)
+        ]
+        db.add_all(rows)
+        db.commit()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+def _rows(session_factory):
+    db = session_factory()
+    try:
+        return {row.id: row for row in db.execute(select(OutboxMessage)).scalars()}
+    finally:
+        db.close()
+
+
+def _set(session_factory, ids, **values):
+    db = session_factory()
+    try:
+        db.execute(update(OutboxMessage).where(OutboxMessage.id.in_(ids)).values(**values))
+        db.commit()
+    finally:
+        db.close()
+
+
+def _dispatcher(session_factory, sender=None, **kwargs):
+    async def ok(row):
+        return {"success": True, "message_id": f"wamid.{row['id']}"}
+
+    return OutboxDispatcher(sender=sender or ok, session_factory=session_factory, **kwargs)
+
+
+def test_claim_marks_rows_in_flight_in_recipient_order(session_factory):
+    a1, b1, a2, a3 = _enqueue(session_factory, "a", "b", "a", "a")
+    dispatcher = _dispatcher(session_factory)
+
+    claimed = dispatcher.claim_batch()
+
+    assert [row["id"] for row in claimed] == [a1, b1, a2, a3]
+    assert len({row["claim_token"] for row in claimed}) == 1
+    rows = _rows(session_factory)
+    assert all(row.status == OutboxStatus.IN_FLIGHT for row in rows.values())
+    assert dispatcher.claim_batch() == []
+
+
+def test_claim_limits_recipients(session_factory):
+    a1, b1, a2, c1 = _enqueue(session_factory, "a", "b", "a", "c")
+
+    claimed = _dispatcher(session_factory).claim_batch(max_recipients=2)
+
+    assert [row["id"] for row in claimed] == [a1, b1, a2]
+    assert _rows(session_factory)[c1].status == OutboxStatus.PENDING
+
+
+def test_recipient_is_blocked_while_head_in_flight(session_factory):
+    a1, a2, b1 = _enqueue(session_factory, "a", "a", "b")
+
+    first = _dispatcher(session_factory, batch_size=1).claim_batch()
+    second = _dispatcher(session_factory).claim_batch()
+
+    assert [row["id"] for row in first] == [a1]
+    # a2 前面有投递中的 a1，不能被另一个分发器认领
+    assert [row["id"] for row in second] == [b1]
+
+
+def test_followers_stop_at_row_in_backoff(session_factory):
+    a1, a2, a3 = _enqueue(session_factory, "a", "a", "a")
+    _set(session_factory, [a2], available_at=datetime.utcnow() + timedelta(minutes=5))
+
+    claimed = _dispatcher(session_factory).claim_batch()
+
+    assert [row["id"] for row in claimed] == [a1]
+    assert _rows(session_factory)[a3].status == OutboxStatus.PENDING
+
+
+def test_failure_backs_off_and_releases_later_rows(session_factory):
+    a1, a2, a3, b1 = _enqueue(session_factory, "a", "a", "a", "b")
+
+    async def sender(row):
+        if row["id"] == a2:
+            return {"success": False, "error": "upstream 500"}
+        return {"success": True, "message_id": f"wamid.{row['id']}"}
+
+    dispatcher = _dispatcher(session_factory, sender)
+    asyncio.run(dispatcher.dispatch_once())
+
+    rows = _rows(session_factory)
+    assert rows[a1].status == OutboxStatus.SENT and rows[a1].external_id == f"wamid.{a1}"
+    assert rows[b1].status == OutboxStatus.SENT
+    assert rows[a2].status == OutboxStatus.PENDING
+    assert rows[a2].attempts == 1
+    assert rows[a2].last_error == "upstream 500"
+    assert rows[a2].available_at > datetime.utcnow()
+    # 后续记录退回，不计投递次数
+    assert rows[a3].status == OutboxStatus.PENDING and rows[a3].attempts == 0
+    assert rows[a3].claim_token is None
+
+    # 退避期间整个接收者被跳过，退避结束后按顺序重新认领
+    assert dispatcher.claim_batch() == []
+    _set(session_factory, [a2], available_at=datetime.utcnow() - timedelta(seconds=1))
+    assert [row["id"] for row in dispatcher.claim_batch()] == [a2, a3]
+
+
+def test_exhausted_attempts_fail_and_unblock_recipient(session_factory):
+    a1, a2 = _enqueue(session_factory, "a", "a", max_attempts=1)
+
+    async def sender(row):
+        return {"success": False, "error": "invalid recipient"}
+
+    dispatcher = _dispatcher(session_factory, sender, batch_size=1)
+    asyncio.run(dispatcher.dispatch_once())
+
+    rows = _rows(session_factory)
+    assert rows[a1].status == OutboxStatus.FAILED and rows[a1].attempts == 1
+    assert [row["id"] for row in dispatcher.claim_batch()] == [a2]
+
+
+def test_circuit_open_defers_without_consuming_attempts(session_factory):
+    a1, a2 = _enqueue(session_factory, "a", "a")
+
+    async def sender(row):
+        return {"success": False, "error": "Circuit open", "retry_after": 30.0}
+
+    asyncio.run(_dispatcher(session_factory, sender).dispatch_once())
+
+    rows = _rows(session_factory)
+    assert rows[a1].status == OutboxStatus.PENDING and rows[a1].attempts == 0
+    assert rows[a1].available_at > datetime.utcnow() + timedelta(seconds=20)
+    assert rows[a2].status == OutboxStatus.PENDING and rows[a2].attempts == 0
+
+
+def test_rows_are_released_when_lease_is_nearly_over(session_factory):
+    a1, a2 = _enqueue(session_factory, "a", "a")
+    sent = []
+
+    async def sender(row):
+        sent.append(row["id"])
+        return {"success": True, "message_id": "wamid"}
+
+    dispatcher = _dispatcher(session_factory, sender)
+    rows = dispatcher.claim_batch()
+    for row in rows:
+        row["lease_deadline"] = time.monotonic() + dispatcher.send_margin / 2
+    results = []
+    asyncio.run(dispatcher._deliver_recipient(rows, asyncio.Semaphore(1), results))
+    dispatcher.record_results(results)
+
+    assert sent == []
+    assert all(row.status == OutboxStatus.PENDING for row in _rows(session_factory).values())
+
+
+def test_stale_results_do_not_overwrite_new_claim(session_factory):
+    (a1,) = _enqueue(session_factory, "a")
+    first = _dispatcher(session_factory)
+    second = _dispatcher(session_factory)
+
+    stale = first.claim_batch()
+    _set(session_factory, [a1], locked_until=datetime.utcnow() - timedelta(seconds=1))
+    current = second.claim_batch()
+    assert [row["id"] for row in current] == [a1]
+    assert current[0]["claim_token"] != stale[0]["claim_token"]
+
+    now = datetime.utcnow()
+    assert first.record_results([first._failed(stale[0], "timeout", now)]) == 0
+    row = _rows(session_factory)[a1]
+    assert row.status == OutboxStatus.IN_FLIGHT
+    assert row.claim_token == current[0]["claim_token"]
+
+    assert second.record_results([second._sent(current[0], {"message_id": "wamid"}, now)]) == 1
+    assert _rows(session_factory)[a1].status == OutboxStatus.SENT
+
+
+def test_postgres_skip_locked_head_keeps_recipient_order(pg_session_factory):
+    a1, a2, b1 = _enqueue(pg_session_factory, "a", "a", "b")
+
+    # 另一个分发器已锁定 a1 并标记投递中，但尚未提交
+    other = pg_session_factory()
+    try:
+        other.execute(select(OutboxMessage.id).where(OutboxMessage.id == a1).with_for_update())
+        other.execute(update(OutboxMessage).where(OutboxMessage.id == a1)
+                      .values(status=OutboxStatus.IN_FLIGHT))
+
+        claimed = _dispatcher(pg_session_factory).claim_batch()
+
+        assert [row["id"] for row in claimed] == [b1]
+    finally:
+        other.rollback()
+        other.close()
+
+    assert [row["id"] for row in _dispatcher(pg_session_factory).claim_batch()] == [a1, a2]
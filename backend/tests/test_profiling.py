@@ -0,0 +1,125 @@
+"""
+性能剖析测试：分段计时、请求剖析中间件和进程采样
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.core import profiling
+
+ADMIN_TOKEN = "test-admin-token"
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(profiling, "_enabled", True)
+    profiling.reset_span_stats()
+    profiling._request_profiles.clear()
+    yield
+    profiling.reset_span_stats()
+    profiling._request_profiles.clear()
+
+
+def test_traced_records_sync_and_async_calls(enabled):
+    @profiling.traced("test.sync")
+    def add(a, b):
+        return a + b
+
+    @profiling.traced("test.async")
+    async def fail():
+        raise ValueError("boom")
+
+    assert add(1, 2) == 3 and add.__name__ == "add"
+    with pytest.raises(ValueError):
+        asyncio.run(fail())
+
+    stats = profiling.get_span_stats()
+    assert stats["test.sync"]["count"] == 1
+    assert stats["test.async"]["count"] == 1
+
+
+def test_span_records_elapsed_time(enabled):
+    with profiling.span("test.sleep"):
+        time.sleep(0.01)
+
+    stats = profiling.get_span_stats()["test.sleep"]
+    assert stats["count"] == 1
+    assert 10 <= stats["max_ms"] == stats["total_ms"]
+
+
+def test_disabled_tracing_is_a_noop(monkeypatch):
+    monkeypatch.setattr(profiling, "_enabled", False)
+    profiling.reset_span_stats()
+
+    def func():
+        return 1
+
+    assert profiling.traced("test.off")(func) is func
+    with profiling.span("test.off"):
+        pass
+    assert profiling.get_span_stats() == {}
+
+
+def _call(middleware, headers=()):
+    async def app(scope, receive, send):
+        with profiling.span("db.commit"):
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": "/inbox",
+             "headers": [(name.encode(), value.encode()) for name, value in headers]}
+    asyncio.run(middleware(app)(scope, None, send))
+    return dict(sent[0]["headers"])
+
+
+def test_middleware_adds_server_timing(enabled):
+    headers = _call(lambda app: profiling.ProfilingMiddleware(app, admin_token=ADMIN_TOKEN))
+
+    assert headers[b"server-timing"].startswith(b"db-commit;dur=")
+    assert b"x-profile-id" not in headers
+    assert profiling.list_request_profiles() == []
+
+
+@pytest.mark.parametrize("token, profiled", [(ADMIN_TOKEN, True), ("wrong", False), ("", False)])
+def test_middleware_profiles_only_with_admin_token(enabled, token, profiled):
+    headers = _call(lambda app: profiling.ProfilingMiddleware(app, admin_token=ADMIN_TOKEN),
+                    [("x-profile", "1"), ("x-admin-token", token)])
+
+    assert (b"x-profile-id" in headers) == profiled
+    profiles = profiling.list_request_profiles()
+    assert len(profiles) == int(profiled)
+    if profiled:
+        profile_id = int(headers[b"x-profile-id"])
+        assert profiles[0]["path"] == "/inbox"
+        assert profiling.get_request_profile(profile_id)["output"]
+
+
+def test_sample_process_collects_other_threads():
+    stop = threading.Event()
+
+    def busy_loop():
+        while not stop.is_set():
+            sum(range(1000))
+
+    worker = threading.Thread(target=busy_loop, name="busy-worker")
+    worker.start()
+    try:
+        output = profiling.sample_process(seconds=0.2, interval=0.005)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = output.splitlines()
+    assert lines
+    busy = [line for line in lines if line.startswith("busy-worker;") and "busy_loop" in line]
+    assert busy
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
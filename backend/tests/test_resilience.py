@@ -0,0 +1,73 @@
+"""
+外部API调用容错测试
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.resilience import CircuitBreaker, CircuitOpenError, ResilientClient, UpstreamTimeout
+
+URL = "https://graph.example.test/v18.0/123/messages"
+
+
+def _client(statuses, **kwargs):
+    """依次返回给定状态码的上游（用完后返回200）"""
+    statuses = list(statuses)
+    calls = []
+
+    async def handler(request):
+        calls.append(request)
+        return httpx.Response(statuses.pop(0) if statuses else 200, json={})
+
+    http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    options = {"max_attempts": 1, "breaker_failures": 2, "breaker_reset": 60.0, **kwargs}
+    return ResilientClient("test", lambda: http, **options), calls
+
+
+def _open_breaker(client):
+    breaker = client.endpoint("messages").breaker
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    # 跳过等待，下一次调用即为半开探测
+    breaker._opened_at -= breaker.reset_timeout
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures():
+    client, calls = _client([503, 503])
+
+    async def run():
+        for _ in range(2):
+            assert (await client.request("messages", "POST", URL)).status_code == 503
+        with pytest.raises(CircuitOpenError):
+            await client.request("messages", "POST", URL)
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_half_open_probe_closes_breaker():
+    client, calls = _client([])
+    breaker = _open_breaker(client)
+
+    response = asyncio.run(client.request("messages", "POST", URL))
+
+    assert response.status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_exceeded_deadline_does_not_hold_probe():
+    client, calls = _client([], deadline=1e-9)
+    breaker = _open_breaker(client)
+
+    with pytest.raises(UpstreamTimeout):
+        asyncio.run(client.request("messages", "POST", URL))
+    assert calls == []
+
+    # 探测名额未被占用，下一次调用可以探测并恢复
+    client.deadline = 5.0
+    assert asyncio.run(client.request("messages", "POST", URL)).status_code == 200
+    assert breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,69 @@
+"""
+条件GET响应测试
+"""
+
+import json
+from datetime import datetime
+
+import pytest
+from fastapi import Request
+
+from app.core.responses import conditional_json, format_http_date, make_etag
+
+LAST_MODIFIED = datetime(2024, 3, 1, 12, 30, 15, 250000)
+
+
+def _respond(headers, etag=None, last_modified=LAST_MODIFIED):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return {"items": [1, 2]}
+
+    scope = {"type": "http", "method": "GET", "path": "/",
+             "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()]}
+    response = conditional_json(Request(scope), etag or make_etag("items", 2), last_modified, build)
+    return response, len(calls)
+
+
+def test_changed_data_builds_body_with_validators():
+    response, calls = _respond({})
+
+    assert (response.status_code, calls) == (200, 1)
+    assert json.loads(response.body) == {"items": [1, 2]}
+    assert response.headers["etag"] == make_etag("items", 2)
+    assert response.headers["last-modified"] == "Fri, 01 Mar 2024 12:30:15 GMT"
+
+
+@pytest.mark.parametrize("if_none_match", [
+    make_etag("items", 2), 'W/"other", ' + make_etag("items", 2)[2:], "*",
+])
+def test_if_none_match_returns_304_without_building(if_none_match):
+    response, calls = _respond({"If-None-Match": if_none_match})
+
+    assert (response.status_code, calls) == (304, 0)
+    assert response.headers["etag"] == make_etag("items", 2)
+
+
+@pytest.mark.parametrize("since, status", [
+    (format_http_date(LAST_MODIFIED), 304),
+    ("Fri, 01 Mar 2024 13:00:00 GMT", 304),
+    ("Fri, 01 Mar 2024 12:30:14 GMT", 200),
+    ("not a date", 200),
+])
+def test_if_modified_since(since, status):
+    assert _respond({"If-Modified-Since": since})[0].status_code == status
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since():
+    response, _ = _respond({"If-None-Match": 'W/"other"',
+                            "If-Modified-Since": format_http_date(LAST_MODIFIED)})
+    assert response.status_code == 200
+
+
+def test_without_last_modified_if_modified_since_is_ignored():
+    response, calls = _respond({"If-Modified-Since": "Fri, 01 Mar 2030 00:00:00 GMT"},
+                               last_modified=None)
+
+    assert (response.status_code, calls) == (200, 1)
+    assert "last-modified" not in response.headers
@@ -0,0 +1,141 @@
+"""
+消息统计汇总测试：增量维护的结果应与从原始表重建的结果一致
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.models.message import ChannelType, Message, MessagePriority, MessageStatus
+from app.models.message_rollup import MessageRollup
+from app.services.rollup_service import RollupAggregator, RollupService, install_rollup_hooks
+
+
+def _hooked(session_factory):
+    """注册会话钩子（每个测试的 session_factory 独立，不影响其他测试）"""
+    aggregator = RollupAggregator(session_factory)
+    install_rollup_hooks(session_factory, aggregator)
+    return aggregator
+
+
+def _snapshot(session_factory):
+    """汇总表内容（不含首次回复耗时：重建时以 updated_at 近似）"""
+    db = session_factory()
+    try:
+        table = MessageRollup.__table__
+        rows = db.execute(select(
+            table.c.period, table.c.bucket, table.c.channel, table.c.intent, table.c.priority,
+            table.c.status, table.c.message_count, table.c.first_reply_count
+        )).all()
+        return sorted(tuple(row) for row in rows if row.message_count or row.first_reply_count)
+    finally:
+        db.close()
+
+
+def _rebuild(session_factory):
+    db = session_factory()
+    try:
+        return RollupService().rebuild(db)
+    finally:
+        db.close()
+
+
+def _add_messages(session_factory, count, hours_ago=0):
+    db = session_factory()
+    try:
+        created = datetime.utcnow() - timedelta(hours=hours_ago)
+        messages = [
+            Message(channel=ChannelType.WHATSAPP, sender="8613800138000", content=f"消息 {i}",
+                    meta={"intent": "reservation"}, created_at=created)
+            for i in range(count)
+        ]
+        db.add_all(messages)
+        db.commit()
+        return [message.id for message in messages]
+    finally:
+        db.close()
+
+
+def _change_committed_messages(session_factory, ids):
+    """在提交过（属性已过期）的对象上修改维度列"""
+    db = session_factory()
+    try:
+        messages = db.execute(select(Message).where(Message.id.in_(ids))).scalars().all()
+        db.commit()  # 提交后所有属性过期，旧值需要重新加载
+        messages[0].status = MessageStatus.REPLIED
+        messages[1].priority = MessagePriority.URGENT
+        messages[2].meta = {"intent": "complaint"}
+        messages[3].status = MessageStatus.READ
+        db.commit()
+        messages[3].status = MessageStatus.REPLIED
+        db.commit()
+        # 已回复的消息再归档，首次回复统计随消息移到归档状态
+        messages[0].status = MessageStatus.ARCHIVED
+        db.commit()
+    finally:
+        db.close()
+
+
+def test_incremental_rollups_match_rebuild(session_factory):
+    aggregator = _hooked(session_factory)
+    ids = _add_messages(session_factory, 5) + _add_messages(session_factory, 3, hours_ago=30)
+    _change_committed_messages(session_factory, ids)
+    aggregator.flush()
+    incremental = _snapshot(session_factory)
+
+    _rebuild(session_factory)
+
+    assert incremental == _snapshot(session_factory)
+    statuses = {row[5]: row[6:] for row in incremental if row[0] == "day" and row[3] == "reservation"}
+    assert statuses["replied"] == (1, 1)
+    assert statuses["archived"] == (1, 1)
+
+
+def test_rebuild_discards_deltas_other_workers_have_not_flushed(session_factory):
+    worker = _hooked(session_factory)
+    ids = _add_messages(session_factory, 4)
+    _change_committed_messages(session_factory, ids)
+
+    # 其他worker在重建前后都还未写入增量
+    _rebuild(session_factory)
+    rebuilt = _snapshot(session_factory)
+    worker.flush()
+    assert _snapshot(session_factory) == rebuilt
+
+    # 重建之后产生的增量照常写入
+    _add_messages(session_factory, 2, hours_ago=1)
+    worker.flush()
+    incremental = _snapshot(session_factory)
+    _rebuild(session_factory)
+    assert incremental == _snapshot(session_factory)
+
+
+def test_rebuild_range_only_discards_deltas_inside_range(session_factory):
+    worker = _hooked(session_factory)
+    _add_messages(session_factory, 2, hours_ago=72)
+    _add_messages(session_factory, 3)
+
+    db = session_factory()
+    try:
+        RollupService().rebuild(db, start=datetime.utcnow() - timedelta(days=1))
+    finally:
+        db.close()
+    worker.flush()
+    incremental = _snapshot(session_factory)
+
+    _rebuild(session_factory)
+    assert incremental == _snapshot(session_factory)
+
+
+def test_postgres_incremental_rollups_match_rebuild(pg_session_factory):
+    worker = _hooked(pg_session_factory)
+    ids = _add_messages(pg_session_factory, 5) + _add_messages(pg_session_factory, 3, hours_ago=30)
+    _change_committed_messages(pg_session_factory, ids[:4])
+    _rebuild(pg_session_factory)
+    _change_committed_messages(pg_session_factory, ids[4:])
+    worker.flush()
+    incremental = _snapshot(pg_session_factory)
+
+    _rebuild(pg_session_factory)
+
+    assert incremental == _snapshot(pg_session_factory)